@@ -0,0 +1,51 @@
+# author: mrtrkmn@github
+# description: Read company facts from a local copy of SEC.gov nightly bulk archive (companyfacts.zip)
+# archive can be downloaded from https://www.sec.gov/Archives/edgar/daily-index/xbrl/companyfacts.zip
+
+import os
+import zipfile
+
+
+class CompanyFactsArchive:
+    """
+    Read access to SEC.gov bulk companyfacts.zip archive.
+
+    The archive contains one member per company, named CIK##########.json, with the same content as
+    https://data.sec.gov/api/xbrl/companyfacts/CIK##########.json. Only the member of the requested CIK
+    is decompressed; the archive is never extracted to disk.
+
+    :param archive_path: path to companyfacts.zip
+    """
+
+    def __init__(self, archive_path):
+        if not os.path.exists(archive_path):
+            raise Exception(f"Company facts archive does not exist at {archive_path}")
+        self.archive_path = archive_path
+        self.archive = zipfile.ZipFile(archive_path, "r")
+        # member names without directories, e.g. {"CIK0000320193.json": "CIK0000320193.json"}
+        self.members = {os.path.basename(name): name for name in self.archive.namelist()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.archive.close()
+
+    def member_name(self, cik_number):
+        return f"CIK{str(cik_number).zfill(10)}.json"
+
+    def __contains__(self, cik_number):
+        return self.member_name(cik_number) in self.members
+
+    def open_company_facts(self, cik_number):
+        """
+        Return a binary file object streaming the member of given CIK number, None if the company is not in the archive
+        :param cik_number: CIK number of the company
+        """
+        name = self.members.get(self.member_name(cik_number))
+        if name is None:
+            return None
+        return self.archive.open(name, "r")
@@ -0,0 +1,111 @@
+# author: mrtrkmn@github
+# description: Append-only checkpoint file of a company facts crawl, used to resume an interrupted crawl
+
+import json
+import os
+import time
+
+
+class CrawlCheckpoint:
+    """
+    JSON lines file recording every processed (Entry, CIK Number) pair of a crawl.
+
+    Each line is one processed entry:
+
+        {"entry": "12", "cik": "0000320193", "company_name": ..., "parsed_data": {...},
+         "not_found": {...} or null, "missing_kpi_vars": {...} or null}
+
+    Lines are flushed as soon as they are written, so an interrupted crawl loses at most the entries
+    which were in flight. A partially written last line (e.g. the process was killed while writing) is ignored.
+
+    :param path: path to the checkpoint file
+    :param resume: load the records of an existing checkpoint file, otherwise the file is started from scratch and
+        a non-empty existing file is kept under a timestamped name, see rotate()
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.records = {}
+        # path the previous checkpoint file was moved to, when it was not resumed
+        self.rotated_path = None
+        if resume and os.path.exists(path):
+            self.load()
+            # rewrite only complete records, so appended lines never follow a truncated one
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                for record in self.records.values():
+                    f.write(json.dumps(record) + "\n")
+            os.replace(tmp_path, path)
+            self.file = open(path, "a")
+        else:
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                self.rotated_path = self.rotate()
+            self.file = open(path, "w")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def rotate(self):
+        """
+        Move the existing checkpoint file to <name>_<timestamp>.jsonl, so that a crawl started without resume does
+        not destroy the records of an interrupted one
+        :return: path of the moved file
+        """
+        base_name, extension = os.path.splitext(self.path)
+        timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(os.path.getmtime(self.path)))
+        rotated_path = f"{base_name}_{timestamp}{extension}"
+        number = 1
+        while os.path.exists(rotated_path):
+            rotated_path = f"{base_name}_{timestamp}_{number}{extension}"
+            number += 1
+        os.replace(self.path, rotated_path)
+        return rotated_path
+
+    def key(self, entry_id, cik_number):
+        return (str(entry_id), str(cik_number))
+
+    def load(self):
+        """
+        Read the records of the checkpoint file, the last record of a pair wins
+        """
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.records[self.key(record["entry"], record["cik"])] = record
+
+    def __contains__(self, key):
+        return self.key(*key) in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, entry_id, cik_number, company_name, parsed_data=None, not_found=None, missing_kpi_vars=None):
+        """
+        Record a processed entry
+        :param entry_id: entry id of the agreement
+        :param cik_number: CIK number of the company
+        :param company_name: name of the company
+        :param parsed_data: selected facts of the entry, as returned by Crawler.select_closest_10k_facts
+        :param not_found: NOT_FOUND_COMPANIES record of the company, if company facts do not exist
+        :param missing_kpi_vars: MISSING_KPI_VARS record of the company, if some KPI variables do not exist
+        """
+        record = {
+            "entry": str(entry_id),
+            "cik": str(cik_number),
+            "company_name": company_name,
+            "parsed_data": parsed_data or {},
+            "not_found": not_found,
+            "missing_kpi_vars": missing_kpi_vars,
+        }
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.records[self.key(entry_id, cik_number)] = record
@@ -0,0 +1,203 @@
+# author: mrtrkmn@github
+# description: Resolve chromedriver once and pin it in a local cache, validated against the installed Chrome version
+
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+logger = logging.getLogger()
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.abspath("data"), "chromedriver_cache")
+# executables tried to find the installed Chrome version, CHROME_BINARY is tried first when it is set
+CHROME_BINARIES = (
+    "google-chrome",
+    "google-chrome-stable",
+    "chromium",
+    "chromium-browser",
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+)
+VERSION_PATTERN = re.compile(r"(\d+)\.\d+\.\d+(?:\.\d+)?")
+
+
+def get_chrome_version(binaries=CHROME_BINARIES):
+    """
+    Return the version of the installed Chrome (e.g. "120.0.6099.109"), None if Chrome is not found
+    :param binaries: executables to try, in order
+    """
+    if os.environ.get("CHROME_BINARY"):
+        binaries = (os.environ.get("CHROME_BINARY"),) + tuple(binaries)
+    for binary in binaries:
+        try:
+            output = subprocess.run(
+                [binary, "--version"], capture_output=True, text=True, timeout=10, check=True
+            ).stdout
+        except (OSError, subprocess.SubprocessError):
+            continue
+        match = VERSION_PATTERN.search(output)
+        if match:
+            return match.group(0)
+    return None
+
+
+def get_major_version(version):
+    return version.split(".")[0] if version else None
+
+
+def install_chromedriver():
+    """
+    Download (or find in the webdriver_manager cache) the chromedriver matching the installed Chrome
+    """
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    return ChromeDriverManager().install()
+
+
+class ChromeDriverCache:
+    """
+    Chromedriver resolved once and reused by every browser started afterwards.
+
+    The first resolution installs chromedriver with webdriver_manager, copies the binary into the cache directory
+    and pins it (pin.json) together with the Chrome version it was installed for. Later resolutions only check
+    the installed Chrome version: while its major version is the pinned one, the pinned binary is used without
+    touching the network. When Chrome is updated to another major version, chromedriver is installed and pinned again.
+
+    If the Chrome version can not be detected, an existing pinned binary is used as it is.
+
+    :param cache_dir: directory where the pinned chromedriver is stored
+    :param install: function returning the path of a freshly installed chromedriver
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, install=install_chromedriver):
+        self.cache_dir = cache_dir
+        self.pin_path = os.path.join(cache_dir, "pin.json")
+        self.install = install
+        self.lock = threading.Lock()
+        # path resolved by this process, Chrome is not updated while orbi runs
+        self.driver_path = None
+
+    def load_pin(self):
+        try:
+            with open(self.pin_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_valid(self, pin, chrome_version):
+        """
+        Check that a pin can be used with the installed Chrome
+        :param pin: content of pin.json
+        :param chrome_version: installed Chrome version, None if unknown
+        """
+        if not pin or not os.path.isfile(pin.get("driver_path", "")) or not os.access(pin["driver_path"], os.X_OK):
+            return False
+        if chrome_version is None:
+            logger.debug("Chrome version is unknown, using the pinned chromedriver as it is")
+            return True
+        return get_major_version(pin.get("chrome_version")) == get_major_version(chrome_version)
+
+    def pin(self, installed_path, chrome_version):
+        """
+        Copy an installed chromedriver into the cache directory and pin it
+        :param installed_path: path returned by install()
+        :param chrome_version: Chrome version the driver was installed for
+        :return: path of the pinned chromedriver
+        """
+        driver_dir = os.path.join(self.cache_dir, get_major_version(chrome_version) or "unknown")
+        os.makedirs(driver_dir, exist_ok=True)
+        driver_path = os.path.join(driver_dir, os.path.basename(installed_path))
+        # copy then rename, another process may be using the previously pinned binary
+        shutil.copy2(installed_path, f"{driver_path}.tmp")
+        os.chmod(f"{driver_path}.tmp", 0o755)
+        os.replace(f"{driver_path}.tmp", driver_path)
+        pin = {"chrome_version": chrome_version, "driver_path": driver_path}
+        with open(f"{self.pin_path}.tmp", "w") as f:
+            json.dump(pin, f)
+        os.replace(f"{self.pin_path}.tmp", self.pin_path)
+        return driver_path
+
+    def get_driver_path(self):
+        """
+        Return the path of a chromedriver matching the installed Chrome, installed only when no valid one is pinned
+        """
+        with self.lock:
+            if self.driver_path is not None:
+                return self.driver_path
+            chrome_version = get_chrome_version()
+            pin = self.load_pin()
+            if self.is_valid(pin, chrome_version):
+                logger.debug(f"Using pinned chromedriver {pin['driver_path']} (Chrome {pin['chrome_version']})")
+                self.driver_path = pin["driver_path"]
+                return self.driver_path
+            logger.debug(f"Installing chromedriver for Chrome {chrome_version}")
+            self.driver_path = self.pin(self.install(), chrome_version)
+            logger.debug(f"Pinned chromedriver {self.driver_path} (Chrome {chrome_version})")
+            return self.driver_path
+
+
+class ChromeProfiles:
+    """
+    Warm Chrome user-data-dir profiles, reused by the browsers started one after the other.
+
+    A profile keeps the disk cache (scripts, styles, images of Orbis) between browser starts. Two browsers can not
+    use the same profile at once, so each running browser gets its own profile directory: <base_dir>/profile-<n>,
+    the lowest n which is not in use.
+
+    :param base_dir: directory of the profiles
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = os.path.abspath(base_dir)
+        self.lock = threading.Lock()
+        self.in_use = set()
+
+    def acquire(self):
+        """
+        Return a profile directory which is not used by another browser of this process
+        """
+        with self.lock:
+            number = 0
+            while number in self.in_use:
+                number += 1
+            self.in_use.add(number)
+        profile_dir = os.path.join(self.base_dir, f"profile-{number}")
+        os.makedirs(profile_dir, exist_ok=True)
+        return profile_dir
+
+    def release(self, profile_dir):
+        """
+        Make a profile directory available again, once its browser has quit
+        :param profile_dir: directory returned by acquire
+        """
+        number = int(os.path.basename(profile_dir).split("-")[-1])
+        with self.lock:
+            self.in_use.discard(number)
+
+
+CHROMEDRIVER_CACHE = ChromeDriverCache()
+CHROME_PROFILES = {}
+CHROME_PROFILES_LOCK = threading.Lock()
+
+
+def get_chromedriver_path():
+    """
+    Path of the chromedriver to start Chrome with: CHROMEDRIVER_PATH if it is set, otherwise the pinned chromedriver
+    of the shared cache (data/chromedriver_cache)
+    """
+    return os.environ.get("CHROMEDRIVER_PATH") or CHROMEDRIVER_CACHE.get_driver_path()
+
+
+def get_chrome_profiles():
+    """
+    Warm profiles under CHROME_USER_DATA_DIR, None when it is not set (each browser starts with a new profile)
+    """
+    base_dir = os.environ.get("CHROME_USER_DATA_DIR")
+    if not base_dir:
+        return None
+    with CHROME_PROFILES_LOCK:
+        if base_dir not in CHROME_PROFILES:
+            CHROME_PROFILES[base_dir] = ChromeProfiles(base_dir)
+        return CHROME_PROFILES[base_dir]
@@ -0,0 +1,130 @@
+# author: mrtrkmn@github
+# description: Streaming parser for companyfacts documents of SEC.gov API
+# keeps only the requested concepts and forms while the document is read, everything else is discarded
+
+from datetime import datetime
+from decimal import Decimal
+
+import ijson
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def to_float(value):
+    """
+    Convert the decimal numbers parsed by ijson to float, in dicts and lists as well (e.g. a fact {"val": Decimal})
+    :param value: parsed JSON value
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, dict):
+        return {key: to_float(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_float(item) for item in value]
+    return value
+
+
+def has_valid_end_date(fact):
+    """
+    Check whether the end date of a fact is a date in the form YYYY-MM-DD
+    :param fact: parsed fact, e.g. {"end": "2020-12-31", "val": ..., "form": "10-K"}
+    """
+    try:
+        datetime.strptime(fact.get("end"), "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+class CompanyFactsFilter:
+    """
+    Incremental (event based) parser of a companyfacts JSON document.
+
+    Bytes are fed chunk by chunk with `feed`, `close` returns the filtered document which has the same
+    structure as the original one:
+
+        {"cik": ..., "entityName": ..., "facts": {taxonomy: {concept: {"label": ..., "units": {unit: [facts]}}}}}
+
+    Only concepts given in `concepts` are kept and only facts filed with one of `forms` are kept in their units.
+    Unit keys are kept even when none of their facts match, so the order of units stays the same.
+    Facts with an invalid end date are kept whatever their form is, so that a unit list with an invalid end date
+    is still recognized (and skipped) by the selection of the closest facts, as for the unfiltered document.
+    At most one concept is materialized at a time.
+
+    Numbers are parsed without use_float (it makes the C backend fail on integers larger than int64), so decimal
+    numbers are converted to float when a concept is kept. Invalid documents raise ijson.JSONError.
+
+    :param concepts: list of concept names to keep, e.g. ["Assets", "Revenues"]
+    :param forms: list of form types to keep, e.g. ["10-K"]
+    """
+
+    def __init__(self, concepts, forms=("10-K",)):
+        self.concepts = set(concepts)
+        self.forms = set(forms)
+        self.document = {}
+        self.events = ijson.sendable_list()
+        self.parser = ijson.parse_coro(self.events)
+        self.builder = None
+        self.depth = 0
+        self.taxonomy = None
+        self.concept = None
+
+    def feed(self, chunk):
+        """
+        Parse the next chunk of the document
+        :param chunk: bytes
+        """
+        self.parser.send(chunk)
+        self.consume_events()
+
+    def close(self):
+        """
+        Finish parsing and return the filtered document
+        """
+        self.parser.close()
+        self.consume_events()
+        return self.document
+
+    def parse_file(self, file):
+        """
+        Parse a whole binary file object (e.g. a zip member or a gzip file) chunk by chunk
+        :param file: binary file object
+        """
+        while True:
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            self.feed(chunk)
+        return self.close()
+
+    def consume_events(self):
+        for prefix, event, value in self.events:
+            if self.builder is not None:
+                self.builder.event(event, value)
+                if event in ("start_map", "start_array"):
+                    self.depth += 1
+                elif event in ("end_map", "end_array"):
+                    self.depth -= 1
+                if self.depth == 0:
+                    self.add_concept(self.builder.value)
+                    self.builder = None
+            elif event == "map_key" and prefix.startswith("facts.") and prefix.count(".") == 1:
+                if value in self.concepts:
+                    self.taxonomy = prefix[len("facts.") :]
+                    self.concept = value
+                    self.builder = ijson.ObjectBuilder()
+                    self.depth = 0
+            elif prefix in ("cik", "entityName") and event in ("string", "number"):
+                self.document[prefix] = value
+        del self.events[:]
+
+    def add_concept(self, concept_facts):
+        if isinstance(concept_facts, dict) and isinstance(concept_facts.get("units"), dict):
+            concept_facts["units"] = {
+                unit: [
+                    to_float(fact) for fact in facts if fact.get("form") in self.forms or not has_valid_end_date(fact)
+                ]
+                for unit, facts in concept_facts["units"].items()
+            }
+        facts = self.document.setdefault("facts", {})
+        facts.setdefault(self.taxonomy, {})[self.concept] = concept_facts
@@ -13,9 +13,10 @@ import sys
 import time
 from ast import dump
 from datetime import datetime
-from threading import Thread
+from urllib.parse import urlparse
 
 import aiohttp
+import ijson
 import pandas as pd
 import pytz
 import requests
@@ -33,6 +34,23 @@ from bs4 import BeautifulSoup
 root_path = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(root_path)
 
+from bulk_companyfacts import CompanyFactsArchive  # isort:skip
+from checkpoint import CrawlCheckpoint  # isort:skip
+from companyfacts_parser import READ_CHUNK_SIZE, CompanyFactsFilter  # isort:skip
+from names import map_values_to_entries  # isort:skip
+from sec_cache import DEFAULT_MAX_AGE_IN_HOURS, DEFAULT_MAX_SIZE_IN_MB, CacheEntryError, SECResponseCache  # isort:skip
+from throttle import (  # isort:skip
+    DEFAULT_MAX_RETRIES,
+    RETRYABLE_STATUSES,
+    SEC_MAX_REQUESTS_PER_SECOND,
+    AIMDRateController,
+    CircuitBreaker,
+    TokenBucket,
+    get_retry_delay,
+    parse_retry_after,
+)
+from workbook import read_excel  # isort:skip
+
 LOCAL_TZ = pytz.timezone("Europe/Berlin")
 NOT_FOUND_COMPANIES = {}
 MISSING_KPI_VARS = {}
@@ -120,6 +138,25 @@ class Crawler:
 
         self.not_financial_columns = ["entry", "cik_number", "companyName", "agreementDate", "endDate", "diffInDays"]
 
+        # one connection pooled session is shared by all requests to SEC.gov API during a crawl
+        # rate limiter keeps the crawl at SEC.gov limit of 10 requests per second
+        self.session = None
+        self.rate_limiter = TokenBucket(rate=SEC_MAX_REQUESTS_PER_SECOND)
+        # request rate is lowered when SEC.gov throttles (429) and raised again while requests succeed
+        self.rate_controller = AIMDRateController(self.rate_limiter, max_rate=SEC_MAX_REQUESTS_PER_SECOND)
+        # throttled (429), failed (5xx) and timed out requests are retried with backoff
+        self.max_retries = DEFAULT_MAX_RETRIES
+        # one circuit breaker per host, {"data.sec.gov": CircuitBreaker}
+        self.circuit_breakers = {}
+        # number of requests kept in flight while crawling company facts
+        self.max_concurrent_requests = SEC_MAX_REQUESTS_PER_SECOND
+        # on-disk cache of data.sec.gov responses, set to None to always download
+        self.cache = SECResponseCache()
+        # one lock per requested url, several entries can share a CIK number, see get_url_lock
+        self.url_locks = {}
+        # when set (CompanyFactsArchive), company facts are read from local companyfacts.zip instead of SEC.gov API
+        self.companyfacts_archive = None
+
     def provide_complete_cik_number(self, incomplete_cik_number):
         """
         This function completes incomplete CIK number by appending zeros at the beginning
@@ -149,6 +186,20 @@ class Crawler:
             for item in data:
                 yield from self.recursive_lookup(item, key)
 
+    def index_company_facts(self, company_facts_data):
+        """
+        Build a {concept: [facts]} mapping from the facts section of a companyfacts document in one pass
+        Facts are grouped per taxonomy (e.g. "dei", "us-gaap"), a concept reported in several taxonomies
+        keeps all of them in document order, same as recursive_lookup over the whole document.
+
+        :param company_facts_data: companyfacts document {"entityName": ..., "facts": {taxonomy: {concept: {...}}}}
+        """
+        concept_index = {}
+        for taxonomy_facts in company_facts_data.get("facts", {}).values():
+            for concept, concept_facts in taxonomy_facts.items():
+                concept_index.setdefault(concept, []).append(concept_facts)
+        return concept_index
+
     def get_dict_value(self, data, cik_number, key):
         company_data = data[cik_number]
         if isinstance(company_data, dict):
@@ -232,6 +283,47 @@ class Crawler:
         self.ipo_data.clear()
         self.sec_cik_numbers.clear()
 
+    async def __aenter__(
+        self,
+    ):
+        await self.get_session()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type,
+        exc_value,
+        traceback,
+    ):
+        await self.close_session()
+        self.__exit__(exc_type, exc_value, traceback)
+
+    async def get_session(
+        self,
+    ):
+        """
+        Return the shared aiohttp session, create it on first use.
+        Connections are kept alive and DNS lookups are cached, so TLS handshakes are reused between requests.
+        """
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=SEC_MAX_REQUESTS_PER_SECOND,
+                ttl_dns_cache=300,
+                keepalive_timeout=60,
+            )
+            self.session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+        return self.session
+
+    async def close_session(
+        self,
+    ):
+        """
+        Close the shared aiohttp session and its connection pool
+        """
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
     def check_cik_number_format(
         self,
         cik_number,
@@ -277,17 +369,67 @@ class Crawler:
             "Content-Type": "application/json",
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36",
         }
-        response = requests.get(
-            url,
-            headers=headers,
-        )
-        if response.status_code == 200:
-            json_data = response.json()
-        else:
-            raise Exception(f"Failed to get JSON data: {response.text}")
+        json_data = self.get_json_with_cache(url, headers)
 
         return json_data
 
+    def get_json_with_cache(
+        self,
+        url,
+        headers,
+    ):
+        """
+        Retrieve json data from data.sec.gov through the on-disk cache (synchronous)
+        Fresh cached responses are returned without request, older ones are revalidated with a conditional request.
+        Throttled (429) and failed (5xx) requests are retried with backoff, respecting Retry-After.
+
+        :param url: URL to get the data from
+        :param headers: request headers
+        """
+        try:
+            return self.request_json_with_cache(url, headers)
+        except CacheEntryError as e:
+            # the corrupt entry is removed, the response is downloaded again
+            print(f"Downloading again: [ {url} | {e} ]")
+            return self.request_json_with_cache(url, headers)
+
+    def request_json_with_cache(self, url, headers):
+        """
+        Retrieve json data from data.sec.gov through the on-disk cache (synchronous), see get_json_with_cache
+        :raises CacheEntryError: when the cached response can not be read
+        """
+        entry = self.cache.lookup(url) if self.cache is not None else None
+        if entry is not None and self.cache.is_fresh(entry):
+            return self.cache.load(entry)
+
+        conditional_headers = self.cache.conditional_headers(entry) if self.cache is not None else {}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = requests.get(
+                    url,
+                    headers={**headers, **conditional_headers},
+                )
+            except requests.exceptions.RequestException as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = get_retry_delay(attempt)
+                print(f"Retrying {url} in {delay:.1f}s: {e!r}")
+            else:
+                if response.status_code not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                    break
+                delay = get_retry_delay(attempt, response.headers.get("Retry-After"))
+                print(f"Retrying {url} in {delay:.1f}s: status {response.status_code}")
+            time.sleep(delay)
+        if response.status_code == 304 and entry is not None:
+            return self.cache.revalidated(url, entry)
+        if response.status_code == 200:
+            if self.cache is not None:
+                self.cache.store(
+                    url, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified")
+                )
+            return response.json()
+        raise Exception(f"Failed to get JSON data ({response.status_code}): {response.text}")
+
     def get_cik_number_fy_columns(self, excel_file, is_licensee):
         # get Licensee CIK 1_cleaned and Agreement Date
         # substract one year from the Agreement Date
@@ -297,7 +439,7 @@ class Crawler:
         :param excel_file: excel file with the data
         :param is_licensee: True if the excel file contains licensee data, False otherwise
         """
-        complete_df = pd.read_excel(excel_file, dtype=str)
+        complete_df = read_excel(excel_file, dtype=str)
         final_df = pd.DataFrame()
         licensee_columns = [
             col
@@ -372,87 +514,130 @@ class Crawler:
         :param file_path: path to the csv file
         """
 
-        parsed_data = {}
+        parsed_data = self.select_closest_10k_facts(json_data)
+        self.export_to_csv_file(parsed_data, file_path)
 
-        for k, v in json_data.items():
-            entry_ids_raw = v.keys()
-            entry_ids = [i for i in entry_ids_raw if self.is_str_convertible_to_int(i)]
-            for entry_id in entry_ids:
-                for kpi_var in self.kpi_variables:
-                    if kpi_var in v[entry_id]:
-                        try:
-                            unit = list(v[entry_id][kpi_var][0]["units"].keys())[0]
-                        except Exception as e:
-                            print(f"Error on parsing(unit): {e}")
-                            print(f"CIK number (value): {k}")
-                            continue
-
-                        try:
-                            value = v[entry_id][kpi_var][0]["units"][unit]
-                            sorted_values = sorted(value, key=lambda x: datetime.strptime(x["end"], "%Y-%m-%d"))
-                        except Exception as e:
-                            print(f"Error on parsing (value): {e}")
-                            print(f"CIK number (value): {k}")
-                            continue
-                        # value : will contain information about instances of the file
-                        # first: sort all instances inside the array object
-                        # then check from beginning to
-
-                        for i in sorted_values:
-                            if i["form"] == "10-K":
-                                agreement_date = v[entry_id]["agreementDate"]
-
-                                # convert agreement date to datetime object
-                                agreement_date = datetime.strptime(agreement_date, "%Y-%m-%d")
-                                end_date = datetime.strptime(i["end"], "%Y-%m-%d")
-
-                                # subtract the two dates
-
-                                # "agreementDate": "2019-08-31",
-                                # "endDate": "2011-01-02"
-
-                                # if end date is greater than agreement date, then the difference is negative
-
-                                if end_date > agreement_date:
-                                    diff = end_date - agreement_date
-                                else:
-                                    diff = agreement_date - end_date
-
-                                if "diffInDays" not in v[entry_id]:
-                                    v[entry_id]["diffInDays"] = abs(diff.days)
-                                elif "diffInDays" in v[entry_id]:
-                                    if abs(diff.days) < v[entry_id]["diffInDays"]:
-                                        v["diffInDays"] = abs(diff.days)
-
-                                if abs(diff.days) <= v[entry_id]["diffInDays"]:
-                                    v[entry_id]["diffInDays"] = abs(diff.days)
-                                    val = i["val"]
-                                    company_name = v["entityName"]
-                                    form_type = i["form"]
-
-                                    if k not in parsed_data:
-                                        parsed_data[k] = {}
-
-                                    if company_name not in parsed_data[k]:
-                                        parsed_data[k]["companyName"] = company_name
-
-                                    if entry_id not in parsed_data[k]:
-                                        parsed_data[k][entry_id] = {}
-
-                                    if kpi_var not in parsed_data[k][entry_id]:
-                                        parsed_data[k][entry_id][kpi_var] = {}
-
-                                    parsed_data[k][entry_id][kpi_var]["value"] = val
-                                    parsed_data[k][entry_id][kpi_var]["filedDate"] = i["filed"]
-                                    parsed_data[k][entry_id][kpi_var]["endDate"] = i["end"]
-                                    parsed_data[k][entry_id][kpi_var]["unit"] = unit
-                                    parsed_data[k][entry_id][kpi_var]["form"] = form_type
-                                    parsed_data[k][entry_id]["diffInDays"] = diff.days
-                                    parsed_data[k][entry_id]["agreementDate"] = str(agreement_date)
-                                    parsed_data[k][entry_id]["endDate"] = i["end"]
+    def select_closest_10k_facts(self, json_data: dict):
+        """
+        Select for each entry and KPI variable the 10-K fact whose end date is closest to the agreement date
 
-        self.export_to_csv_file(parsed_data, file_path)
+        All facts of all entries are flattened into one dataframe and the selection is done with grouped operations:
+        - the first unit of a KPI variable is used; a KPI variable with an unparsable end date is skipped
+        - the closest fact of a KPI variable is kept only if it is not farther than the closest fact of the
+          KPI variables before it (in order of self.kpi_variables) for the same entry
+        - on equal distance, the fact with the later end date (then the later position in the unit list) wins
+        - endDate and diffInDays of an entry are taken from its last selected KPI variable
 
+        :param json_data: {cik_number: {"entityName": ..., entry_id: {"agreementDate": ..., kpi_var: [facts]}}}
+        :return: {cik_number: {"companyName": ..., entry_id: {kpi_var: {...}, "diffInDays": ..., ...}}}
+        """
+        group_columns = {
+            "cik_pos": [],
+            "entry_pos": [],
+            "kpi_pos": [],
+            "unit": [],
+            "block": [],
+            "agreementDate": [],
+        }
+        fact_columns = {"block": [], "pos": [], "end": [], "val": [], "filed": [], "form": []}
+        blocks = {}
+        ciks = list(json_data.keys())
+        entries = []
+
+        # flatten: one row per (cik, entry, kpi) and one row per fact of each distinct unit list
+        for cik_pos, k in enumerate(ciks):
+            v = json_data[k]
+            entry_ids = [i for i in v.keys() if self.is_str_convertible_to_int(i)]
+            for entry_id in entry_ids:
+                entry_pos = len(entries)
+                entries.append(entry_id)
+                for kpi_pos, kpi_var in enumerate(self.kpi_variables):
+                    if kpi_var not in v[entry_id]:
+                        continue
+                    try:
+                        unit = list(v[entry_id][kpi_var][0]["units"].keys())[0]
+                    except Exception as e:
+                        print(f"Error on parsing(unit): {e}")
+                        print(f"CIK number (value): {k}")
+                        continue
+                    facts = v[entry_id][kpi_var][0]["units"][unit]
+                    if not isinstance(facts, list):
+                        print(f"Error on parsing (value): {unit} facts are not a list")
+                        print(f"CIK number (value): {k}")
+                        continue
+                    if id(facts) not in blocks:
+                        block = blocks[id(facts)] = len(blocks)
+                        for pos, fact in enumerate(facts):
+                            fact_columns["block"].append(block)
+                            fact_columns["pos"].append(pos)
+                            fact_columns["end"].append(fact.get("end"))
+                            fact_columns["val"].append(fact.get("val"))
+                            fact_columns["filed"].append(fact.get("filed"))
+                            fact_columns["form"].append(fact.get("form"))
+                    group_columns["cik_pos"].append(cik_pos)
+                    group_columns["entry_pos"].append(entry_pos)
+                    group_columns["kpi_pos"].append(kpi_pos)
+                    group_columns["unit"].append(unit)
+                    group_columns["block"].append(blocks[id(facts)])
+                    group_columns["agreementDate"].append(v[entry_id]["agreementDate"])
+
+        parsed_data = {}
+        if not group_columns["block"] or not fact_columns["block"]:
+            return parsed_data
+
+        groups = pd.DataFrame(group_columns)
+        groups["agreementDate"] = pd.to_datetime(groups["agreementDate"], format="%Y-%m-%d")
+        # keep values as python objects, int values must not be converted to float
+        facts = pd.DataFrame({c: pd.Series(values, dtype=object) for c, values in fact_columns.items()})
+        facts["block"] = facts["block"].astype("int64")
+        facts["pos"] = facts["pos"].astype("int64")
+        facts["endDate"] = pd.to_datetime(facts["end"], format="%Y-%m-%d", errors="coerce")
+
+        # unit lists with an unparsable end date are skipped entirely
+        invalid_blocks = facts.loc[facts["endDate"].isna(), "block"].unique()
+        for block in invalid_blocks:
+            print(f"Error on parsing (value): invalid end date in unit list {block}")
+        facts = facts[(facts["form"] == "10-K") & ~facts["block"].isin(invalid_blocks)]
+
+        keys = ["cik_pos", "entry_pos", "kpi_pos"]
+        candidates = groups.merge(facts, on="block", how="inner")
+        if candidates.empty:
+            return parsed_data
+        candidates["diffInDays"] = (candidates["endDate"] - candidates["agreementDate"]).abs().dt.days
+        candidates["minDiffInDays"] = candidates.groupby(keys)["diffInDays"].transform("min")
+
+        # a KPI variable is kept when its closest fact is the closest one seen so far for the entry
+        kpi_min = candidates.drop_duplicates(keys)[keys + ["minDiffInDays"]].sort_values(keys)
+        entry_cummin = kpi_min.groupby(["cik_pos", "entry_pos"])["minDiffInDays"].cummin()
+        kept_kpis = kpi_min.loc[kpi_min["minDiffInDays"] == entry_cummin, keys]
+
+        selected = candidates[candidates["diffInDays"] == candidates["minDiffInDays"]]
+        selected = selected.sort_values(keys + ["endDate", "pos"], kind="mergesort")
+        selected = selected.drop_duplicates(keys, keep="last").merge(kept_kpis, on=keys, how="inner")
+        selected = selected.sort_values(keys, kind="mergesort")
+
+        for row in selected.itertuples(index=False):
+            k = ciks[row.cik_pos]
+            entry_id = entries[row.entry_pos]
+            kpi_var = self.kpi_variables[row.kpi_pos]
+            if k not in parsed_data:
+                parsed_data[k] = {"companyName": json_data[k]["entityName"]}
+            if entry_id not in parsed_data[k]:
+                parsed_data[k][entry_id] = {}
+            parsed_data[k][entry_id][kpi_var] = {
+                "value": row.val,
+                "filedDate": row.filed,
+                "endDate": row.end,
+                "unit": row.unit,
+                "form": row.form,
+            }
+            parsed_data[k][entry_id]["diffInDays"] = int(row.diffInDays)
+            parsed_data[k][entry_id]["agreementDate"] = str(row.agreementDate.to_pydatetime())
+            parsed_data[k][entry_id]["endDate"] = row.end
+
+        return parsed_data
+
+    @staticmethod
     def create_entry_cik_number_mapping(file_path, is_licensee=True):
         """
         Create a dictionary from an Excel file with company names as keys and corresponding entry values as dictionary values.
@@ -469,7 +654,7 @@ class Crawler:
             raise Exception(f"File does not exist at {file_path}")
 
         # Read the Excel file
-        df = pd.read_excel(file_path)
+        df = read_excel(file_path)
         if is_licensee:
             company_cik_numbers = [
                 col for col in df.columns if col.startswith("Licensee") and col.endswith("cleaned") and "CIK" in col
@@ -478,24 +663,8 @@ class Crawler:
             company_cik_numbers = [
                 col for col in df.columns if col.startswith("Licensor") and col.endswith("cleaned") and "CIK" in col
             ]
-        # Create an empty dictionary
-        company_dict = {}
-
-        # Iterate over each row in the DataFrame
-        for index, row in df.iterrows():
-            entry = row["Entry"]
-
-            # Iterate over each company name column
-            for column in company_cik_numbers:
-                if not pd.isnull(row[column]):
-                    company_name = row[column]
-                    if company_name in company_dict:
-                        # Append the entry value to the existing list of values for the company
-                        company_dict[company_name].append(entry)
-                    else:
-                        # Create a new entry in the dictionary with the company name as the key
-                        company_dict[company_name] = [entry]
-
+        # {CIK number: [entry, ...]}
+        company_dict = map_values_to_entries(df, company_cik_numbers)
         return company_dict
 
     def is_str_convertible_to_int(self, value: str):
@@ -516,121 +685,358 @@ class Crawler:
         :param parsed_data: parsed data
         :param output_file: output file name
         """
-        data = ""
+        f, writer = self.open_csv_export(output_file)
+        with f:
+            self.write_parsed_data(writer, parsed_data)
+        print(f"Exported to {f.name}")
+
+    def open_csv_export(self, output_file: str):
+        """
+        Create the csv file in data folder and write the header
+        :param output_file: output file name
+        :return: (file, csv writer) tuple, the caller is responsible for closing the file
+        """
         delimeter = ";"
         # add reporting date column after each column name
         # for instance like this Revenues    |      Revenues reporting date        |       GrossProfit       |        GrossProfit reporting date etc
-
         all_header_info = self.not_financial_columns + self.kpi_variables
         output_file = os.path.join(os.path.abspath("data"), output_file)
-        with open(output_file, "w") as f:
-            writer = csv.writer(f, delimiter=delimeter)
-            writer.writerow(all_header_info)
-            cleaned_kpi_variables = [i for i in self.kpi_variables if not i.endswith("Reporting date")]
-            for k, v in parsed_data.items():
-                # get current company entry id
-                entry_ids = list(parsed_data[k].keys())
-                entry_ids.remove("companyName")
-
-                for entry_id in entry_ids:
-                    entry_id = str(entry_id)
-                    data += entry_id + delimeter
-
-                    data += str(k) + delimeter
-                    company_name = parsed_data[k]["companyName"]
-                    agreement_date = parsed_data[k][entry_id]["agreementDate"]
-                    end_date = parsed_data[k][entry_id]["endDate"]
-                    diff_in_days = parsed_data[k][entry_id]["diffInDays"]
-
-                    data += str(company_name) + delimeter
-                    data += str(agreement_date) + delimeter
-                    data += str(end_date) + delimeter
-                    data += str(diff_in_days) + delimeter
-
-                    for i in cleaned_kpi_variables:
-                        if i in parsed_data[k][entry_id]:
-                            data += str(parsed_data[k][entry_id][i]["value"]) + delimeter
-                            reporting_date = parsed_data[k][entry_id][i]["endDate"]
-                            data += reporting_date + delimeter
-                        else:
-                            if i == GROSS_PROFIT:
-                                if (
-                                    REVENUES in parsed_data[k][entry_id]
-                                    and COST_OF_GOODS_AND_SERVICES_SOLD in parsed_data[k][entry_id]
-                                ):
-                                    revenues = parsed_data[k][entry_id][REVENUES]["value"]
-                                    cost_of_goods_and_services = parsed_data[k][entry_id][
-                                        COST_OF_GOODS_AND_SERVICES_SOLD
-                                    ]["value"]
-                                    cn = parsed_data[k]["companyName"]
-                                    print(
-                                        f"{cn} GrossProfit is generated from Revenues and Cost of goods and services sold"
-                                    )
-                                    gross_profit = float(revenues) - float(cost_of_goods_and_services)
-                                    data += str(gross_profit) + delimeter
-                                    # todo: check here
-                                    reporting_date = parsed_data[k][entry_id][REVENUES]["filedDate"]
-                                    data += reporting_date + delimeter
-                            else:
-                                data += "NAN" + delimeter
-                                reporting_date = "NAN" + delimeter
-                                data += reporting_date
-                    f.write(data + "\n")
-                    data = ""
-        print(f"Exported to {output_file}")
+        f = open(output_file, "w", newline="")
+        writer = csv.writer(f, delimiter=delimeter, lineterminator="\n")
+        writer.writerow(all_header_info)
+        f.flush()
+        return f, writer
+
+    def write_parsed_data(self, writer, parsed_data: dict):
+        """
+        Write one row per entry of the parsed data
+        :param writer: csv writer returned by open_csv_export
+        :param parsed_data: parsed data, as returned by select_closest_10k_facts
+        """
+        for k in parsed_data.keys():
+            # get current company entry id
+            entry_ids = list(parsed_data[k].keys())
+            entry_ids.remove("companyName")
+            for entry_id in entry_ids:
+                writer.writerow(
+                    self.create_csv_row(k, parsed_data[k]["companyName"], str(entry_id), parsed_data[k][entry_id])
+                )
+
+    def write_company_result(self, f, writer, result):
+        """
+        Select the closest 10-K facts of a processed company entry and write its row right away
+        Rows are flushed to disk, so a crawl which stops midway keeps all rows written until then.
+
+        :param f: file returned by open_csv_export
+        :param writer: csv writer returned by open_csv_export
+        :param result: Tuple returned by process_company, None if the company is not found
+        :return: parsed data written to the file
+        """
+        if result is None:
+            return {}
+        json_data = {}
+        self.collect_company_result(json_data, result)
+        parsed_data = self.select_closest_10k_facts(json_data)
+        self.write_parsed_data(writer, parsed_data)
+        f.flush()
+        return parsed_data
+
+    def add_to_checkpoint(self, checkpoint, task, result, parsed_data):
+        """
+        Record a processed company entry in the checkpoint file
+        Companies which could not be retrieved for another reason than 404 (e.g. 429, 5xx) are not recorded,
+        so that they are requested again when the crawl is resumed.
+
+        :param checkpoint: CrawlCheckpoint instance
+        :param task: (entry_id, cik_number, company_name, agreement_date) tuple of the processed company
+        :param result: Tuple returned by process_company, None if the company is not found
+        :param parsed_data: parsed data returned by write_company_result
+        """
+        entry_id, cik_number, company_name, _ = task
+        not_found = NOT_FOUND_COMPANIES.get(company_name)
+        if result is None and (not_found is None or not_found["status"] != 404):
+            return
+        checkpoint.add(
+            entry_id,
+            cik_number,
+            company_name,
+            parsed_data=parsed_data,
+            not_found=not_found if result is None else None,
+            missing_kpi_vars=MISSING_KPI_VARS.get(company_name),
+        )
+
+    def restore_from_checkpoint(self, checkpoint, writer):
+        """
+        Write the rows of already processed entries and restore not found companies and missing KPI variables
+        :param checkpoint: CrawlCheckpoint instance loaded with resume=True
+        :param writer: csv writer returned by open_csv_export
+        """
+        for record in checkpoint.records.values():
+            company_name = record["company_name"]
+            self.write_parsed_data(writer, record["parsed_data"])
+            if record["not_found"] is not None and company_name not in NOT_FOUND_COMPANIES:
+                NOT_FOUND_COMPANIES[company_name] = record["not_found"]
+            if record["missing_kpi_vars"] is not None:
+                if company_name not in MISSING_KPI_VARS:
+                    MISSING_KPI_VARS[company_name] = record["missing_kpi_vars"]
+                else:
+                    for kpi_var in record["missing_kpi_vars"]["kpi_vars"]:
+                        if kpi_var not in MISSING_KPI_VARS[company_name]["kpi_vars"]:
+                            MISSING_KPI_VARS[company_name]["kpi_vars"].append(kpi_var)
+
+    def create_csv_row(self, cik_number, company_name, entry_id, entry_data):
+        """
+        Create the csv row of an entry, columns are ordered as not_financial_columns + kpi_variables
+        :param cik_number: CIK number of the company
+        :param company_name: name of the company
+        :param entry_id: entry id of the agreement
+        :param entry_data: parsed data of the entry {kpi_var: {...}, "agreementDate": ..., "endDate": ..., ...}
+        """
+        row = [
+            entry_id,
+            str(cik_number),
+            str(company_name),
+            str(entry_data["agreementDate"]),
+            str(entry_data["endDate"]),
+            str(entry_data["diffInDays"]),
+        ]
+        cleaned_kpi_variables = [i for i in self.kpi_variables if not i.endswith("Reporting date")]
+        for i in cleaned_kpi_variables:
+            if i in entry_data:
+                row += [str(entry_data[i]["value"]), entry_data[i]["endDate"]]
+            elif i == GROSS_PROFIT and REVENUES in entry_data and COST_OF_GOODS_AND_SERVICES_SOLD in entry_data:
+                revenues = entry_data[REVENUES]["value"]
+                cost_of_goods_and_services = entry_data[COST_OF_GOODS_AND_SERVICES_SOLD]["value"]
+                print(f"{company_name} GrossProfit is generated from Revenues and Cost of goods and services sold")
+                gross_profit = float(revenues) - float(cost_of_goods_and_services)
+                # todo: check here
+                row += [str(gross_profit), entry_data[REVENUES]["filedDate"]]
+            else:
+                row += ["NAN", "NAN"]
+        return row
+
+    def create_company_facts_filter(self):
+        """
+        Return a streaming parser which keeps only KPI variables and 10-K facts of a companyfacts document
+        """
+        concepts = [i for i in self.kpi_variables if not i.endswith("Reporting date")]
+        return CompanyFactsFilter(concepts=concepts, forms=["10-K"])
 
     async def get_company_raw_data(self, company_name, cik_number):
         """
-        Retrieve the raw company data from the SEC.gov website
+        Retrieve the company data from the SEC.gov website
+        The response is parsed while it is downloaded, only KPI variables with 10-K facts are kept in memory.
+        Entries sharing a CIK number do not download it at the same time: the next one waits for the first and is
+        usually served by the cache. A cached response which can not be read is downloaded again.
 
         :param company_name: Name of the company
         :param cik_number: CIK number of the company
         """
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik_number}.json"
-            async with session.get(url) as response:
-                if response.status == 200:
-                    json_data = await response.json()
-                    return json_data
-                else:
-                    if company_name not in NOT_FOUND_COMPANIES:
-                        timestamp_with_hour_minute = datetime.now(tz=LOCAL_TZ).strftime("%d_%m_%Y_%H_%M")
-                        NOT_FOUND_COMPANIES[company_name] = {
-                            "cik": cik_number,
-                            "status": response.status,
-                            "reason": response.reason,
-                            "link": url,
-                            "timestamp": timestamp_with_hour_minute,
-                        }
-                        print(
-                            f"No response: [  {company_name} | {cik_number} | reason: {response.reason} | status: {response.status} ]"
-                        )
+        url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik_number}.json"
+        async with self.get_url_lock(url):
+            try:
+                return await self.request_company_facts(company_name, cik_number, url)
+            except CacheEntryError as e:
+                # the corrupt entry is removed, the next lookup is a cache miss
+                print(f"Downloading again: [ {company_name} | {cik_number} | {e} ]")
+                return await self.request_company_facts(company_name, cik_number, url)
+
+    async def request_company_facts(self, company_name, cik_number, url):
+        """
+        Retrieve the company data of an url through the cache, see get_company_raw_data
+        :raises CacheEntryError: when the cached response can not be read
+        """
+        entry = self.cache.lookup(url) if self.cache is not None else None
+        if entry is not None and self.cache.is_fresh(entry):
+            return self.cache.read(entry, self.create_company_facts_filter().parse_file)
+
+        conditional_headers = self.cache.conditional_headers(entry) if self.cache is not None else {}
+        try:
+            return await self.request_with_retry(
+                url,
+                lambda response: self.read_company_facts_response(company_name, cik_number, url, entry, response),
+                headers=conditional_headers,
+                description=f"{company_name} | {cik_number}",
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.add_not_found_company(company_name, cik_number, None, repr(e), url)
+            return None
+
+    def get_url_lock(self, url):
+        """
+        Return the lock of an url, held while the url is requested and its response is cached
+        :param url: requested url
+        """
+        if url not in self.url_locks:
+            self.url_locks[url] = asyncio.Lock()
+        return self.url_locks[url]
+
+    async def request_with_retry(self, url, on_response, headers=None, description=None):
+        """
+        Send a GET request through the shared session, respecting the rate limit of SEC.gov
+        Throttled (429), failed (5xx) and timed out requests are retried with jittered exponential backoff, the request
+        rate is lowered while SEC.gov throttles and requests are paused when too many of them fail in a row.
+
+        :param url: requested url
+        :param on_response: coroutine function called with the final response (any status), its result is returned
+        :param headers: additional request headers
+        :param description: description of the request used in log messages, url by default
+        :raises aiohttp.ClientError, asyncio.TimeoutError: when the last attempt fails without response
+        """
+        session = await self.get_session()
+        circuit_breaker = self.get_circuit_breaker(url)
+        description = description or url
+        for attempt in range(self.max_retries + 1):
+            await circuit_breaker.wait()
+            await self.rate_limiter.acquire()
+            try:
+                async with session.get(url, headers=headers or {}) as response:
+                    if response.status not in RETRYABLE_STATUSES:
+                        self.rate_controller.on_success()
+                        circuit_breaker.record_success()
+                        return await on_response(response)
+                    self.rate_controller.on_throttled()
+                    circuit_breaker.record_failure()
+                    if attempt == self.max_retries:
+                        return await on_response(response)
+                    delay = get_retry_delay(attempt, response.headers.get("Retry-After"))
+                    if parse_retry_after(response.headers.get("Retry-After")) is not None:
+                        # every request to the host waits, not only the throttled one
+                        circuit_breaker.pause(delay)
+                    print(f"Retrying in {delay:.1f}s: [ {description} | status: {response.status} ]")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                circuit_breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                delay = get_retry_delay(attempt)
+                print(f"Retrying in {delay:.1f}s: [ {description} | error: {e!r} ]")
+            await asyncio.sleep(delay)
+
+    async def read_company_facts_response(self, company_name, cik_number, url, entry, response):
+        """
+        Parse a (non retryable) companyfacts response while it is downloaded and store it in the cache
+        :param company_name: Name of the company
+        :param cik_number: CIK number of the company
+        :param url: requested url
+        :param entry: cache metadata of the url, None if it is not cached
+        :param response: aiohttp response
+        """
+        if response.status == 304 and entry is not None:
+            self.cache.touch(url, entry)
+            return self.cache.read(entry, self.create_company_facts_filter().parse_file)
+        if response.status == 200:
+            company_facts_filter = self.create_company_facts_filter()
+            writer = None
+            if self.cache is not None:
+                writer = self.cache.open_writer(
+                    url, response.headers.get("ETag"), response.headers.get("Last-Modified")
+                )
+            try:
+                async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+                    company_facts_filter.feed(chunk)
+                    if writer is not None:
+                        writer.write(chunk)
+                json_data = company_facts_filter.close()
+            except BaseException:
+                if writer is not None:
+                    writer.abort()
+                raise
+            if writer is not None:
+                writer.commit()
+            return json_data
+        self.add_not_found_company(company_name, cik_number, response.status, response.reason, url)
+
+    def get_circuit_breaker(self, url):
+        """
+        Return the circuit breaker of the host of given url
+        :param url: requested url
+        """
+        host = urlparse(url).netloc
+        if host not in self.circuit_breakers:
+            self.circuit_breakers[host] = CircuitBreaker()
+        return self.circuit_breakers[host]
+
+    def get_company_archive_data(self, company_name, cik_number):
+        """
+        Retrieve the company data from the local companyfacts.zip archive, no request is made to SEC.gov
+        The archive member is parsed while it is decompressed, only KPI variables with 10-K facts are kept in memory.
 
-    async def get_company_facts_data(self, df):
+        :param company_name: Name of the company
+        :param cik_number: CIK number of the company
+        """
+        member = self.companyfacts_archive.open_company_facts(cik_number)
+        if member is None:
+            self.add_not_found_company(
+                company_name,
+                cik_number,
+                404,
+                "Not Found in companyfacts archive",
+                f"{self.companyfacts_archive.archive_path}:{self.companyfacts_archive.member_name(cik_number)}",
+            )
+            return None
+        with member:
+            return self.create_company_facts_filter().parse_file(member)
+
+    def add_not_found_company(self, company_name, cik_number, status, reason, link):
+        """
+        Record a company whose company facts could not be retrieved
+
+        :param company_name: Name of the company
+        :param cik_number: CIK number of the company
+        :param status: HTTP status code of the response
+        :param reason: reason of the response
+        :param link: requested link
+        """
+        if company_name not in NOT_FOUND_COMPANIES:
+            timestamp_with_hour_minute = datetime.now(tz=LOCAL_TZ).strftime("%d_%m_%Y_%H_%M")
+            NOT_FOUND_COMPANIES[company_name] = {
+                "cik": cik_number,
+                "status": status,
+                "reason": reason,
+                "link": link,
+                "timestamp": timestamp_with_hour_minute,
+            }
+            print(f"No response: [  {company_name} | {cik_number} | reason: {reason} | status: {status} ]")
+
+    async def get_company_facts_data(self, df, on_result=None):
         """
         Retrieve the company facts data asynchronously
 
         :param df: Dataframe containing the company names and CIK numbers
+        :param on_result: optional callback called with (task, result) of each processed company as soon as it is
+                          ready, where task is (entry_id, cik_number, company_name, agreement_date) and result is the
+                          return value of process_company; results are not kept in memory when it is given
         """
-        tasks = []
         results = {}
+        queue = asyncio.Queue()
         for index, row in df.iterrows():
-            entry_id = row["Entry"]
-            cik_number = row["CIK Number"]
-            company_name = row["Company Name"]
-            agreement_date = row["Agreement Date"]
-
-            tasks.append(
-                asyncio.ensure_future(self.process_company(entry_id, cik_number, company_name, agreement_date))
-            )
-            if len(tasks) == 10:
-                results.update(await self.run_parallel_requests(tasks))
-                tasks = []
+            queue.put_nowait((row["Entry"], row["CIK Number"], row["Company Name"], row["Agreement Date"]))
 
-        if tasks:
-            results.update(await self.run_parallel_requests(tasks))
+        async def worker():
+            # each worker picks the next company as soon as its previous request is done,
+            # so a slow response blocks only its own slot
+            while True:
+                try:
+                    task = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await self.process_company(*task)
+                if on_result is not None:
+                    on_result(task, result)
+                else:
+                    self.collect_company_result(results, result)
 
-        print(f"Total number of companies: {len(results)}")
+        number_of_workers = max(1, min(self.max_concurrent_requests, queue.qsize()))
+        workers = [asyncio.ensure_future(worker()) for _ in range(number_of_workers)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+            await self.close_session()
+
+        if on_result is None:
+            print(f"Total number of companies: {len(results)}")
         return results
 
     async def process_company(self, entry_id, cik_number, company_name, agreement_date):
@@ -640,13 +1046,28 @@ class Crawler:
         :param company_name: Name of the company
         :param agreement_date: License agreement date of the company
         """
-        company_facts_data = await self.get_company_raw_data(company_name, cik_number)
+        try:
+            if self.companyfacts_archive is not None:
+                company_facts_data = self.get_company_archive_data(company_name, cik_number)
+            else:
+                company_facts_data = await self.get_company_raw_data(company_name, cik_number)
+        except ijson.JSONError as e:
+            # one invalid companyfacts document must not stop the crawl of the other companies
+            self.add_not_found_company(
+                company_name,
+                cik_number,
+                None,
+                f"Invalid companyfacts document: {e!r}",
+                f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik_number}.json",
+            )
+            return None
         if company_facts_data:
             kpi_data = {}
             # remove all elements which ends with "Reporting date"
             revisioned_kpi_vars = [i for i in self.kpi_variables if not i.endswith("Reporting date")]
+            concept_index = self.index_company_facts(company_facts_data)
             for kpi_var in revisioned_kpi_vars:
-                kpi_information = list(self.recursive_lookup(company_facts_data, kpi_var))
+                kpi_information = concept_index.get(kpi_var, [])
                 if kpi_information:
                     kpi_data[kpi_var] = kpi_information
                 else:
@@ -669,26 +1090,23 @@ class Crawler:
                     # )
             return (entry_id, cik_number, agreement_date, company_facts_data["entityName"], kpi_data)
 
-    async def run_parallel_requests(self, tasks):
+    def collect_company_result(self, results, result):
         """
-        Run the parallel requests
-        :param tasks: List of tasks to run
+        Add the result of a processed company to the results dictionary
+        :param results: Results dictionary {cik_number: {"entityName": ..., entry_id: {...}}}
+        :param result: Tuple returned by process_company, None if the company is not found
         """
-        results = {}
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            for result in await asyncio.gather(*tasks):
-                if result is not None:
-                    entry_id, cik_number, agreement_date, entity_name, kpi_data = result
-                    if cik_number not in results:
-                        results[cik_number] = {}
-
-                    results[cik_number]["entityName"] = entity_name
-                    if str(agreement_date.date()) not in results[cik_number]:
-                        results[cik_number][entry_id] = {}
-                        results[cik_number][entry_id]["agreementDate"] = str(agreement_date.date())
-                    results[cik_number][entry_id].update(kpi_data)
-                await asyncio.sleep(0.1)  # 10 requests per second max
-        return results
+        if result is None:
+            return
+        entry_id, cik_number, agreement_date, entity_name, kpi_data = result
+        if cik_number not in results:
+            results[cik_number] = {}
+
+        results[cik_number]["entityName"] = entity_name
+        if str(agreement_date.date()) not in results[cik_number]:
+            results[cik_number][entry_id] = {}
+            results[cik_number][entry_id]["agreementDate"] = str(agreement_date.date())
+        results[cik_number][entry_id].update(kpi_data)
 
     def get_data_from_sec_gov_in_parallel(
         self,
@@ -720,18 +1138,100 @@ class Crawler:
         else:
             cik_number = url.split(".json")[0].split("CIK")[1]
             print(f"requesting data from {url}")
-            response = requests.get(
-                url,
-                headers=headers,
-            )
-            if response.status_code == 200:
-                json_data = response.json()
-            else:
-                raise Exception(f"Failed to get JSON data: {response.text}")
+            json_data = self.get_json_with_cache(url, headers)
             json_data["cik_number"] = cik_number
 
         results.append(json_data)
 
+    async def get_json_from_sec_gov(self, url):
+        """
+        Retrieve json data from data.sec.gov through the on-disk cache and the shared session (asynchronous)
+        :param url: URL to get the data from
+        """
+        async with self.get_url_lock(url):
+            try:
+                return await self.request_json_from_sec_gov(url)
+            except CacheEntryError as e:
+                # the corrupt entry is removed, the response is downloaded again
+                print(f"Downloading again: [ {url} | {e} ]")
+                return await self.request_json_from_sec_gov(url)
+
+    async def request_json_from_sec_gov(self, url):
+        """
+        Retrieve json data of an url through the cache, see get_json_from_sec_gov
+        :raises CacheEntryError: when the cached response can not be read
+        """
+        entry = self.cache.lookup(url) if self.cache is not None else None
+        if entry is not None and self.cache.is_fresh(entry):
+            return self.cache.load(entry)
+
+        async def read_response(response):
+            if response.status == 304 and entry is not None:
+                return self.cache.revalidated(url, entry)
+            if response.status == 200:
+                body = await response.read()
+                if self.cache is not None:
+                    self.cache.store(url, body, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                return json.loads(body)
+            raise Exception(f"Failed to get JSON data ({response.status}): {await response.text()}")
+
+        conditional_headers = self.cache.conditional_headers(entry) if self.cache is not None else {}
+        return await self.request_with_retry(url, read_response, headers=conditional_headers)
+
+    async def get_submission_data(self, company_name, url):
+        """
+        Get the submissions data of a company from the SEC.gov website
+        :param company_name: Name of the company
+        :param url: https://data.sec.gov/submissions/CIK##########.json, empty string if the CIK number is unknown
+        """
+        if url == "":
+            print(f"No CIK number to look up for : {company_name}")
+            return {"name": company_name, "cik_number": ""}
+        cik_number = url.split(".json")[0].split("CIK")[1]
+        print(f"requesting data from {url}")
+        json_data = await self.get_json_from_sec_gov(url)
+        json_data["cik_number"] = cik_number
+        return json_data
+
+    async def get_submissions_data(self, company_info):
+        """
+        Get the submissions data of many companies with a fixed number of workers sharing one session
+
+        :param company_info: {company_name: submissions url}
+        :return: (results, errors) where results are ordered as company_info and
+                 errors is {company_name: error message} of the companies which could not be retrieved
+        """
+        tasks = list(company_info.items())
+        results = [None] * len(tasks)
+        errors = {}
+        queue = asyncio.Queue()
+        for index in range(len(tasks)):
+            queue.put_nowait(index)
+
+        async def worker():
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                company_name, url = tasks[index]
+                try:
+                    results[index] = await self.get_submission_data(company_name, url)
+                except Exception as e:
+                    print(f"Failed to get submissions: [ {company_name} | {url} | {e!r} ]")
+                    errors[company_name] = repr(e)
+
+        number_of_workers = max(1, min(self.max_concurrent_requests, queue.qsize()))
+        workers = [asyncio.ensure_future(worker()) for _ in range(number_of_workers)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+            await self.close_session()
+
+        return [result for result in results if result is not None], errors
+
     def lookup_cik(
         self,
         company_name,
@@ -803,10 +1303,7 @@ class Crawler:
         Generate a pandas dataframe from the excel file
         :param file_path: path to the excel file
         """
-        df = pd.read_excel(
-            file_path,
-            engine="openpyxl",
-        )
+        df = read_excel(file_path)
         return df
 
     # check if the state code belongs to the US
@@ -1082,9 +1579,6 @@ def create_input_file_for_orbis_batch_search(
             "country",
             "identifier",
         ]
-        # Set the maximum number of requests per second
-
-        max_requests_per_second = 10  # defined by SEC.gov
         company_info = {}
 
         for (
@@ -1092,11 +1586,11 @@ def create_input_file_for_orbis_batch_search(
             row,
         ) in df.iterrows():
             try:
-                company_name = row[0]
+                company_name = row.iloc[0]
 
                 if company_name == "":
                     continue
-                cik_number = row[1]
+                cik_number = row.iloc[1]
             except IndexError as e:
                 raise Exception(f"Index error: {e}")
             if crawler.check_cik_number_format(cik_number):
@@ -1104,24 +1598,11 @@ def create_input_file_for_orbis_batch_search(
             else:
                 company_info[company_name] = ""
 
-        threads = [
-            Thread(
-                target=crawler.get_data_from_sec_gov_in_parallel,
-                args=(
-                    url,
-                    company_name,
-                    results,
-                ),
-            )
-            for company_name, url in company_info.items()
-        ]
-
-        for thread in threads:
-            thread.start()
-            time.sleep(1 / max_requests_per_second)
-
-        for thread in threads:
-            thread.join()
+        # requests share one session and are sent by a fixed number of workers at SEC.gov rate limit
+        results, errors = asyncio.run(crawler.get_submissions_data(company_info))
+        if errors:
+            print(f"Failed to get submissions of {len(errors)} companies")
+            dump_to_json_file(data=errors, file_name="failed_submissions_from_sec_gov.json")
 
         save_raw_data(
             results,
@@ -1200,6 +1681,38 @@ async def main():
         required=True,
         action=argparse.BooleanOptionalAction,
     )
+    parser.add_argument(
+        "--cache",
+        type=bool,
+        help="use the on-disk cache of SEC.gov responses (data/sec_cache), --no-cache to always download",
+        default=True,
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--cache_max_age",
+        type=float,
+        help="hours until a cached response is revalidated with SEC.gov",
+        default=DEFAULT_MAX_AGE_IN_HOURS,
+    )
+    parser.add_argument(
+        "--cache_max_size",
+        type=float,
+        help="maximum size of the cache in MB, least recently used responses are evicted",
+        default=DEFAULT_MAX_SIZE_IN_MB,
+    )
+    parser.add_argument(
+        "--bulk_file",
+        type=str,
+        help="path to SEC.gov bulk companyfacts.zip archive, company facts are read from it instead of SEC.gov API",
+        required=False,
+    )
+    parser.add_argument(
+        "--resume",
+        type=bool,
+        help="resume an interrupted crawl of the same source file, entries in its checkpoint file are not requested again",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+    )
     # if no arguments are provided, print the help message
     if len(sys.argv) == 1:
         print(
@@ -1222,9 +1735,17 @@ async def main():
         source_file = os.path.join(os.path.abspath("data"), args.source_file)
 
     crawler = Crawler()
+    if args.cache:
+        crawler.cache = SECResponseCache(max_age_in_hours=args.cache_max_age, max_size_in_mb=args.cache_max_size)
+    else:
+        crawler.cache = None
+    if args.bulk_file:
+        bulk_file = args.bulk_file
+        if not is_absolute_path(bulk_file):
+            bulk_file = os.path.join(os.path.abspath("data"), bulk_file)
+        crawler.companyfacts_archive = CompanyFactsArchive(bulk_file)
+        print(f"reading company facts from {bulk_file}")
     print(f"is licensee information {is_licensee}")
-    fy_cik_df = crawler.get_cik_number_fy_columns(source_file, is_licensee=is_licensee)
-    company_info = await crawler.get_company_facts_data(fy_cik_df)
 
     if is_licensee:
         not_found_file_name = f"no_response_licensee_{timestamp}.json"
@@ -1237,15 +1758,42 @@ async def main():
         if not args.output_file:
             output_file = f"company_facts_{timestamp}_licensor.csv"
 
+    fy_cik_df = crawler.get_cik_number_fy_columns(source_file, is_licensee=is_licensee)
+    # every processed (Entry, CIK Number) is recorded in the checkpoint file, see --resume
+    source_name = os.path.splitext(os.path.basename(source_file))[0]
+    checkpoint_file = os.path.join(
+        os.path.abspath("data"), f"checkpoint_{'licensee' if is_licensee else 'licensor'}_{source_name}.jsonl"
+    )
+    checkpoint = CrawlCheckpoint(checkpoint_file, resume=args.resume)
+    if checkpoint.rotated_path:
+        print(f"previous checkpoint {checkpoint_file} is not resumed, it is kept as {checkpoint.rotated_path}")
+    # company facts are written to the csv file as soon as each company is processed
+    f, writer = crawler.open_csv_export(output_file)
+    if args.resume:
+        crawler.restore_from_checkpoint(checkpoint, writer)
+        is_done = [(e, c) in checkpoint for e, c in zip(fy_cik_df["Entry"], fy_cik_df["CIK Number"])]
+        fy_cik_df = fy_cik_df[[not done for done in is_done]]
+        print(f"resuming from {checkpoint_file}: {len(checkpoint)} entries already processed")
+
+    def on_result(task, result):
+        parsed_data = crawler.write_company_result(f, writer, result)
+        crawler.add_to_checkpoint(checkpoint, task, result, parsed_data)
+
+    try:
+        await crawler.get_company_facts_data(fy_cik_df, on_result=on_result)
+    finally:
+        f.close()
+        checkpoint.close()
+        if crawler.companyfacts_archive is not None:
+            crawler.companyfacts_archive.close()
+    print(f"Exported to {f.name}")
+
     for k, v in MISSING_KPI_VARS.items():
         MISSING_KPI_VARS[k]["number_of_missing_kpi_vars"] = len(v["kpi_vars"])
 
     dump_to_json_file(data=NOT_FOUND_COMPANIES, file_name=not_found_file_name)
     dump_to_json_file(data=MISSING_KPI_VARS, file_name=missing_kpi_var_file_name)
 
-    # save company facts
-    crawler.parse_export_data_to_csv(company_info, output_file)
-
 
 if __name__ == "__main__":
     asyncio.run(main())
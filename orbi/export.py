@@ -0,0 +1,138 @@
+# author: mrtrkmn@github
+# description: Write result frames to xlsx with a streaming (constant memory) writer, optionally to CSV/Parquet as well
+
+import os
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+EXCEL_MAX_ROWS = 1048576
+# rows converted to python values at once, bounds the memory used on top of the frame itself
+WRITE_CHUNK_SIZE = 10000
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+def get_export_formats(value):
+    """
+    Return the formats of a comma separated list such as "csv,parquet", unknown formats raise an exception
+    :param value: comma separated formats, None or empty for no additional format
+    """
+    formats = [f.strip().lower() for f in (value or "").split(",") if f.strip()]
+    unknown = [f for f in formats if f not in EXPORT_FORMATS]
+    if unknown:
+        raise Exception(f"Unknown export formats {unknown}, supported formats are {list(EXPORT_FORMATS)}")
+    return formats
+
+
+def iter_rows(df, index=False):
+    """
+    Yield the rows of a dataframe as lists of python values, missing values are None (blank cells)
+    :param df: dataframe
+    :param index: prepend the index value to each row
+    """
+    for start in range(0, len(df), WRITE_CHUNK_SIZE):
+        chunk = df.iloc[start : start + WRITE_CHUNK_SIZE]
+        if index:
+            chunk = chunk.reset_index()
+        values = chunk.to_numpy(dtype=object, copy=True)
+        values[pd.isna(chunk).to_numpy()] = None
+        # infinite numbers are written as text, like pandas (inf_rep="inf")
+        for position in np.flatnonzero((chunk.dtypes.map(pd.api.types.is_float_dtype)).to_numpy()):
+            column = chunk.iloc[:, position].to_numpy()
+            values[column == np.inf, position] = "inf"
+            values[column == -np.inf, position] = "-inf"
+        yield from values.tolist()
+
+
+def write_sheet(workbook, df, sheet_name, index=False):
+    """
+    Write a dataframe to a new worksheet row by row, header first
+    :param workbook: xlsxwriter workbook
+    :param df: dataframe
+    :param sheet_name: name of the worksheet
+    :param index: write the index as first column, like pandas.DataFrame.to_excel
+    """
+    if len(df) + 1 > EXCEL_MAX_ROWS:
+        raise ValueError(f"Sheet {sheet_name} has {len(df)} rows, more than the {EXCEL_MAX_ROWS - 1} rows of a sheet")
+    worksheet = workbook.add_worksheet(sheet_name)
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    header = [str(column) for column in df.columns]
+    if index:
+        header = [str(df.index.name) if df.index.name is not None else None] + header
+    worksheet.write_row(0, 0, header, header_format)
+    for row_number, row in enumerate(iter_rows(df, index=index), start=1):
+        worksheet.write_row(row_number, 0, row)
+
+
+def write_xlsx(file_name, sheets, index=False):
+    """
+    Write dataframes to the sheets of one xlsx file in a single pass
+
+    The workbook is written with xlsxwriter in constant memory mode: each row is flushed to a temporary file as soon
+    as the next row starts, the workbook is never held in memory as a whole.
+
+    :param file_name: path to the xlsx file, overwritten if it exists
+    :param sheets: {sheet name: dataframe}, sheets are written in this order
+    :param index: write the index of each dataframe as first column
+    """
+    options = {
+        "constant_memory": True,
+        "strings_to_urls": False,
+        "nan_inf_to_errors": True,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+    }
+    with xlsxwriter.Workbook(file_name, options) as workbook:
+        for sheet_name, df in sheets.items():
+            write_sheet(workbook, df, sheet_name, index=index)
+
+
+def get_export_file_name(file_name, sheet_name, extension, single_sheet):
+    base_name = os.path.splitext(file_name)[0]
+    if single_sheet:
+        return f"{base_name}.{extension}"
+    return f"{base_name}_{sheet_name}.{extension}"
+
+
+def write_parquet(df, file_name, index=False):
+    """
+    Write a dataframe to Parquet, object columns mixing strings and other values are written as strings
+    :param df: dataframe
+    :param file_name: path to the parquet file
+    :param index: write the index of the dataframe
+    """
+    try:
+        df.to_parquet(file_name, index=index)
+    except (TypeError, ValueError):
+        # e.g. a column with both numbers and strings (pyarrow ArrowTypeError/ArrowInvalid)
+        df = df.copy()
+        df.columns = [str(column) for column in df.columns]
+        for column in df.columns[(df.dtypes == object).to_numpy()]:
+            df[column] = df[column].map(str, na_action="ignore")
+        df.to_parquet(file_name, index=index)
+
+
+def export_sheets(file_name, sheets, index=False, formats=()):
+    """
+    Write dataframes to an xlsx file and, optionally, the same dataframes to CSV and/or Parquet files
+
+    CSV and Parquet files are written next to the xlsx file, one file per sheet: <file>_<sheet name>.csv, or
+    <file>.csv when there is a single sheet. CSV files use ";" as delimiter, like the other CSV files of orbi.
+
+    :param file_name: path to the xlsx file
+    :param sheets: {sheet name: dataframe}
+    :param index: write the index of each dataframe
+    :param formats: additional formats, any of "csv", "parquet"
+    :return: list of written files, xlsx file first
+    """
+    write_xlsx(file_name, sheets, index=index)
+    written = [file_name]
+    for export_format in formats:
+        for sheet_name, df in sheets.items():
+            export_file_name = get_export_file_name(file_name, sheet_name, export_format, len(sheets) == 1)
+            if export_format == "csv":
+                df.to_csv(export_file_name, sep=";", index=index)
+            elif export_format == "parquet":
+                write_parquet(df, export_file_name, index=index)
+            written.append(export_file_name)
+    return written
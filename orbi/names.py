@@ -0,0 +1,134 @@
+# author: mrtrkmn@github
+# description: Company name normalization and company name -> Entry mappings of license workbooks
+
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import unidecode
+
+DEFAULT_CACHE_SIZE = 2**16
+
+
+class NameCanonicalizer:
+    """
+    Turns raw company names into the canonical form used to match them.
+
+    The rules are applied in this order: transliteration to ASCII (unidecode), uppercase, removal of substrings,
+    stripping of leading/trailing whitespace. Removed substrings are compiled once; canonical names are kept in an
+    LRU cache, so a name is canonicalized once per run no matter how many cells or functions it appears in.
+
+    :param transliterate: transliterate to ASCII with unidecode, e.g. "Société" -> "Societe"
+    :param upper: convert to uppercase
+    :param remove: substrings removed one after another, e.g. ["/DE", "/NEW/"]
+    :param strip: remove leading/trailing whitespace
+    :param exclude: regular expression (case insensitive) of names which are not company names, see is_excluded
+    :param cache_size: number of canonical names kept in the cache
+    """
+
+    def __init__(
+        self, transliterate=False, upper=False, remove=(), strip=False, exclude=None, cache_size=DEFAULT_CACHE_SIZE
+    ):
+        self.transliterate = transliterate
+        self.upper = upper
+        self.remove = [re.compile(re.escape(substring)) for substring in remove]
+        self.strip = strip
+        self.exclude = re.compile(exclude, re.IGNORECASE) if exclude else None
+        self.canonicalize = lru_cache(maxsize=cache_size)(self.apply_rules)
+
+    def apply_rules(self, name):
+        """
+        Return the canonical form of a name without using the cache, use canonicalize instead
+        :param name: raw company name (any value, it is converted to str)
+        """
+        name = str(name)
+        if self.transliterate:
+            name = unidecode.unidecode(name)
+        if self.upper:
+            name = name.upper()
+        for pattern in self.remove:
+            name = pattern.sub("", name)
+        if self.strip:
+            name = name.strip()
+        return name
+
+    def canonicalize_series(self, series):
+        """
+        Return the canonical names of a series, each distinct name is canonicalized once
+        Missing and non string values become NaN, like with pandas .str methods.
+
+        :param series: pandas Series of raw company names
+        """
+        is_name = series.map(lambda value: isinstance(value, str), na_action="ignore").fillna(False).astype(bool)
+        canonical = pd.Series(np.nan, index=series.index, dtype=object)
+        codes, uniques = pd.factorize(series[is_name])
+        if len(codes):
+            canonical[is_name] = np.array([self.canonicalize(name) for name in uniques], dtype=object)[codes]
+        if isinstance(series.dtype, pd.StringDtype):
+            canonical = canonical.astype(series.dtype)
+        return canonical
+
+    def is_excluded(self, series):
+        """
+        Return a boolean series, True for the names matching the exclude pattern
+        :param series: pandas Series of (canonical) company names
+        """
+        if self.exclude is None:
+            return pd.Series(False, index=series.index)
+        return series.str.contains(self.exclude, na=False)
+
+
+# names of licensees / licensors in license workbooks
+COMPANY_NAME_CANONICALIZER = NameCanonicalizer(
+    transliterate=True, upper=True, remove=["\n"], strip=True, exclude=r"Unknown|Inventor|https"
+)
+# "Company name Latin alphabet" of Orbis exports
+ORBIS_COMPANY_NAME_CANONICALIZER = NameCanonicalizer(upper=True)
+# entity names of SEC.gov company facts, e.g. "Apple Inc/DE" -> "APPLE INC"
+SEC_COMPANY_NAME_CANONICALIZER = NameCanonicalizer(upper=True, remove=["/DE", "/NEW/"])
+
+
+def normalize_values(series, normalize):
+    """
+    Apply normalize once per distinct value of a series
+    :param series: pandas Series
+    :param normalize: function applied to each distinct value
+    """
+    normalized = pd.Series(None, index=series.index, dtype=object)
+    missing = series.isna()
+    codes, uniques = pd.factorize(series[~missing])
+    if len(codes):
+        normalized[~missing] = np.array([normalize(value) for value in uniques], dtype=object)[codes]
+    # missing values are normalized one by one, factorize would not tell None and NaN apart
+    normalized[missing] = [normalize(value) for value in series[missing]]
+    return normalized
+
+
+def map_values_to_entries(df, columns, normalize=None, dropna=True, drop_empty=False, entry_column="Entry"):
+    """
+    Return {value: [entry, ...]} for the values of given columns, e.g. {"APPLE INC.": [12, 57]}
+
+    The columns are reshaped into one long column, normalized and grouped by value. Values and entries are in
+    the order of iterating the rows and, within a row, the columns; same as nested loops over df.iterrows().
+
+    :param df: dataframe with entry_column and columns
+    :param columns: columns containing the values, e.g. ["Licensee 1_cleaned", "Licensee 2_cleaned"]
+    :param normalize: optional function applied once per distinct value, e.g. COMPANY_NAME_CANONICALIZER.canonicalize
+    :param dropna: skip missing values (before normalization)
+    :param drop_empty: skip values which are empty strings (after normalization)
+    :param entry_column: column with the id of the row
+    """
+    if not columns:
+        return {}
+    # row by row, column by column
+    values = df[columns].to_numpy(dtype=object).ravel()
+    entries = np.repeat(df[entry_column].to_numpy(dtype=object), len(columns))
+    long_df = pd.DataFrame({"value": pd.Series(values, dtype=object), "entry": pd.Series(entries, dtype=object)})
+    if dropna:
+        long_df = long_df[long_df["value"].notna()]
+    if normalize is not None:
+        long_df["value"] = normalize_values(long_df["value"], normalize)
+    if drop_empty:
+        long_df = long_df[long_df["value"] != ""]
+    return long_df.groupby("value", sort=False, dropna=False)["entry"].agg(list).to_dict()
@@ -0,0 +1,588 @@
+# author: mrtrkmn@github
+# description: Offline processing of Orbis data (GUO/ISH inputs, aggregation, post processing) without the browser stack
+#
+# Importing this module is cheap: pandas, numpy, yaml and the excel helpers are imported by the functions which need
+# them, selenium, webdriver_manager and slack_sdk are not imported at all. The functions only need an OrbisConfig
+# (settings) instead of an Orbis instance, so they can run in worker processes or as quick commands:
+#
+#   python orbi/offline.py aggregate orbis_data_licensee.xlsx orbis_aggregated_data_licensee.xlsx
+
+import os  # isort:skip
+import sys  # isort:skip
+
+root_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(root_path)
+
+import hashlib
+import logging
+import pathlib
+from argparse import ArgumentParser
+from datetime import datetime
+from os import environ, path
+
+from variables import FINANCIAL_VARIABLES, NOT_MATCHED_COMPANIES_FILE_NAME  # isort:skip
+
+logger = logging.getLogger()
+
+# financial columns of the batch search, see FINANCIAL_VARIABLES
+FINANCIAL_COLUMNS = list(FINANCIAL_VARIABLES)
+
+
+def read_config(config_path):
+    """
+    Read a YAML configuration file.
+
+    :param config_path (str): The config_path to the YAML configuration file.
+
+    :return:
+    dict: A dictionary with the configuration settings.
+    """
+    import yaml
+
+    with open(config_path, "r", encoding="UTF-8") as f:
+        try:
+            config = yaml.safe_load(f)
+        except yaml.YAMLError as exc:
+            raise exc
+    return config
+
+
+class OrbisConfig:
+    """
+    Settings of orbi: Orbis urls and credentials, Slack, data directory and data source.
+
+    Settings are read from the config file (CONFIG_PATH) when LOCAL_DEV is True, from environment variables otherwise.
+    No browser is started, the offline functions of this module only need these settings. Orbis extends this class.
+    """
+
+    def __init__(self):
+        if environ.get("LOCAL_DEV") == "True":
+            config = self.read_config(environ.get("CONFIG_PATH"))
+            self.orbis_access_url = config["orbis"]["urls"]["access"]
+            self.orbis_batch_search_url = config["orbis"]["urls"]["batch"]
+            self.orbis_logout_url = config["orbis"]["urls"]["logout"]
+            self.email_address = config["orbis"]["email"]
+            self.parallel_execution = config["orbis"]["parallel_execution"]
+            self.data_dir = config["data"]["path"]
+            self.password = config["orbis"]["password"]
+            self.send_data_on_completion = config["slack"]["send_on_demand"]
+            self.slack_channel = config["slack"]["channel"]
+            self.slack_token = config["slack"]["token"]
+            self.data_source = config["data"]["source"]
+            self.check_on_sec = config["data"]["check_on_sec"]
+            self.license_data = path.join(self.data_dir, self.data_source)
+            environ["DATA_DIR"] = self.data_dir  # only for local dev and data_dir
+        else:
+            self.orbis_access_url = environ.get("ORBIS_ACCESS_URL")
+            # check_on_sec is disabled check the main function
+            self.check_on_sec = environ.get("CHECK_ON_SEC")
+            self.parallel_execution = environ.get("PARALLEL_EXECUTION")
+            self.send_data_on_completion = environ.get("SEND_DATA_ON_COMPLETION")
+            self.slack_channel = environ.get("SLACK_CHANNEL")
+            self.slack_token = environ.get("SLACK_TOKEN")
+            self.orbis_batch_search_url = environ.get("ORBIS_BATCH_SEARCH_URL")
+            self.orbis_logout_url = environ.get("ORBIS_LOGOUT_URL")
+            self.email_address = environ.get("ORBIS_EMAIL_ADDRESS")
+            self.password = environ.get("ORBIS_PASSWORD")
+            self.data_dir = environ.get("DATA_DIR")
+            self.data_source = environ.get("DATA_SOURCE")
+            self.license_data = path.join(self.data_dir, self.data_source)
+        self.create_not_matched_companies_file()
+
+    def create_not_matched_companies_file(self):
+        """
+        Create an empty not matched companies file (NOT_MATCHED_COMPANIES_FILE_NAME) in the data directory if it does
+        not exist yet, companies not matched by batch searches are appended to it and it is sent to Slack.
+        """
+        not_matched_companies_file = path.join(self.data_dir, NOT_MATCHED_COMPANIES_FILE_NAME)
+        if path.isdir(self.data_dir) and not path.exists(not_matched_companies_file):
+            with open(not_matched_companies_file, "w") as f:
+                f.write("")
+
+    def read_config(self, config_path):
+        return read_config(config_path)
+
+    def get_financial_columns(self):
+        """
+        Get a list of financial columns, see FINANCIAL_VARIABLES.
+
+        :return:
+        financial_columns (list): A list of financial columns.
+        """
+        return list(FINANCIAL_COLUMNS)
+
+    def check_file_existence(self, file_name):
+        """
+        Checks if the file exists in the data directory.
+        """
+        full_file_path = path.join(self.data_dir, file_name)
+        if not path.exists(full_file_path):
+            print(f"File {file_name} does not exists, no continuing further !! ")
+            return False
+        else:
+            print(f"File {file_name} exists, continuing further !! Full path is {full_file_path} ")
+            return True
+
+
+def read_xlxs_file(file_path, sheet_name=""):
+    """
+    Reads an xlsx file and returns a pandas DataFrame.
+
+    :param file_path (str): The path to the xlsx file.
+    :param sheet_name (str): The name of the sheet to read. If not specified, the first sheet is read.
+
+    :return: A pandas DataFrame
+
+    """
+    from workbook import read_excel
+
+    if sheet_name == "":
+        df = read_excel(file_path)
+    else:
+        df = read_excel(file_path, sheet_name=sheet_name)
+    return df
+
+
+def drop_columns(df, regex):
+    """
+    Drop columns from a pandas dataframe based on a regular expression.
+
+    :param df (pandas.DataFrame): The pandas dataframe to drop columns from.
+    :param regex (str): The regular expression to match column names.
+
+    :return pandas.DataFrame: The pandas dataframe with columns dropped.
+    """
+    columns_to_drop = df.filter(regex=regex).columns
+    logger.debug(f"Dropping columns: {list(columns_to_drop)}")
+    return df.drop(columns=columns_to_drop)
+
+
+def strip_new_lines(df, colunm_name="Licensee"):
+    """
+    Strips new lines from the values of the specified column of a pandas DataFrame.
+
+    :param df (pandas.DataFrame): the DataFrame to modify
+    :param colunm_name (str): the name of the column to modify (default is 'Licensee')
+
+    :return:
+    pandas.DataFrame: the modified DataFrame
+    """
+
+    df[colunm_name] = df[colunm_name].apply(lambda x: x.strip("\n"))
+    return df
+
+
+def write_company_names(orig_orbis_data, file, name_column):
+    """
+    Writes the company names of a column of the 'Results' sheet of an Orbis data file to a CSV file, which is
+    the input of the next batch search. The CSV file has a single column: company name.
+
+    :param orig_orbis_data (str): The path to the original ORBIS data in XLSX format.
+    :param file (str): The path to the output CSV file.
+    :param name_column (str): The column of the company names, e.g. "GUO - Name" or "ISH - Name".
+
+    :return:
+    None
+    """
+
+    if not path.exists(orig_orbis_data):
+        logger.debug(
+            f"Original orbis data {orig_orbis_data} is not exists for generating {name_column} based CSV file, skipping this step !"
+        )
+        return
+
+    logger.debug(f"Generating data for {name_column}... ")
+    df = read_xlxs_file(orig_orbis_data, sheet_name="Results")
+    # df = df[[name_column, "City\nLatin Alphabet", "Country", "Other company ID number"]]
+    df = df[[name_column]]
+    # drop rows where company name is null
+    df = df[df[name_column].notna()]
+    df.to_csv(file, index=False, header=["company name"], sep=";")
+    # df.to_csv(file, index=False, header=["company name", "city", "country", "identifier"], sep=";")
+    logger.debug(f"Data for {name_column} is generated... ")
+
+
+def prepare_data(df, df_orbis):
+    """
+    Prepares the input data for further processing.
+
+    Merges two dataframes, `df` and `df_orbis`, on the 'CIK' column and selects the relevant columns. The resulting
+    merged dataframe is then reformatted by renaming columns and dropping irrelevant ones. The method returns the
+    resulting dataframe.
+
+    :param df: A pandas dataframe containing license agreement data.
+    :param df_orbis: A pandas dataframe containing Orbis data.
+    :return: A pandas dataframe containing the merged and prepared data.
+    """
+    import pandas as pd
+
+    logger.debug(f"Preparing data... ")
+    related_data = df[["Licensee", "Licensee CIK 1_cleaned", "Licensor", "Agreement Date"]]
+    # drop rows where Licensee CIK 1_cleaned is null
+    related_data = related_data[related_data["Licensee CIK 1_cleaned"].notna()]
+
+    related_data["Agreement Date"] = pd.to_datetime(related_data["Agreement Date"])
+    related_data["Financial Period"] = related_data["Agreement Date"].dt.year - 1
+    related_data = related_data.rename(columns={"Licensee CIK 1_cleaned": "CIK"})
+    related_data["CIK"] = related_data["CIK"].astype(str)
+
+    df_orbis = df_orbis.rename(columns={"Other company ID number": "CIK"})
+    df_orbis["CIK"] = df_orbis["CIK"].astype(str)
+    df_merged = df_orbis.merge(related_data, on="CIK")
+
+    logger.debug(f"Data is merged on CIK numbers ... ")
+
+    # drop columns which ends with Last avail. yr
+    df_merged = drop_columns(df_merged, "Last avail. yr$")
+    df_merged = gather_financial_period_columns(df_merged)
+
+    # drop columns which ends with a year
+    df_merged = drop_columns(df_merged, "[0-9]$")
+    logger.debug(f"Data is prepared... ")
+    return df_merged
+
+
+def gather_financial_period_columns(df_merged):
+    """
+    Copies the values of the financial period of each row from the yearly columns into period columns.
+
+    "Number of employees\n{year}" goes to "Number of employees (in Financial Period)" and each
+    "{financial column}\nm USD {year}" goes to "{financial column}\nm USD", where year is the "Financial Period"
+    of the row. When a yearly column does not exist, the rows of that year get none of the following period columns.
+
+    The yearly columns of a period column are gathered at once: rows are grouped by year and each row picks the
+    value of its year column, no value is written row by row.
+
+    :param df_merged: A pandas dataframe with "Financial Period" and yearly columns.
+    :return: The dataframe with period columns added.
+    """
+    import numpy as np
+    import pandas as pd
+
+    targets = [("Number of employees (in Financial Period)", "Number of employees\n{}")] + [
+        (f"{f_colunm}\nm USD", f"{f_colunm}\nm USD {{}}") for f_colunm in FINANCIAL_COLUMNS
+    ]
+    # year code of each row, -1 when Financial Period is missing
+    year_codes, years = pd.factorize(df_merged["Financial Period"])
+    years = years.tolist()
+
+    # number of period columns available for each year, up to the first missing yearly column
+    available = np.zeros(len(years), dtype=int)
+    for code, year in enumerate(years):
+        for _, source in targets:
+            if source.format(year) not in df_merged.columns:
+                logger.debug(f"KeyError: '{source.format(year)}' for year {year}")
+                break
+            available[code] += 1
+
+    for position, (target, source) in enumerate(targets):
+        codes_with_target = np.flatnonzero(available > position)
+        rows = np.flatnonzero(np.isin(year_codes, codes_with_target))
+        if len(rows) == 0:
+            continue
+        # column of each year in the gathered values
+        value_column_of_code = np.full(len(years), -1)
+        value_column_of_code[codes_with_target] = np.arange(len(codes_with_target))
+        values = df_merged[[source.format(years[code]) for code in codes_with_target]].to_numpy(dtype=object)
+
+        column = np.full(len(df_merged), np.nan, dtype=object)
+        column[rows] = values[rows, value_column_of_code[year_codes[rows]]]
+        column = pd.Series(column, index=df_merged.index).infer_objects()
+        if pd.api.types.is_integer_dtype(column):
+            # rows without value are NaN, numbers are kept as float like in a partially filled column
+            column = column.astype(float)
+        df_merged[target] = column
+    return df_merged
+
+
+def to_xlsx(df, file_name):
+    """
+    Saves a pandas dataframe to an excel file with a streaming writer.
+    Also saves it as CSV/Parquet next to the excel file when EXPORT_FORMATS is set, e.g. EXPORT_FORMATS=csv,parquet
+
+    :param df: A pandas dataframe to be saved to the excel file.
+    :param file_name: The name of the excel file to save the dataframe to.
+
+    :return:
+    None
+    """
+    from export import export_sheets, get_export_formats
+
+    export_sheets(file_name, {"Sheet1": df}, index=True, formats=get_export_formats(environ.get("EXPORT_FORMATS")))
+
+
+# offline_data_aggregation is used to generate data by considering GUO of companies
+# this data needs to be generated when we have new data from Orbis (refer
+# workflow in README.md)
+
+
+def generate_data_for_guo(orbis_data_file, config=None):
+    """
+    Generates data for GUO based on the input Orbis data file and saves the output to a file.
+
+    :param orbis_data_file (str): The name of the input Orbis data file to use, in the data directory.
+    :param config (OrbisConfig): Settings, read from the environment/config file by default.
+
+    :return:
+    - None: This function does not return anything. The output is saved to the output file instead.
+
+    Notes:
+    - The output file (<input file>_guo.csv) will be saved in the data directory.
+    - This function will overwrite the output file if it already exists.
+    """
+    #  output_file name will be generated from the input file name
+    config = config or OrbisConfig()
+    output_file = f"{path.splitext(orbis_data_file)[0]}_guo.csv"
+
+    logger.debug(f"Generating data for GUO for file {orbis_data_file} and saving to {output_file}")
+    write_company_names(
+        path.join(config.data_dir, orbis_data_file), path.join(config.data_dir, output_file), "GUO - Name"
+    )
+
+
+def generate_data_for_ish(orbis_data_file, config=None):
+    """
+    Generates data for ISH from an Orbis Excel file and saves it to a CSV file (<input file>_ish.csv).
+
+
+    :param orbis_data_file (str): The name of the input Excel file to read from, in the data directory.
+    :param config (OrbisConfig): Settings, read from the environment/config file by default.
+
+    :return:
+    None
+
+    """
+    config = config or OrbisConfig()
+    output_file = f"{path.splitext(orbis_data_file)[0]}_ish.csv"
+    logger.debug(f"Generating data for ISH for file {orbis_data_file} and saving to {output_file}")
+    write_company_names(
+        path.join(config.data_dir, orbis_data_file), path.join(config.data_dir, output_file), "ISH - Name"
+    )
+
+
+# aggregate_data is used to aggregate data by considering Licensee of companies
+# (refer workflow in README.md)
+def aggregate_data(orbis_file, aggregated_output_file, config=None):
+    """
+    Aggregates data from an Orbis file and saves the aggregated output to a file.
+
+
+    :param orbis_file (str): The name of the Orbis file to aggregate data from.
+    :param aggregated_output_file (str): The name of the file to save the aggregated data to.
+    :param config (OrbisConfig): Settings, read from the environment/config file by default.
+
+    :return:
+    None: This function doesn't return anything.
+    """
+    logger.debug(f"Aggregating data for file {orbis_file} and saving to {aggregated_output_file}")
+
+    config = config or OrbisConfig()
+    # data processing and augmentation
+    # after orbis search step following needs to run
+    orbis_file = path.join(config.data_dir, orbis_file)
+    aggregate_output_file = path.join(config.data_dir, aggregated_output_file)
+
+    if not path.exists(config.license_data):
+        logger.debug(f"License file, {config.license_data}, does not exists, skipping to aggreagate data !")
+        return
+
+    if not path.exists(config.license_data):
+        logger.debug(f"Orbis file, {orbis_file}, does not exists, skipping to aggreagate data !")
+        return
+
+    df_licensee_data = read_xlxs_file(config.license_data, sheet_name="")
+    df_orbis_data = read_xlxs_file(orbis_file, sheet_name="Results")
+    df_licensee = strip_new_lines(df_licensee_data)
+    df_result = prepare_data(df_licensee, df_orbis_data)
+    to_xlsx(df_result, aggregate_output_file)
+    logger.debug(f"Data is aggregated and saved to {aggregate_output_file}")
+
+
+def generate_unique_id(company_name, n):
+    """
+    Generate a unique ID for a company using SHA-256 hashing.
+
+
+    :param company_name (str): The name of the company.
+    :param n (int): The number of characters to include in the unique ID.
+
+    :return:
+    str: A unique ID string with n characters.
+    """
+    logger.debug(f"Generating unique id for {company_name}")
+    sha256 = hashlib.sha256()
+    sha256.update(str(company_name).encode())
+    return sha256.hexdigest()[:n]
+
+
+def post_process_data(excel_file, config=None):
+    # create another column for unique identifier with hash for column 1 however no negative values
+    # drop all rows where Orbis ID number is null
+    # get data/ folder path and append file name to it
+    """
+    Post-processes the data by creating a column for unique identifier with hash for column 1.
+    Drops all rows where Orbis ID number is null.
+    Gets data/ folder path and appends file name to it.
+
+
+    :param excel_file (str): File path of the excel file to post-process.
+    :param config (OrbisConfig): Settings, read from the environment/config file by default.
+
+    :return:
+    None
+    """
+    import pandas as pd
+    from export import export_sheets
+
+    logger.debug(f"Post processing data for {excel_file}")
+    config = config or OrbisConfig()
+
+    # append data and file name to it
+    excel_file = path.join(config.data_dir, excel_file)
+
+    if not path.exists(excel_file):
+        logger.debug(f"{excel_file} does not exist")
+        pass
+
+    logger.debug(f"post process data for {excel_file}")
+    df = pd.read_excel(excel_file, sheet_name="Results", engine="openpyxl")
+    df = df[df["Orbis ID number"].notna()]
+    # drop Unnamed: 0 column and duplicate columns
+    df = df.drop(columns=["Unnamed: 0"])
+    columns_to_delete = df.filter(regex="\.\d+$").columns
+    df = df.drop(columns=columns_to_delete)
+    # remove duplicate columns however keep first occurance
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    # fix lentgth uniquie identifier
+    # df["Unique identifier"] = df["Orbis ID number"].apply(lambda x: generate_unique_id(str(x), 10))
+    # no CSV/Parquet copy, it would overwrite the batch search input file of the same name
+    export_sheets(excel_file, {"Sheet1": df}, index=True)
+    logger.debug(f"post process data for {excel_file} completed")
+
+
+def create_company_dictionary(file_path, is_licensee=True):
+    """
+    Create a dictionary from an Excel file with company names as keys and corresponding entry values as dictionary values.
+
+    Args:
+        file_path (str): The path to the Excel file.
+
+    Returns:
+        dict: A dictionary where company names are keys and the values are lists of corresponding entry values.
+    """
+    from names import COMPANY_NAME_CANONICALIZER, map_values_to_entries
+
+    # If path is not exists raise an exception
+    if not os.path.exists(file_path):
+        raise Exception(f"File does not exist at {file_path}")
+
+    # Read the Excel file
+    df = read_xlxs_file(file_path)
+    if is_licensee:
+        company_name_columns = [
+            col for col in df.columns if col.startswith("Licensee") and col.endswith("cleaned") and "CIK" not in col
+        ]
+    else:
+        company_name_columns = [
+            col for col in df.columns if col.startswith("Licensor") and col.endswith("cleaned") and "CIK" not in col
+        ]
+
+    # {company name: [entry id, ...]}, names are canonicalized once per distinct name
+    company_dict = map_values_to_entries(
+        df, company_name_columns, normalize=COMPANY_NAME_CANONICALIZER.canonicalize, dropna=False
+    )
+    return company_dict
+
+
+def extract_company_data_from_raw_excel(excel_file, output_csv_file, is_licensee):
+    """
+    Extracts company data from raw excel file and saves it to a csv file.
+    :param excel_file (str): File path of the excel file to extract data from.
+    :param output_csv_file (str): File path of the csv file to save the extracted data to.
+    :param is_licensee (bool): If True, extract licensee data. Otherwise, extract licensor data.
+    """
+    import pandas as pd
+    from names import COMPANY_NAME_CANONICALIZER
+
+    # in case there are multiple Licensee information in the given excel file
+    # combine them into one column
+    # search in columns for names which starts with Licensee and ends with cleaned
+    # if there are multiple columns, combine them into one column
+
+    df = read_xlxs_file(excel_file)
+    # create resulting df with one column
+    df_result = pd.DataFrame(columns=["Company name"])
+    # searching
+    licensee_columns = [
+        col for col in df.columns if col.startswith("Licensee") and col.endswith("cleaned") and "CIK" not in col
+    ]
+    licensor_columns = [
+        col for col in df.columns if col.startswith("Licensor") and col.endswith("cleaned") and "CIK" not in col
+    ]
+    series = []
+
+    if is_licensee:
+        # combine all col values into df_result in one column called Company name
+        for col in licensee_columns:
+            series += df[col].tolist()
+    else:
+        for col in licensor_columns:
+            series += df[col].tolist()
+
+    df_result["Company name"] = pd.Series(series)
+
+    df_result = df_result.dropna()
+    df_result = df_result.drop_duplicates()
+
+    # transliterate (unidecode), uppercase, remove \n and strip company names
+    df_result = COMPANY_NAME_CANONICALIZER.canonicalize_series(df_result["Company name"])
+    # remove Unknown, Inventor and https company names
+    df_result = df_result[~COMPANY_NAME_CANONICALIZER.is_excluded(df_result)]
+    # -----------> NO NEED TO ADD ID COLUMN HOWEVER IF REQUIRED IN FUTURE FOLLOWING PART CAN BE ENABLED <----------------
+    # sort alphabetically based on company name
+    # df_result = df_result.sort_values()
+    # convert to dataframe
+    df_result = pd.DataFrame(df_result)
+    # add ID column
+    # df_result["ID"] = df_result.index + 1
+    # make the ID column the first column
+    # df_result = df_result[["ID", "Company name"]]
+    # save to csv
+    # add new column to the dataframe from the dictionary received from create_company_dictionary function
+    company_dict = create_company_dictionary(excel_file, is_licensee)
+    df_result["Own ID"] = df_result["Company name"].map(company_dict)
+
+    df_result.to_csv(output_csv_file, sep=";", index=False)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Offline processing of Orbis data, files are read from and written to DATA_DIR")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    guo_parser = subparsers.add_parser("guo", help="Create the GUO batch search input (<file>_guo.csv)")
+    guo_parser.add_argument("orbis_data_file", type=str, help="Orbis data file, e.g. orbis_data_licensee.xlsx")
+    ish_parser = subparsers.add_parser("ish", help="Create the ISH batch search input (<file>_ish.csv)")
+    ish_parser.add_argument("orbis_data_file", type=str, help="Orbis data file, e.g. orbis_data_licensee.xlsx")
+    aggregate_parser = subparsers.add_parser("aggregate", help="Aggregate Orbis data with the license data")
+    aggregate_parser.add_argument("orbis_file", type=str, help="Orbis data file")
+    aggregate_parser.add_argument("aggregated_output_file", type=str, help="Aggregated output file")
+    post_process_parser = subparsers.add_parser("post_process", help="Post process an Orbis data file in place")
+    post_process_parser.add_argument("excel_file", type=str, help="Orbis data file")
+    args = parser.parse_args()
+
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    logging.basicConfig(
+        filename=pathlib.Path.cwd().joinpath(f"logs/{timestamp}_offline.log"),
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    if args.command == "guo":
+        generate_data_for_guo(args.orbis_data_file)
+    elif args.command == "ish":
+        generate_data_for_ish(args.orbis_data_file)
+    elif args.command == "aggregate":
+        aggregate_data(args.orbis_file, args.aggregated_output_file)
+    else:
+        post_process_data(args.excel_file)
@@ -11,17 +11,11 @@ sys.path.append("utils")
 
 import ast
 import concurrent.futures
-import hashlib
 import logging
 import pathlib
-import re
-import time
 from datetime import datetime
 from os import environ, path
 
-import pandas as pd
-import unidecode
-import yaml
 from retrying import retry
 
 # from crawl import create_input_file_for_orbis_batch_search
@@ -31,16 +25,37 @@ from selenium.webdriver import ActionChains
 from selenium.webdriver.chrome.service import Service as ChromeService
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import Select, WebDriverWait
+from selenium.webdriver.support.ui import Select
 from slack_sdk import WebClient
 
 # from slack_sdk import WebClient
 # from slack_sdk.errors import SlackApiError
 from variables import *
-from webdriver_manager.chrome import ChromeDriverManager
 
 import send_to_slack  # isort:skip
+from chromedriver import get_chrome_profiles, get_chromedriver_path  # isort:skip
+from offline import (  # isort:skip
+    OrbisConfig,
+    aggregate_data,
+    create_company_dictionary,
+    drop_columns,
+    extract_company_data_from_raw_excel,
+    gather_financial_period_columns,
+    generate_data_for_guo,
+    generate_data_for_ish,
+    generate_unique_id,
+    post_process_data,
+    prepare_data,
+    read_config,
+    read_xlxs_file,
+    strip_new_lines,
+    to_xlsx,
+    write_company_names,
+)
+from session_pool import BrowserSessionPool  # isort:skip
+from pipeline import Pipeline  # isort:skip
+from shards import get_seats, is_shard_searched, merge_shard_results, plan_shards  # isort:skip
+from waits import PageWaiter  # isort:skip
 from send_to_slack import send_file_to_slack  # isort:skip
 from send_to_slack import send_message_to_slack  # isort:skip
 
@@ -62,7 +77,7 @@ logger.setLevel(logging.DEBUG)
 ##### Orbis #####
 
 
-class Orbis:
+class Orbis(OrbisConfig):
     """
     Orbis class is used to handle connections to Orbis database
     :param offline: if True, the class will not attempt to connect to Orbis
@@ -82,54 +97,16 @@ class Orbis:
         None
         """
 
-        if environ.get("LOCAL_DEV") == "True":
-            config = self.read_config(environ.get("CONFIG_PATH"))
-            self.orbis_access_url = config["orbis"]["urls"]["access"]
-            self.orbis_batch_search_url = config["orbis"]["urls"]["batch"]
-            self.orbis_logout_url = config["orbis"]["urls"]["logout"]
-            self.email_address = config["orbis"]["email"]
-            self.parallel_execution = config["orbis"]["parallel_execution"]
-            self.data_dir = config["data"]["path"]
-            self.password = config["orbis"]["password"]
-            self.send_data_on_completion = config["slack"]["send_on_demand"]
-            self.slack_channel = config["slack"]["channel"]
-            self.slack_token = config["slack"]["token"]
-            self.data_source = config["data"]["source"]
-            self.check_on_sec = config["data"]["check_on_sec"]
-            self.license_data = path.join(self.data_dir, self.data_source)
-            environ["DATA_DIR"] = self.data_dir  # only for local dev and data_dir
-        else:
-            self.orbis_access_url = environ.get("ORBIS_ACCESS_URL")
-            # check_on_sec is disabled check the main function
-            self.check_on_sec = environ.get("CHECK_ON_SEC")
-            self.parallel_execution = environ.get("PARALLEL_EXECUTION")
-            self.send_data_on_completion = environ.get("SEND_DATA_ON_COMPLETION")
-            self.slack_channel = environ.get("SLACK_CHANNEL")
-            self.slack_token = environ.get("SLACK_TOKEN")
-            self.orbis_batch_search_url = environ.get("ORBIS_BATCH_SEARCH_URL")
-            self.orbis_logout_url = environ.get("ORBIS_LOGOUT_URL")
-            self.email_address = environ.get("ORBIS_EMAIL_ADDRESS")
-            self.password = environ.get("ORBIS_PASSWORD")
-            self.data_dir = environ.get("DATA_DIR")
-            self.data_source = environ.get("DATA_SOURCE")
-            self.license_data = path.join(self.data_dir, self.data_source)
-
+        super().__init__()
         self.driver = None
+        self.waiter = None
+        self.chrome_profiles = None
+        self.profile_dir = None
+        # last data-parameters of the batch search widget, see count_total_search
+        self.batch_search_parameters = None
         self.headers = "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.132 Safari/537.36"
         self.offline = offline
-        self.variables = {
-            "Operating revenue (Turnover)": OP_REVENUE_SETTINGS,
-            "Sales": SALES_SETTINGS,
-            "Gross profit": GROSS_PROFIT,
-            # "Operating P/L [=EBIT]": OPERATING_PL_SETTINS,
-            "P/L before tax": PL_BEFORE_TAX_SETTINGS,
-            "P/L for period [=Net income]": PL_FOR_PERIOD_SETTINGS,
-            "Cash flow": CASH_FLOW_SETTINGS,
-            "Total assets": TOTAL_ASSETS_SETTINGS,
-            "Number of employees": NUMBER_OF_EMPLOYEES_SETTINGS,
-            "Trade description (English)": TRADE_DESC,
-            "BvD sectors": BVD_SECTORS,
-        }
+        self.variables = {**FINANCIAL_VARIABLES, **NON_FINANCIAL_VARIABLES}
         self.count__entity_occurence = {}
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -147,14 +124,12 @@ class Orbis:
 
         if self.driver is not None:
             self.logout()
-            time.sleep(5)
+            self.waiter.network_idle("logout", required=False)
             self.driver.quit()
+            self.release_profile()
         return None
 
     def __enter__(self):
-        if not path.exists(path.join(self.data_dir, NOT_MATCHED_COMPANIES_FILE_NAME)):
-            with open(path.join(self.data_dir, NOT_MATCHED_COMPANIES_FILE_NAME), "w") as f:
-                f.write("")
         if not self.offline:
             logger.debug("Starting chrome driver...")
             self.chrome_options = webdriver.ChromeOptions()
@@ -176,57 +151,83 @@ class Orbis:
             self.chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
             self.chrome_options.add_experimental_option("prefs", prefs)
             self.chrome_options.add_experimental_option("detach", True)
-            chrome_service = ChromeService(ChromeDriverManager().install())
+            # chromedriver is resolved once and pinned, see chromedriver.py
+            chrome_service = ChromeService(get_chromedriver_path())
+            self.chrome_profiles = get_chrome_profiles()
+            if self.chrome_profiles is not None:
+                # warm profile, keeps the disk cache of Orbis between browser starts
+                self.profile_dir = self.chrome_profiles.acquire()
+                self.chrome_options.add_argument(f"--user-data-dir={self.profile_dir}")
 
-            self.driver = webdriver.Chrome(service=chrome_service, options=self.chrome_options)
+            try:
+                self.driver = webdriver.Chrome(service=chrome_service, options=self.chrome_options)
+            except Exception:
+                self.release_profile()
+                raise
             self.driver.set_window_size(1920, 1080, self.driver.window_handles[0])
+            self.waiter = PageWaiter(self.driver)
 
             logger.debug("Chrome driver started")
             # self.slack_client = WebClient(token=os.environ.get("SLACK_BOT_TOKEN"))
-            time.sleep(1)
             self.login()
-            time.sleep(2)
+            self.waiter.page_loaded("login", required=False)
         return self
 
-    def get_financial_columns(self):
+    def is_browser_alive(self):
         """
-        Get a list of financial columns.
+        Checks whether the browser of this instance still responds.
 
         :return:
-        financial_columns (list): A list of financial columns.
+        bool: True if the browser responds.
         """
-        financial_columns = list(self.variables.keys())
-        financial_columns = financial_columns[: len(financial_columns) - 2]  # remove the last two columns
-        return financial_columns
+        try:
+            self.driver.window_handles
+            return True
+        except Exception as e:
+            logger.debug(f"Browser does not respond: {e}")
+            return False
 
-    def drop_columns(self, df, regex):
+    def is_logged_in(self):
         """
-        Drop columns from a pandas dataframe based on a regular expression.
+        Checks whether the current page is not the login page, which is shown when the session has expired.
 
-        :param df (pandas.DataFrame): The pandas dataframe to drop columns from.
-        :param regex (str): The regular expression to match column names.
-
-        :return pandas.DataFrame: The pandas dataframe with columns dropped.
+        :return:
+        bool: True if the login form is not shown.
         """
-        columns_to_drop = df.filter(regex=regex).columns
-        logger.debug("Dropping columns: ", columns_to_drop)
-        return df.drop(columns=columns_to_drop)
+        return len(self.driver.find_elements(By.ID, "user")) == 0
 
-    def read_config(self, config_path):
+    def ensure_logged_in(self):
         """
-        Read a YAML configuration file.
+        Opens the batch search page and logs in again only if the session has expired.
+        Used to reuse a browser for another batch search, see BrowserSessionPool.
+        """
+        self.driver.get(self.orbis_batch_search_url)
+        self.waiter.page_loaded(required=False)
+        if not self.is_logged_in():
+            logger.debug("Orbis session has expired, logging in again")
+            self.login()
+            self.waiter.page_loaded("login", required=False)
 
-        :param config_path (str): The config_path to the YAML configuration file.
+    def quit_browser(self):
+        """
+        Quits the browser without logging out, e.g. when it does not respond anymore.
+        """
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.debug(f"Exception on quitting browser: {e}")
+        self.release_profile()
 
-        :return:
-        dict: A dictionary with the configuration settings.
+    def release_profile(self):
         """
-        with open(config_path, "r", encoding="UTF-8") as f:
-            try:
-                config = yaml.safe_load(f)
-            except yaml.YAMLError as exc:
-                raise exc
-        return config
+        Makes the Chrome profile of this instance available to the next browser, see CHROME_USER_DATA_DIR.
+        """
+        if self.profile_dir is not None:
+            self.chrome_profiles.release(self.profile_dir)
+            self.profile_dir = None
+
+    def drop_columns(self, df, regex):
+        return drop_columns(df, regex)
 
     def login(self):
         """
@@ -249,7 +250,7 @@ class Orbis:
 
         # Log a message to indicate that the login is in progress
         logger.debug("Logging in to Orbis...")
-        time.sleep(4)
+        self.waiter.navigation("login", login_button, required=False)
         retry_count = 0
         ERROR_MESSAGE = "/html/body/section[2]/div[2]/form/div[1]"
         try:
@@ -257,7 +258,7 @@ class Orbis:
             # notify slack that logging is not successful to Orbis  database
             while retry_count < 10 and response.text == "This page isn’t working":
                 self.driver.refresh()
-                time.sleep(5)
+                self.waiter.page_loaded("login", required=False)
                 response = self.driver.find_element(By.XPATH, ERROR_MESSAGE)
                 retry_count += 1
 
@@ -291,7 +292,7 @@ class Orbis:
         """
         Logs out of the Orbis website.
 
-        Waits for 3 seconds before logging out to ensure that all actions have been completed.
+        Waits until there is no network activity before logging out to ensure that all actions have been completed.
 
         :return:
         None
@@ -299,7 +300,7 @@ class Orbis:
 
         logger.debug("Logging out Orbis ...")
 
-        time.sleep(2)
+        self.waiter.network_idle("logout", required=False)
 
         try:
             account_path = self.driver.find_element(By.XPATH, ACCOUNT_XPATH)
@@ -307,7 +308,7 @@ class Orbis:
         except NoSuchElementException:
             print(f"No account path {ACCOUNT_XPATH} found")
             self.driver.get(self.orbis_logout_url)
-            time.sleep(5)
+            self.waiter.page_loaded("logout", required=False)
             exit(0)
 
         try:
@@ -316,7 +317,7 @@ class Orbis:
         except NoSuchElementException:
             print(f"No logout path {LOGOUT_XPATH} found")
             self.driver.get(self.orbis_logout_url)
-            time.sleep(5)
+            self.waiter.page_loaded("logout", required=False)
             exit(0)
 
     def scroll_to_bottom(self):
@@ -345,47 +346,18 @@ class Orbis:
 
         while True:
             try:
-                WebDriverWait(self.driver, 10 * 60).until(EC.element_to_be_clickable((By.XPATH, xpath)))
+                self.waiter.clickable("clickable", xpath)
                 break  # Element found and clickable, exit the loop
             except Exception as e:
                 print("TimeoutException occurred in wait_until_clickable, logging out from sessions")
                 self.driver.refresh()
-                time.sleep(7)
+                self.waiter.page_loaded(required=False)
                 number_of_calls += 1
                 if number_of_calls > 10:
                     self.logout()
 
     def read_xlxs_file(self, file_path, sheet_name=""):
-        """
-        Reads an xlsx file and returns a pandas DataFrame.
-
-        :param file_path (str): The path to the xlsx file.
-        :param sheet_name (str): The name of the sheet to read. If not specified, the first sheet is read.
-
-        :return: A pandas DataFrame
-
-        """
-        if sheet_name == "":
-            df = pd.read_excel(file_path, engine="openpyxl")
-        else:
-            df = pd.read_excel(file_path, sheet_name=sheet_name, engine="openpyxl")
-        return df
-
-    def search_and_add(self, item):
-        """
-        Searches for the given `item` and adds it to the list of columns.
-
-        :param item: A string representing the name of the item to be searched for and added.
-
-        :return: None
-        """
-        self.wait_until_clickable(SEARCH_INPUT_ADD_RM_COLUMNS)
-        search_input = self.driver.find_element(By.XPATH, SEARCH_INPUT_ADD_RM_COLUMNS)
-        search_input.clear()
-        search_input.send_keys(item)
-        search_input.send_keys(Keys.RETURN)
-        time.sleep(5)
-        logger.debug(f"Searching for {item} ...")
+        return read_xlxs_file(file_path, sheet_name=sheet_name)
 
     def check_checkboxes(self, field=""):
         """
@@ -416,7 +388,8 @@ class Orbis:
                 self.driver.execute_script(f"arguments[0].scrollTo(0,{scroll_position})", scrollable)
                 scroll_position += scroll_amount
                 logger.debug(f"{field} Scrolling to {scroll_position} ...")
-                time.sleep(0.5)
+                # checkboxes of the scrolled part are rendered
+                self.waiter.dom_quiet("columns", quiet_period=0.2, required=False)
         except Exception as e:
             logger.debug(f"Exception on check_checkboxes {e}")
 
@@ -449,7 +422,7 @@ class Orbis:
                 except Exception as e:
                     logger.debug(f"exception on click {e} retrying... {retry}")
                     retry += 1
-                    time.sleep(5)
+                    self.waiter.dom_quiet("columns", required=False)
 
     def check_processing_overlay(self, process_name):
         """
@@ -460,17 +433,10 @@ class Orbis:
         :return: None
         """
         try:
-            main_content_div = self.driver.find_element(By.XPATH, MAIN_DIV)
-            main_content_style = main_content_div.value_of_css_property("max-width")
-
-            while main_content_style != "none":
-                logger.debug(f"{process_name} - Main content style is {main_content_style}")
-                print(f"{process_name} - Main content style is still not 'none': {main_content_style}")
-                time.sleep(0.5)
-                main_content_div = self.driver.find_element(By.XPATH, MAIN_DIV)
-                main_content_style = main_content_div.value_of_css_property("max-width")
+            # max-width of the main content is "none" when the overlay is gone
+            self.waiter.css_property("processing_overlay", MAIN_DIV, "max-width", "none")
         except Exception as e:
-            logger.debug(e)
+            logger.debug(f"{process_name} - processing overlay: {e}")
 
     def check_exists_by_xpath(self, XPATH):
         """
@@ -510,14 +476,14 @@ class Orbis:
         self.wait_until_clickable(separator)
 
         self.driver.find_element(By.XPATH, separator).clear()
-        time.sleep(2)
+        self.waiter.attribute_value("upload", separator, "value", "", required=False)
 
         self.driver.find_element(By.XPATH, separator).send_keys(";")
 
         self.driver.find_element(By.XPATH, separator).send_keys(Keys.RETURN)
 
         logger.debug(f"{process_name} field seperator is cleared")
-        time.sleep(2)
+        self.waiter.network_idle("upload", required=False)
         print(f"{process_name} field seperator is set to ;")
 
     def apply_changes(self):
@@ -531,7 +497,8 @@ class Orbis:
             apply_button.click()
         except Exception as e:
             logger.debug(f"Exception on apply changes {e}")
-        time.sleep(5)
+        # batch search widget appears when the search starts
+        self.waiter.present("apply", BATCH_WIDGET_XPATH, required=False)
         print("Changes are applied to the batch search after ; seperator is set")
 
     def click_continue_search(self):
@@ -547,7 +514,7 @@ class Orbis:
             action = ActionChains(self.driver)
             action.click(on_element=continue_search_button).perform()
             print("Clicked continue search button")
-            time.sleep(2)
+            self.waiter.network_idle("search_progress", required=False)
         except Exception as e:
             print(f"Exception on clicking continue search button, seems search is finished")
 
@@ -557,9 +524,9 @@ class Orbis:
         """
 
         try:
-            time.sleep(5)
+            self.waiter.network_idle("search_progress", required=False)
             self.driver.execute_script("window.location.reload()")
-            time.sleep(5)
+            self.waiter.page_loaded(required=False)
         except Exception as e:
             print(f"Exception on refreshing page {e}")
 
@@ -609,7 +576,6 @@ class Orbis:
         try:
             if d[progress_text.text] > 10:
                 self.click_continue_search()
-                time.sleep(5)
                 self.add_to_dict(d, progress_text)
                 self.check_search_progress_bar()
         except Exception as e:
@@ -656,16 +622,17 @@ class Orbis:
         Checks the search progress bar to see if the search is finished.
         """
         if self.check_warning_message_header() or not self.check_continue_later_button():
-            time.sleep(5)
+            self.waiter.network_idle("search_progress", required=False)
             self.click_continue_search()
-            time.sleep(7)
 
         is_total_count_reached = self.count_total_search()
         print(f"is_total_count_reached: {is_total_count_reached}")
 
-        # Waiting for the search to be finished
+        # Waiting for the search to be finished, data-parameters of the batch widget changes with each searched item
         while is_total_count_reached:
-            time.sleep(20)
+            self.waiter.attribute_change(
+                "search_progress", BATCH_WIDGET_XPATH, "data-parameters", self.batch_search_parameters, required=False
+            )
             self.check_progress_text(self.count__entity_occurence)
             is_total_count_reached = self.count_total_search()
 
@@ -679,6 +646,7 @@ class Orbis:
         # Get parameters from batch widget
         batch_search_info = self.driver.find_element(By.XPATH, BATCH_WIDGET_XPATH)
         all_search_result_data = batch_search_info.get_attribute("data-parameters")
+        self.batch_search_parameters = all_search_result_data
 
         # Convert string to dictionary
         all_search_result_data = ast.literal_eval(all_search_result_data)
@@ -703,7 +671,7 @@ class Orbis:
 
         try:
             self.check_search_progress_bar()
-            time.sleep(10)
+            self.waiter.network_idle("search_progress", required=False)
         except Exception as e:
             logger.debug(f"{process_name}: search is not finished: stale element exception {e}")
 
@@ -712,7 +680,7 @@ class Orbis:
             except Exception as e:
                 print(f"Refresh page as search is not finished")
                 # self.refresh_page_at_stuck()
-                time.sleep(3)
+                self.waiter.network_idle("search_progress", required=False)
                 self.check_search_progress_bar()
 
     def export_mapped_data_with_own_id(self, file_name):
@@ -724,7 +692,7 @@ class Orbis:
         export_mapped_data_with_own_id = self.driver.find_element(By.XPATH, EXPORT_MAPPED_DATA_WITH_OWN_ID)
         export_mapped_data_with_own_id.send_keys(Keys.RETURN)
         # do not open another windows while exporting
-        time.sleep(5)
+        self.waiter.network_idle("export", required=False)
         print(f"Mapped data with own id is exported as Excel_{file_name}.xlsx")
 
     def view_search_results(self, excel_output_file_name):
@@ -740,7 +708,7 @@ class Orbis:
         self.wait_until_clickable(VIEW_RESULTS_BUTTON)
         view_result_sub_url = self.driver.find_element(By.XPATH, VIEW_RESULTS_BUTTON)
         view_result_sub_url.send_keys(Keys.RETURN)
-        time.sleep(5)
+        self.waiter.navigation("page_load", view_result_sub_url, required=False)
         print("Search results are displayed / View Results button is clicked")
 
     def add_remove_additional_columns(self, process_name=""):
@@ -757,7 +725,7 @@ class Orbis:
             #  add implicit wait
             # refresh the page
             self.driver.refresh()
-            time.sleep(3)
+            self.waiter.page_loaded(required=False)
             self.add_remove_additional_columns(process_name)
 
         print(f"{process_name} Add Remove Columns view is opened")
@@ -773,7 +741,7 @@ class Orbis:
             search_input.clear()
         except Exception as e:
             print(f"Exception occured while clearing search input {e}")
-        time.sleep(0.5)
+        self.waiter.dom_quiet("columns", required=False)
         print("Search input is cleared")
 
     def search_field(self, field, process_name=""):
@@ -789,101 +757,87 @@ class Orbis:
             search_input.clear()
             search_input.send_keys(field)
             search_input.send_keys(Keys.RETURN)
-            time.sleep(0.5)
+            self.waiter.dom_quiet("columns", required=False)
             logger.debug(f"{process_name} {field} is searched")
         except Exception as e:
             print(f"Exception occured while returning search input {e}")
         print(f"{process_name} {field} is searched")
 
-    def add_city_info(self, process_name=""):
+    def get_selected_columns(self):
         """
-        A step in the add remove additional columns page to add city information to the search results.
-        :param process_name: The name of the process being performed.
+        Returns the names of the columns which are already selected in the add remove additional columns page.
+        Orbis keeps the columns of the previous batch search of the session.
         """
-
-        self.search_field("City", process_name)
         try:
-            # add city
-            self.wait_until_clickable(CITY_COLUMN)
-            self.driver.find_element(By.XPATH, CITY_COLUMN).click()
-            logger.debug(f"{process_name} city is added")
-
-            self.wait_until_clickable(POPUP_SAVE_BUTTON)
-            self.driver.find_element(By.XPATH, POPUP_SAVE_BUTTON).click()
-            logger.debug(f"{process_name} popup save button is clicked")
+            user_selections_panel = self.driver.find_element(By.XPATH, USER_SELECTIONS_PANEL)
+            return {field.text for field in user_selections_panel.find_elements(By.CLASS_NAME, "label")}
         except Exception as e:
-            print(e)
-        time.sleep(0.5)
-        self.clear_search_input()
-        print(f"{process_name} city is added")
+            logger.debug(f"Selected columns could not be read: {e}")
+            return set()
 
-    def add_country_info(self, process_name=""):
+    def get_column_layout(self):
         """
-        A step in the add remove additional columns page to add country information to the search results.
-        :param process_name: The name of the process being performed.
+        Returns the columns added to the search results before export: COLUMN_LAYOUT, then the items of self.variables.
+        Years are selected for the first financial item only, Orbis keeps the selection for the other items.
         """
+        financial_columns = self.get_financial_columns()
+        layout = list(COLUMN_LAYOUT)
+        for position, (item, xpath) in enumerate(self.variables.items()):
+            layout.append(
+                {"search": item, "xpath": xpath, "select_all_years": position == 0 and item in financial_columns}
+            )
+        return layout
 
-        self.search_field("Country", process_name)
-        try:
-            self.wait_until_clickable(COUNTRY_COLUMN)
-            self.driver.find_element(By.XPATH, COUNTRY_COLUMN).click()
-            logger.debug(f"{process_name} country is added")
-        except Exception as e:
-            print(e)
-        time.sleep(1)
-        self.clear_search_input()
-        print(f"{process_name} country is added")
-
-    def add_delisting_note(self, process_name=""):
+    def add_column(self, column, process_name=""):
         """
-        A step in the add remove additional columns page to add delisting note information to the search results.
+        Adds a column of a column layout: searches it, clicks it and clicks the buttons of its popups.
+        :param column: A column of a column layout, see COLUMN_LAYOUT.
         :param process_name: The name of the process being performed.
         """
-
-        self.search_field("Delisting Note", process_name)
-
-        try:
-            self.wait_until_clickable(DELISTING_NOTE)
-            self.driver.find_element(By.XPATH, DELISTING_NOTE).click()
-        except Exception as e:
-            print(e)
-        time.sleep(1)
-        self.clear_search_input()
-        print(f"{process_name} delisting note is added")
-
-    def select_only_first_value_from_popup(self, field):
-        """
-        Selects only the first value from the pop up.
-        :param field: The field for which the pop up is opened.
-        """
-        try:
-            time.sleep(1)
-            # selects first value from the pop up
-            self.wait_until_clickable(POPUP_SELECT_VALUE)
-            self.driver.find_element(By.XPATH, POPUP_SELECT_VALUE).click()
-        except Exception as e:
-            print(f"No pop up value is seen for {field} field")
-
-    def add_other_company_id(self, process_name=""):
-        """
-        A step in the add remove additional columns page to add other company id information to the search results.
+        self.search_field(column["search"], process_name)
+        self.wait_until_clickable(column["xpath"])
+        self.driver.find_element(By.XPATH, column["xpath"]).click()
+        self.waiter.dom_quiet("columns", required=False)
+        if column.get("select_all_years"):
+            self.select_all_years(field=column["search"])
+        for popup_button_xpath in column.get("popup", []):
+            popup_button = self.waiter.clickable("columns", popup_button_xpath, required=False)
+            if popup_button is None:
+                logger.debug(f"{process_name} no popup button {popup_button_xpath} for {column['search']}")
+                continue
+            popup_button.click()
+            self.waiter.dom_quiet("columns", required=False)
+
+    def apply_column_layout(self, layout=None, process_name="", max_attempts=4):
+        """
+        Adds the columns of a column layout in the add remove additional columns page, in one pass.
+        Selected columns are read once at the beginning, columns which are already selected are not added again.
+
+        :param layout: A list of columns, see COLUMN_LAYOUT. Defaults to get_column_layout().
         :param process_name: The name of the process being performed.
-        """
-        field = "Other Company ID"
-
-        self.search_field(field, process_name)
-        try:
-            self.wait_until_clickable(CIK_NUMBER_VIEW)
-
-            self.driver.find_element(By.XPATH, CIK_NUMBER_VIEW).click()
-            self.select_only_first_value_from_popup(field)
-
-            logger.debug(f"{process_name} cik number is added")
-        except Exception as e:
-            print(e)
-        time.sleep(0.5)
-        self.clear_search_input()
-        print(f"{process_name} other company id is added")
+        :param max_attempts: The number of attempts to add a column.
+        """
+        layout = self.get_column_layout() if layout is None else layout
+        selected_columns = self.get_selected_columns()
+        added_columns = []
+        for column in layout:
+            label = column.get("label", column["search"])
+            if label in selected_columns:
+                logger.debug(f"{process_name} column already selected : {label}")
+                continue
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    self.add_column(column, process_name)
+                    added_columns.append(label)
+                    break
+                except Exception as e:
+                    logger.debug(f"{process_name} exception on adding column {label}, attempt {attempt} : {e}")
+                    # clicking a selected column again would remove it
+                    if label in self.get_selected_columns():
+                        added_columns.append(label)
+                        break
+        logger.debug(f"{process_name} columns are added: {added_columns}, already selected: {selected_columns}")
+        print(f"{process_name} {len(added_columns)} of {len(layout)} columns are added")
 
     def add_identification_number(self, process_name=""):
         """
@@ -896,125 +850,9 @@ class Orbis:
             logger.debug(f"{process_name} identification number is added")
         except Exception as e:
             print(e)
-        time.sleep(0.5)
+        self.waiter.dom_quiet("columns", required=False)
         print(f"{process_name} identification number is added")
 
-    def click_pop_up_save_button(self, process_name):
-        """
-        Saves the changes made in the add remove additional columns page.
-        :param process_name: The name of the process being performed.
-        """
-
-        try:
-            self.wait_until_clickable(POPUP_SAVE_BUTTON)
-            self.driver.find_element(By.XPATH, POPUP_SAVE_BUTTON).click()
-            logger.debug(f"{process_name} popup save button is clicked")
-        except Exception as e:
-            print(e)
-            pass
-
-        time.sleep(0.5)
-        print(f"{process_name} popup save button is clicked")
-
-    def add_us_sic_code(self, process_name):
-        """
-        A step in batch search process to add us sic code to the report
-        :param process_name: The name of the process being performed.
-        """
-        field = "US SIC, secondary code(s)"
-        self.search_field(field, process_name)
-        try:
-            self.wait_until_clickable(US_SIC_SECONDARY_CODES)
-            self.driver.find_element(By.XPATH, US_SIC_SECONDARY_CODES).click()
-            self.select_only_first_value_from_popup(field)
-
-            time.sleep(0.5)
-        except Exception as e:
-            print(e)
-        logger.debug(f"{process_name} us sic secondary codes is added")
-        self.clear_search_input()
-        print(f"{process_name} us sic secondary codes is added")
-
-    def add_op_revenue(self):
-        """
-        A step in batch search process to add op revenue to the report
-        :param process_name:
-        """
-
-        try:
-            self.wait_until_clickable(OP_REVENUE_OK_BUTTON)
-            self.driver.find_element(By.XPATH, OP_REVENUE_OK_BUTTON).click()
-        except Exception as e:
-            print(e)
-        time.sleep(0.5)
-        print("op revenue is added")
-
-    def add_desc_history_info(self, process_name=""):
-        """
-        A step in batch search process to add description history to the report
-        :param process_name:
-        """
-
-        self.search_field("Description History", process_name)
-        try:
-            self.wait_until_clickable(DESCRIPTION_HISTORY)
-            self.driver.find_element(By.XPATH, DESCRIPTION_HISTORY).click()
-        except Exception as e:
-            print(e)
-        time.sleep(0.5)
-        self.clear_search_input()
-        print(f"{process_name} description history is added")
-
-    def add_history_info(self, process_name=""):
-        """
-        A step in batch search process to add history to the report
-        :param process_name:
-        """
-
-        self.search_field("History", process_name)
-        try:
-            self.wait_until_clickable(HISTORY)
-            self.driver.find_element(By.XPATH, HISTORY).click()
-        except Exception as e:
-            print(e)
-        self.clear_search_input()
-        time.sleep(0.5)
-        print(f"{process_name} history is added")
-
-    def add_bvd_id(self, process_name=""):
-        """
-        A step in batch search process to add bvd id number to the report
-        :param process_name:
-        """
-
-        self.search_field("BVD ID number", process_name)
-        try:
-            self.wait_until_clickable(BVD_ID_NUMBER_ADD)
-            self.driver.find_element(By.XPATH, BVD_ID_NUMBER_ADD).click()
-            logger.debug(f"{process_name} bvd id number is added")
-        except Exception as e:
-            print(e)
-        time.sleep(0.5)
-        print(f"{process_name} bvd id number is added")
-        self.clear_search_input()
-
-    def add_orbis_id_number(self, process_name=""):
-        """
-        A step in batch search process to add orbis id number to the report
-        :param process_name:
-        """
-
-        self.search_field("Orbis ID number", process_name)
-        try:
-            self.wait_until_clickable(ORBIS_ID_NUMBER_ADD)
-            self.driver.find_element(By.XPATH, ORBIS_ID_NUMBER_ADD).click()
-            logger.debug(f"{process_name} orbis id number is added")
-        except Exception as e:
-            print(e)
-        time.sleep(0.5)
-        self.clear_search_input()
-        print(f"{process_name} orbis id number is added")
-
     def add_ownership_info(self, process_name=""):
         """
         A step in batch search process to add ownership data to the report
@@ -1027,7 +865,7 @@ class Orbis:
             logger.debug(f"{process_name} ownership data is added")
         except Exception as e:
             print(e)
-        time.sleep(0.5)
+        self.waiter.dom_quiet("columns", required=False)
         print(f"{process_name} ownership data is added")
 
     def add_shareholders_info(self, process_name=""):
@@ -1042,7 +880,7 @@ class Orbis:
             logger.debug(f"{process_name} shareholders data is added")
         except Exception as e:
             print(e)
-        time.sleep(0.5)
+        self.waiter.dom_quiet("columns", required=False)
         print(f"{process_name} shareholders data is added")
 
     def add_guo_owner_info(self, process_name=""):
@@ -1057,25 +895,9 @@ class Orbis:
             logger.debug(f"{process_name} guo data is added")
         except Exception as e:
             print(e)
-        time.sleep(0.5)
+        self.waiter.dom_quiet("columns", required=False)
         print(f"{process_name} guo data is added")
 
-    def add_guo_name_info(self, process_name=""):
-        """
-        A step in batch search process to add global ultimate owner name to the report
-        :param process_name:
-        """
-        field = "GUO - Name"
-        self.search_field(field, process_name)
-        try:
-            self.wait_until_clickable(GUO_NAME_INFO)
-            self.driver.find_element(By.XPATH, GUO_NAME_INFO).click()
-            logger.debug(f"{process_name} global ultimate owner name is added")
-        except Exception as e:
-            print(e)
-        time.sleep(0.5)
-        print(f"{process_name} global ultimate owner name is added")
-
     def add_immediate_parent_company_name(self, process_name=""):
         """
         A step in batch search process to add immediate parent company name to the report
@@ -1088,25 +910,9 @@ class Orbis:
             logger.debug(f"{process_name} immediate parent company name is added")
         except Exception as e:
             print(e)
-        time.sleep(0.5)
+        self.waiter.dom_quiet("columns", required=False)
         print(f"{process_name} immediate parent company name is added")
 
-    def add_ish_name(self, process_name=""):
-        """
-        A step in batch search process to add ish name to the report
-        :param process_name:
-        """
-        field = "ISH - Name"
-        self.search_field(field, process_name)
-        try:
-            self.wait_until_clickable(ISH_NAME)
-            self.driver.find_element(By.XPATH, ISH_NAME).click()
-            logger.debug(f"{process_name} ish name is added")
-        except Exception as e:
-            print(e)
-        time.sleep(0.5)
-        print(f"{process_name} ish name is added")
-
     def check_page_for_errors(self, process_name=""):
         """
         Checks if page is loaded correctly. If not, refreshes the page and checks again.
@@ -1123,7 +929,7 @@ class Orbis:
                 attempts += 1
                 if attempts > max_attempts:
                     break
-                time.sleep(1)
+                self.waiter.page_loaded(required=False)
             else:
                 logger.debug(f"{process_name} page title is {self.driver.title}")
                 logger.debug(f"{process_name} page url is {self.driver.current_url}")
@@ -1131,48 +937,6 @@ class Orbis:
                 break
         print("Cheking page for errors finished")
 
-    def add_non_financial_items(self, process_name=""):
-        """
-        Search on non-financial items and add them to the end result through add/remove column option in Orbis.
-        :param process_name:
-        """
-
-        print(f"{process_name} adding non financial items")
-        non_financial_items = list(set(self.variables.keys()) - set(self.get_financial_columns()))
-        is_checked = False
-        for item, xpath in self.variables.items():
-            retries = 0
-            max_retries = 4
-            item_already_selected = False
-            while retries < max_retries:
-                try:
-                    # check stale element reference exception
-                    self.search_and_add(item)
-                    user_selections_panel = self.driver.find_element(By.XPATH, USER_SELECTIONS_PANEL)
-                    all_selected_fields = user_selections_panel.find_elements(By.CLASS_NAME, "label")
-                    if item in [field.text for field in all_selected_fields]:
-                        logger.debug(f"{process_name} item already selected : {item}")
-                        item_already_selected = True
-                        break
-                    self.wait_until_clickable(xpath)
-                    self.driver.find_element(By.XPATH, xpath).click()
-                    time.sleep(3)
-                    if item in non_financial_items:
-                        self.select_all_years(field=item, is_financial_data=False, is_checked=is_checked)
-                    else:
-                        self.select_all_years(field=item, is_checked=is_checked)
-                    logger.debug(f"{process_name} item : {item} xpath : {xpath} ")
-                    break
-                except Exception:
-                    if item_already_selected:
-                        logger.debug(f"{process_name} exception happened but item already selected ; skipping  {item} ")
-                        break
-                    retries += 1
-                    logger.debug(f"{process_name} stale element reference exception, trying again {retries} : {item}")
-            is_checked = True
-        logger.debug(f"{process_name} all items are added: {self.variables.keys()}")
-        print(f"{process_name} all items are added: {self.variables.keys()}")
-
     def update_name_of_output_file(self, output_file_name, process_name=""):
         """
         Updates the name of the output file when exporting the data as an excel file.
@@ -1185,7 +949,7 @@ class Orbis:
             logger.debug(f"{process_name} excel file name is entered")
         except Exception as e:
             print(e)
-        time.sleep(1)
+        self.waiter.attribute_value("export", EXCEL_EXPORT_NAME_FIELD, "value", output_file_name, required=False)
         print(f"{process_name} excel file name is entered")
 
     def click_export_button(self, process_name=""):
@@ -1198,7 +962,7 @@ class Orbis:
             self.driver.find_element(By.XPATH, EXPORT_BUTTON).click()
         except Exception as e:
             print(e)
-        time.sleep(1)
+        self.waiter.network_idle("export", required=False)
         print(f"{process_name} export button is clicked")
 
     def select_million_units(self):
@@ -1206,13 +970,13 @@ class Orbis:
         Selects million units from the dropdown menu.
         """
 
-        time.sleep(7)
+        self.waiter.dom_quiet("export", required=False)
         try:
             self.wait_until_clickable(MILLION_UNITS)
             self.driver.find_element(By.XPATH, MILLION_UNITS).click()
         except Exception as e:
             print(e)
-        time.sleep(1)
+        self.waiter.dom_quiet("export", required=False)
         print("million units is selected")
 
     def select_usd_currency(self):
@@ -1230,7 +994,7 @@ class Orbis:
         Clicks the dropdown button to select the items to be exported.
         """
 
-        time.sleep(3)
+        self.waiter.dom_quiet("export", required=False)
         # click apply from dropdown
         try:
             self.wait_until_clickable(DROPDOWN_APPLY)
@@ -1238,7 +1002,7 @@ class Orbis:
             logger.debug(f"apply button is clicked")
         except Exception as e:
             print(e)
-        time.sleep(3)
+        self.waiter.network_idle("export", required=False)
         print("dropdown apply button is clicked")
 
     def click_excel_button(self, process_name):
@@ -1247,14 +1011,14 @@ class Orbis:
         :param process_name: name of the process
         """
 
-        time.sleep(2)
+        self.waiter.dom_quiet("export", required=False)
         try:
             self.wait_until_clickable(EXCEL_BUTTON)
             self.driver.find_element(By.XPATH, EXCEL_BUTTON).click()
             logger.debug(f"{process_name} export button is clicked")
         except Exception as e:
             print(e)
-        time.sleep(2)
+        self.waiter.dom_quiet("export", required=False)
         print(f"{process_name} excel button is clicked")
 
     def wait_for_data_to_be_downloaded(self, excel_output_file_name, process_name=""):
@@ -1268,30 +1032,18 @@ class Orbis:
 
         self.wait_until_clickable(POPUP_DOWNLOAD_BUTTON)
         try:
-            while True:
-                download_button = self.driver.find_element(By.XPATH, POPUP_DOWNLOAD_BUTTON)
-                if download_button.value_of_css_property("background-color") == "rgba(0, 20, 137, 1)":
-                    # download_button.send_keys(Keys.RETURN)
-                    # logger.debug(
-                    #     f"{process_name} waiting for data generation to download ")
-
-                    print(f"Data is downloaded to {self.data_dir + excel_output_file_name}.xlsx")
-                    time.sleep(2)
-                    self.driver.find_element(By.XPATH, POPUP_CLOSE_BUTTON).click()
-                    break
-                else:
-                    print(f"waiting for data generation to download ... ")
-                    time.sleep(2)
+            # download button turns blue when the data is generated
+            print(f"waiting for data generation to download ... ")
+            self.waiter.css_property("download", POPUP_DOWNLOAD_BUTTON, "background-color", "rgba(0, 20, 137, 1)")
+            print(f"Data is downloaded to {self.data_dir + excel_output_file_name}.xlsx")
+            self.driver.find_element(By.XPATH, POPUP_CLOSE_BUTTON).click()
 
             # wait until the file is saved completely
-            counter = 30
-            while counter > 0:
-                if self.check_file_existence(excel_output_file_name + ".xlsx"):
-                    break
-                else:
-                    time.sleep(5)
-                    print(f"waiting for data to be saved to the disk completely ... ")
-                    counter -= 5
+            print(f"waiting for data to be saved to the disk completely ... ")
+            self.waiter.file(
+                "download_file", path.join(self.data_dir, excel_output_file_name + ".xlsx"), required=False
+            )
+            self.check_file_existence(excel_output_file_name + ".xlsx")
             # ensuring that the file exists otherwise do not continue
         except Exception as e:
             logger.debug(f"{process_name} exception : {e}")
@@ -1381,7 +1133,7 @@ class Orbis:
             try:
                 self.fill_page_number(current_page, INPUT_FIELD_VALUE)
             except Exception as e:
-                time.sleep(2)
+                self.waiter.dom_quiet("pages", required=False)
                 print("Not possible to go to page ", current_page)
                 print("retrying ... ")
                 retry = 0
@@ -1416,10 +1168,12 @@ class Orbis:
                 f.write("-------------------------------------------- \n")
             self.find_no_matched_companies()
 
-        time.sleep(2)
+        self.waiter.dom_quiet("pages", required=False)
         current_page = 1
         self.set_number_of_rows_in_view()
-        time.sleep(5)
+        # rows of the new page size are loaded
+        self.waiter.network_idle("pages", required=False)
+        self.waiter.dom_quiet("pages", required=False)
         self.go_to_page(current_page)
         if self.check_exists_by_xpath(TOTAL_PAGE_XPATH):
             try:
@@ -1435,10 +1189,11 @@ class Orbis:
             write_to_file_not_found_companies()
 
             while current_page != int(max_value):
-                time.sleep(5)
                 current_page += 1
                 self.go_to_page(current_page)
-                time.sleep(5)
+                # page number input shows the new page once it is loaded
+                self.waiter.attribute_value("pages", TOTAL_PAGE_XPATH, "value", str(current_page), required=False)
+                self.waiter.dom_quiet("pages", required=False)
                 self.find_no_matched_companies()
         else:
             write_to_file_not_found_companies()
@@ -1460,6 +1215,10 @@ class Orbis:
         """
 
         logger.debug(f"Starting batch search for {process_name} ...")
+        # the browser may be reused from a previous batch search
+        self.count__entity_occurence = {}
+        self.batch_search_parameters = None
+        self.waiter.reset()
 
         if not path.exists(input_file):
             logger.debug(f"{process_name}: input file {input_file} does not exist")
@@ -1467,7 +1226,7 @@ class Orbis:
             self.logout()
             sys.exit(1)
 
-        time.sleep(5)
+        self.waiter.page_loaded(required=False)
         OVERLAY_XPATH = "/html/body/div[9]/div[4]/div[2]/span"
         if self.check_exists_by_xpath(OVERLAY_XPATH):
             overlay = self.driver.find_element(By.XPATH, OVERLAY_XPATH)
@@ -1476,12 +1235,12 @@ class Orbis:
             except Exception as e:
                 overlay.click()
                 print("Exception on overlay click: ", e)
-            time.sleep(2)
+            self.waiter.invisible("page_load", OVERLAY_XPATH, required=False)
 
         excel_output_file_name = path.basename(input_file).split(".")[0]
 
         self.driver.get(self.orbis_batch_search_url)
-        time.sleep(5)
+        self.waiter.page_loaded(required=False)
 
         # upload csv file to be searched
         self.upload_csv_file_to_orbis(input_file)
@@ -1513,54 +1272,18 @@ class Orbis:
 
         self.add_remove_additional_columns(process_name)
 
-        # self.add_contact_info(process_name)
-        self.add_city_info(process_name)
-
-        self.add_country_info(process_name)
-
-        # self.driver.refresh()
-
-        # delisting note  : required for the M&A activities note
-        self.add_delisting_note(process_name)
-
-        time.sleep(1)
-
-        # identification number column
-        # self.add_identification_number(process_name)
-
-        # other company id column
-        self.add_other_company_id(process_name)
-
-        self.click_pop_up_save_button(process_name)
-
-        self.add_us_sic_code(process_name)
-        self.add_op_revenue()
-
-        self.add_desc_history_info(process_name)
-
-        self.add_history_info(process_name)
-
-        self.add_bvd_id(process_name)
-
-        # add ORBIS ID number column
-        self.add_orbis_id_number(process_name)
-
-        time.sleep(2)
-
-        self.add_guo_name_info(process_name)
-
-        time.sleep(1)
-
-        self.add_ish_name(process_name)
-
         self.check_page_for_errors(process_name)
 
-        self.add_non_financial_items(process_name)
+        # columns of COLUMN_LAYOUT and financial / non financial items of self.variables, in one pass
+        self.apply_column_layout(process_name=process_name)
 
         self.wait_until_clickable(APPLY_CHANGES_BUTTON)
         self.driver.find_element(By.XPATH, APPLY_CHANGES_BUTTON).click()
 
-        time.sleep(8)
+        # results are reloaded with the new columns
+        self.waiter.page_loaded(required=False)
+        self.check_processing_overlay(process_name)
+        self.wait_until_clickable(CURRENY_DROPDOWN)
 
         self.driver.find_element(By.XPATH, CURRENY_DROPDOWN).click()
 
@@ -1579,7 +1302,7 @@ class Orbis:
 
         self.wait_for_data_to_be_downloaded(excel_output_file_name, process_name)
 
-        time.sleep(2)
+        self.waiter.log_report(process_name)
 
         # disabled temporarily
         # if self.send_data_on_completion.lower() == "true":
@@ -1589,371 +1312,260 @@ class Orbis:
         #     except Exception as e:
         #         print(e)
 
-    # create a file likewe have data.csv file
-    # company name;city;country;identifier
+    # data processing of the downloaded files, see offline.py
     def generate_data_for_guo(self, orig_orbis_data, file):
-        """
-        Generates a CSV file containing data in a format that is compatible with the
-        requirements of the Guo database. The file will contain the following columns:
-
-        - company name
-        - city
-        - country
-        - identifier
-
-        This method reads an XLSX file located at `orig_orbis_data`, extracts data from
-        the 'Results' sheet, and formats it for the Guo database. The resulting CSV file
-        will be saved at the location specified by `file`.
-
-        :param orig_orbis_data (str): The path to the original ORBIS data in XLSX format.
-        :param file (str): The path to the output CSV file.
-
-        :return:
-        None
-        """
-
-        if not path.exists(orig_orbis_data):
-            logger.debug(
-                f"Original orbis data {orig_orbis_data} is not exists for generating GUO based CSV file, skipping this step !"
-            )
-            return
-
-        logger.debug(f"Generating data for guo... ")
-        df = self.read_xlxs_file(orig_orbis_data, sheet_name="Results")
-        # df = df[["GUO - Name", "City\nLatin Alphabet", "Country", "Other company ID number"]]
-        df = df[["GUO - Name"]]
-        # drop rows where company name is null
-        df = df[df["GUO - Name"].notna()]
-        df.to_csv(file, index=False, header=["company name"], sep=";")
-        # df.to_csv(file, index=False, header=["company name", "city", "country", "identifier"], sep=";")
-        logger.debug(f"Data for guo is generated... ")
+        write_company_names(orig_orbis_data, file, "GUO - Name")
 
     def generate_data_for_ish(self, orig_orbis_data, file):
-        """
-        Generate data for ISH based on the input ORBIS data and write to a CSV file.
-
-        :param orig_orbis_data (str): The path to the input ORBIS data file in .xlsx format.
-        :param file (str): The path to the output CSV file.
-
-        :return:
-        None
-        """
-
-        if not path.exists(orig_orbis_data):
-            logger.debug(
-                f"Original orbis data {orig_orbis_data} is not exists for generating ISH based CSV file, skipping this step !"
-            )
-            return
-
-        logger.debug(f"Generating data for ish... ")
-        df = self.read_xlxs_file(orig_orbis_data, sheet_name="Results")
-        # df = df[["ISH - Name", "City\nLatin Alphabet", "Country", "Other company ID number"]]
-        df = df[["ISH - Name"]]
-        df = df[df["ISH - Name"].notna()]
-        df.to_csv(file, index=False, header=["company name"], sep=";")
-        # df.to_csv(file, index=False, header=["company name", "city", "country", "identifier"], sep=";")
-        logger.debug(f"Data for ish is generated... ")
+        write_company_names(orig_orbis_data, file, "ISH - Name")
 
     def strip_new_lines(self, df, colunm_name="Licensee"):
-        """
-        Strips new lines from the values of the specified column of a pandas DataFrame.
-
-        :param df (pandas.DataFrame): the DataFrame to modify
-        :param colunm_name (str): the name of the column to modify (default is 'Licensee')
-
-        :return:
-        pandas.DataFrame: the modified DataFrame
-        """
-
-        df[colunm_name] = df[colunm_name].apply(lambda x: x.strip("\n"))
-        return df
-
-    def check_file_existence(self, file_name):
-        """
-        Checks if the file exists in the data directory.
-        """
-        full_file_path = path.join(self.data_dir, file_name)
-        if not path.exists(full_file_path):
-            print(f"File {file_name} does not exists, no continuing further !! ")
-            return False
-        else:
-            print(f"File {file_name} exists, continuing further !! Full path is {full_file_path} ")
-            return True
+        return strip_new_lines(df, colunm_name=colunm_name)
 
     def prepare_data(self, df, df_orbis):
-        """
-        Prepares the input data for further processing.
-
-        Merges two dataframes, `df` and `df_orbis`, on the 'CIK' column and selects the relevant columns. The resulting
-        merged dataframe is then reformatted by renaming columns and dropping irrelevant ones. The method returns the
-        resulting dataframe.
+        return prepare_data(df, df_orbis)
 
-        :param df: A pandas dataframe containing license agreement data.
-        :param df_orbis: A pandas dataframe containing Orbis data.
-        :return: A pandas dataframe containing the merged and prepared data.
-        """
-
-        logger.debug(f"Preparing data... ")
-        related_data = df[["Licensee", "Licensee CIK 1_cleaned", "Licensor", "Agreement Date"]]
-        # drop rows where Licensee CIK 1_cleaned is null
-        related_data = related_data[related_data["Licensee CIK 1_cleaned"].notna()]
-
-        related_data["Agreement Date"] = pd.to_datetime(related_data["Agreement Date"])
-        related_data["Financial Period"] = related_data["Agreement Date"].dt.year - 1
-        related_data = related_data.rename(columns={"Licensee CIK 1_cleaned": "CIK"})
-        related_data["CIK"] = related_data["CIK"].astype(str)
+    def gather_financial_period_columns(self, df_merged):
+        return gather_financial_period_columns(df_merged)
 
-        df_orbis = df_orbis.rename(columns={"Other company ID number": "CIK"})
-        df_orbis["CIK"] = df_orbis["CIK"].astype(str)
-        df_merged = df_orbis.merge(related_data, on="CIK")
-
-        logger.debug(f"Data is merged on CIK numbers ... ")
-
-        # drop columns which ends with Last avail. yr
-        df_merged = self.drop_columns(df_merged, "Last avail. yr$")
-        for index, r in df_merged.iterrows():
-            year = r["Financial Period"]
-            try:
-                number_of_employees = r[f"Number of employees\n{year}"]
-                df_merged.at[index, "Number of employees (in Financial Period)"] = number_of_employees
-                for f_colunm in self.get_financial_columns():
-                    revenue_info = r[f"{f_colunm}\nm USD {year}"]
-                    df_merged.at[index, f"{f_colunm}\nm USD"] = revenue_info
-
-            except KeyError as ke:
-                logger.debug(f"KeyError: {ke} for index {index} and year {year}")
+    def to_xlsx(self, df, file_name):
+        to_xlsx(df, file_name)
 
-        # drop columns which ends with a year
-        df_merged = self.drop_columns(df_merged, "[0-9]$")
-        logger.debug(f"Data is prepared... ")
-        return df_merged
 
-    def to_xlsx(self, df, file_name):
-        """
-        Saves a pandas dataframe to an excel file.
+def start_orbis_session():
+    """
+    Launches a browser and logs in to Orbis.
 
-        :param df: A pandas dataframe to be saved to the excel file.
-        :param file_name: The name of the excel file to save the dataframe to.
+    :return:
+    Orbis: A logged in Orbis instance, to be closed with __exit__.
+    """
+    orbis = Orbis()
+    return orbis.__enter__()
 
-        :return:
-        None
-        """
 
-        df.to_excel(file_name)
+# logged in browsers reused by run_batch_search, created in main
+SESSION_POOL = None
 
 
 @retry(stop_max_attempt_number=4)
-def run_batch_search(input_file):
+def run_batch_search(input_file, session_pool=None):
     # join path to input file
     """
     Runs batch search using Orbis class for given input file and process name.
+    A browser of the session pool is used when there is one, otherwise a browser is launched and logged in for this search.
+
     :param input_file(str): File name of the input file to be processed.
-    :param process_name(str) : Name of the process.
+    :param session_pool(BrowserSessionPool): Pool of logged in browsers. Defaults to SESSION_POOL.
 
     :return:
     None
     """
 
     logger.debug(f"Running batch search for file {input_file}")
-    with Orbis() as orbis:
+    session_pool = session_pool or SESSION_POOL
+    with Orbis() if session_pool is None else session_pool.session() as orbis:
         logger.debug(f"Data directory is {orbis.data_dir}")
         logger.debug(f"Input file is {path.join(orbis.data_dir, input_file)}")
         orbis.batch_search(path.join(orbis.data_dir, input_file))
 
 
-# offline_data_aggregation is used to generate data by considering GUO of companies
-# this data needs to be generated when we have new data from Orbis (refer
-# workflow in README.md)
-
-
-def generate_data_for_guo(orbis_data_file):
+def run_sharded_batch_search(input_file, number_of_shards=None, session_pool=None, pipeline=None):
     """
-    Generates data for GUO based on the input Orbis data file and saves the output to a file.
+    Runs the batch search of an input file split into shards, which are searched at the same time by the browsers of
+    the session pool. The results of the shards are merged into the file a single batch search downloads
+    (<input file>.xlsx), see shards.py. Small input files are searched as they are.
+    Shards whose results were already downloaded (e.g. by an earlier run of the same day) are not searched again.
 
-    :param orbis_data_file (str): The name of the input Orbis data file to use. This should be a CSV file containing
-            the Orbis data to be processed.
-    :param output_file (str): The name of the file to save the output to. This should be a CSV file.
-
-    :return:
-    - None: This function does not return anything. The output is saved to the output file instead.
+    When the search runs in a pipeline task, it holds one browser seat of the pipeline and the shards are searched
+    with the seats which are free as well, so that the searches and shards of the pipeline never use more browsers
+    than its seats. The other shards wait for a browser of this search.
 
-
-    :raises FileNotFoundError: If the input Orbis data file cannot be found.
-    :raises FileNotFoundError: If the output file directory does not exist.
-    :raises ValueError: If the output file already exists and the user does not want to overwrite it.
-
-    Notes:
-    - This function requires an instance of the Orbis class with the offline flag set to True.
-    - The output file will be saved in the same directory as the input Orbis data file.
-    - This function will overwrite the output file if it already exists, unless the user specifies otherwise.
-    """
-    #  output_file name will be generated from the input file name
-
-    output_file = f"{path.splitext(orbis_data_file)[0]}_guo.csv"
-
-    logger.debug(f"Generating data for GUO for file {orbis_data_file} and saving to {output_file}")
-    with Orbis(offline=True) as orbis:
-        output_file = path.join(orbis.data_dir, output_file)
-        orbis_data_file = path.join(orbis.data_dir, orbis_data_file)
-        orbis.generate_data_for_guo(orig_orbis_data=orbis_data_file, file=output_file)
-
-
-def generate_data_for_ish(orbis_data_file):
-    """
-    Generates data for ISH from an Orbis Excel file and saves it to a CSV file.
-
-
-    :param orbis_data_file (str): The name of the input Excel file to read from.
+    :param input_file(str): File name of the input file to be processed.
+    :param number_of_shards(int): Maximum number of shards. Defaults to the number of Orbis seats (ORBIS_SEATS).
+    :param session_pool(BrowserSessionPool): Pool of logged in browsers. Defaults to SESSION_POOL.
+    :param pipeline(Pipeline): Pipeline running the search, its browser seats are shared with the shards.
 
     :return:
     None
-
     """
-    output_file = f"{path.splitext(orbis_data_file)[0]}_ish.csv"
-    logger.debug(f"Generating data for ISH for file {orbis_data_file} and saving to {output_file}")
-    with Orbis(offline=True) as orbis:
-        output_file = path.join(orbis.data_dir, output_file)
-        orbis_data_file = path.join(orbis.data_dir, orbis_data_file)
-        orbis.generate_data_for_ish(orig_orbis_data=orbis_data_file, file=output_file)
-
-
-# aggregate_data is used to aggregate data by considering Licensee of companies
-# (refer workflow in README.md)
-def aggregate_data(orbis_file, aggregated_output_file):
+    data_dir = OrbisConfig().data_dir
+    session_pool = session_pool or SESSION_POOL
+    shard_files = plan_shards(path.join(data_dir, input_file), number_of_shards or get_seats())
+    if len(shard_files) == 1:
+        run_batch_search(input_file, session_pool)
+        return
+
+    pending_shard_files = [shard_file for shard_file in shard_files if not is_shard_searched(shard_file)]
+    logger.debug(
+        f"Running batch search for file {input_file} in {len(shard_files)} shards, "
+        f"{len(shard_files) - len(pending_shard_files)} of them are already searched"
+    )
+    # the seat of the pipeline task, plus the free seats of the pipeline
+    extra_seats = pipeline.take_free_seats(len(pending_shard_files) - 1) if pipeline is not None else 0
+    max_workers = 1 + extra_seats if pipeline is not None else max(1, len(pending_shard_files))
+    if session_pool is not None:
+        max_workers = min(max_workers, session_pool.size)
+    try:
+        # one thread per browser, each shard is retried on its own by run_batch_search
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(run_batch_search, path.basename(shard_file), session_pool): shard_file
+                for shard_file in pending_shard_files
+            }
+            for future in concurrent.futures.as_completed(futures):
+                # re-raised for the first failed shard, the results of the input file would be incomplete
+                future.result()
+                logger.debug(f"Batch search for shard {futures[future]} is done")
+    finally:
+        if pipeline is not None:
+            pipeline.release_seats(extra_seats)
+
+    merge_shard_results(path.join(data_dir, input_file), shard_files)
+
+
+def send_data_file_to_slack(file_name, message, timestamp_with_time):
     """
-    Aggregates data from an Orbis file and saves the aggregated output to a file.
+    Sends a file of the data directory to the Slack channel.
 
+    :param file_name(str): File name in the data directory.
+    :param message(str): Message sent with the file, after the file name.
+    :param timestamp_with_time(str): Timestamp of the run, prefix of the message.
+    """
+    send_file_to_slack(
+        path.join(environ.get("DATA_DIR"), file_name),
+        environ.get("SLACK_CHANNEL"),
+        f"[{timestamp_with_time}] File {file_name} {message}",
+    )
 
-    :param orbis_file (str): The name of the Orbis file to aggregate data from.
-    :param aggregated_output_file (str): The name of the file to save the aggregated data to.
 
-    :return:
-    None: This function doesn't return anything.
+def create_batch_search_input(input_file, is_licensee, timestamp_with_time):
     """
-    logger.debug(f"Aggregating data for file {orbis_file} and saving to {aggregated_output_file}")
+    Creates the batch search input file of the licensee or licensor companies of DATA_SOURCE, unless it exists.
 
-    with Orbis(offline=True) as orbis:
-        # data processing and augmentation
-        # after orbis search step following needs to run
-        orbis_file = path.join(orbis.data_dir, orbis_file)
-        aggregate_output_file = path.join(orbis.data_dir, aggregated_output_file)
-
-        if not path.exists(orbis.license_data):
-            logger.debug(f"License file, {orbis.license_data}, does not exists, skipping to aggreagate data !")
-            return
+    :param input_file(str): File name of the batch search input file, e.g. orbis_data_licensee_<date>.csv
+    :param is_licensee(bool): If True, licensee companies are extracted. Otherwise, licensor companies.
+    :param timestamp_with_time(str): Timestamp of the run, used in the Slack message.
+    """
+    if os.path.exists(path.join(environ.get("DATA_DIR"), input_file)):
+        print(f"{'Licensee' if is_licensee else 'Licensor'} file exists: {input_file}. Skipping to re-create it.")
+    elif environ.get("LOCAL_DEV") != "True" and environ.get("CHECK_ON_SEC") != "false":
+        pass
 
-        if not path.exists(orbis.license_data):
-            logger.debug(f"Orbis file, {orbis_file}, does not exists, skipping to aggreagate data !")
-            return
+        ## ---> ****ATTENTION****: THIS PART IS DEACTIVATED AFTER SEEING THAT MERGED DATA
+        ## ---> FROM SEC.GOV ADDS NOISE TO THE DATA WHICH ONLY CONTAINS COMPANY NAME
 
-        df_licensee_data = orbis.read_xlxs_file(orbis.license_data, sheet_name="")
-        df_orbis_data = orbis.read_xlxs_file(orbis_file, sheet_name="Results")
-        df_licensee = orbis.strip_new_lines(df_licensee_data)
-        df_result = orbis.prepare_data(df_licensee, df_orbis_data)
-        orbis.to_xlsx(df_result, aggregate_output_file)
-        logger.debug(f"Data is aggregated and saved to {aggregate_output_file}")
+        # create_input_file_for_orbis_batch_search(
+        #     path.join(environ.get("DATA_DIR"), environ.get("DATA_SOURCE")),
+        #     path.join(environ.get("DATA_DIR"), input_file),
+        #     is_licensee=is_licensee,
+        # )
+    else:
+        extract_company_data_from_raw_excel(
+            path.join(environ.get("DATA_DIR"), environ.get("DATA_SOURCE")),
+            path.join(environ.get("DATA_DIR"), input_file),
+            is_licensee=is_licensee,
+        )
+    send_data_file_to_slack(input_file, "created for batch search", timestamp_with_time)
 
 
-def generate_unique_id(company_name, n):
+def search_and_send(input_file, parallel_execution, timestamp_with_time, pipeline=None):
     """
-    Generate a unique ID for a company using SHA-256 hashing.
+    Runs the batch search of an input file, split into shards when parallel execution is active, and sends the
+    downloaded results to the Slack channel.
 
-
-    :param company_name (str): The name of the company.
-    :param n (int): The number of characters to include in the unique ID.
-
-    :return:
-    str: A unique ID string with n characters.
+    :param input_file(str): File name of the batch search input file.
+    :param parallel_execution(bool): If True, the input file is searched in shards, see run_sharded_batch_search.
+    :param timestamp_with_time(str): Timestamp of the run, used in the Slack message.
+    :param pipeline(Pipeline): Pipeline running the search, its free browser seats are used by the shards.
     """
-    logger.debug(f"Generating unique id for {company_name}")
-    sha256 = hashlib.sha256()
-    sha256.update(str(company_name).encode())
-    return sha256.hexdigest()[:n]
+    print(f"Now searching for file {input_file}")
+    if parallel_execution:
+        run_sharded_batch_search(input_file, pipeline=pipeline)
+    else:
+        run_batch_search(input_file)
+    print(f"Search is done for file {input_file}")
+    send_data_file_to_slack(
+        f"{path.basename(input_file).split('.')[0]}.xlsx",
+        "downloaded from Orbis after batch search",
+        timestamp_with_time,
+    )
 
 
-def post_process_data(excel_file):
-    # create another column for unique identifier with hash for column 1 however no negative values
-    # drop all rows where Orbis ID number is null
-    # get data/ folder path and append file name to it
+def create_ish_input_and_send(orbis_data_file, timestamp_with_time):
     """
-    Post-processes the data by creating a column for unique identifier with hash for column 1.
-    Drops all rows where Orbis ID number is null.
-    Gets data/ folder path and appends file name to it.
-
+    Creates the ISH batch search input of an Orbis data file and sends it to the Slack channel.
 
-    :param excel_file (str): File path of the excel file to post-process.
-
-    :return:
-    None
+    :param orbis_data_file(str): File name of the Orbis data file, e.g. orbis_data_licensee_<date>.xlsx
+    :param timestamp_with_time(str): Timestamp of the run, used in the Slack message.
     """
-    get_dir_path = ""
-    logger.debug(f"Post processing data for {excel_file}")
-    with Orbis(offline=True) as orbis:
-        get_dir_path = orbis.data_dir
-
-    # append data and file name to it
-    excel_file = path.join(get_dir_path, excel_file)
-
-    if not path.exists(excel_file):
-        logger.debug(f"{excel_file} does not exist")
-        pass
+    generate_data_for_ish(orbis_data_file)
+    send_data_file_to_slack(
+        f"{path.splitext(orbis_data_file)[0]}_ish.csv", "created for ISH batch search", timestamp_with_time
+    )
 
-    logger.debug(f"post process data for {excel_file}")
-    df = pd.read_excel(excel_file, sheet_name="Results", engine="openpyxl")
-    df = df[df["Orbis ID number"].notna()]
-    # drop Unnamed: 0 column and duplicate columns
-    df = df.drop(columns=["Unnamed: 0"])
-    columns_to_delete = df.filter(regex="\.\d+$").columns
-    df = df.drop(columns=columns_to_delete)
-    # remove duplicate columns however keep first occurance
-    df = df.loc[:, ~df.columns.duplicated()]
 
-    # fix lentgth uniquie identifier
-    # df["Unique identifier"] = df["Orbis ID number"].apply(lambda x: generate_unique_id(str(x), 10))
-    df.to_excel(excel_file)
-    logger.debug(f"post process data for {excel_file} completed")
+def create_pipeline(timestamp, timestamp_with_time, parallel_execution):
+    """
+    Creates the pipeline of a run. For the licensee and the licensor companies:
 
+    orbis_data_<side>_<date>.csv -> .xlsx (batch search) -> _guo.csv -> _guo.xlsx (batch search)
+                                                         -> _ish.csv -> _ish.xlsx (batch search)
 
-def run_in_parallel_generic(function, args):
-    """
-    Runs a given function in parallel using multiple processes. It uses the Python multiprocessing module to create a process pool, and distributes the function calls across the available CPUs.
+    Each file is created as soon as the file it is created from exists, e.g. the GUO input of the licensee companies
+    is created while the licensor companies are still searched.
 
+    The pipeline has as many browser seats as the session pool has browsers (ORBIS_SEATS with parallel execution,
+    otherwise 1). Each batch search holds one seat and, with parallel execution, searches its shards with the seats
+    which are free as well, so that the browsers (and threads) of a run never exceed the seats of the session pool.
 
-    :param function (function): The function to be run in parallel.
-    :param starmap (bool): If True, use starmap() function to apply the function to the input tuples in args. Otherwise, use imap() function.
-    :param args (list): A list of tuples, where each tuple contains the arguments to be passed to the function.
+    :param timestamp(str): Date of the run, part of the file names.
+    :param timestamp_with_time(str): Timestamp of the run, used in the Slack messages.
+    :param parallel_execution(bool): If True, the input files are searched in shards, see run_sharded_batch_search.
 
     :return:
-    None
-
-    :raises:
-    None
+    Pipeline: The pipeline, to be run with run().
     """
-
-    # number_of_processes = multiprocessing.cpu_count()
-    # if starmap:
-
-    #   with ThreadPoolExecutor(max_workers=number_of_processes) as executor:
-    #     # if starmap:
-    #     #     executor.starmap(function, args)
-    #     # else:
-    #     #     executor.map(function, args)
-    #    future = executor.submit(function, args)
-    #    print(future.result())
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        # Start the load operations and mark each future with its URL
-        future_to_url = {
-            executor.submit(function, file_to_be_processed): file_to_be_processed for file_to_be_processed in args
-        }
-        for future in concurrent.futures.as_completed(future_to_url):
-            url = future_to_url[future]
-            try:
-                data = future.result()
-            except Exception as exc:
-                print("%r generated an exception: %s" % (url, exc))
-            else:
-                print(f"result is --->  {data}")
+    # one budget for the batch searches and their shards, the same as the size of the session pool
+    pipeline = Pipeline(browser_seats=get_seats() if parallel_execution else 1)
+    data_dir = environ.get("DATA_DIR")
+    for side in ["licensee", "licensor"]:
+        base_name = f"orbis_data_{side}_{timestamp}"
+
+        def data_file(suffix):
+            return path.join(data_dir, f"{base_name}{suffix}")
+
+        pipeline.add(
+            f"{side} input",
+            create_batch_search_input,
+            args=(f"{base_name}.csv", side == "licensee", timestamp_with_time),
+            outputs=[data_file(".csv")],
+        )
+        for suffix in ["", "_guo", "_ish"]:
+            # not retried by the pipeline, run_batch_search retries each search (or shard) itself
+            pipeline.add(
+                f"{side}{suffix} search",
+                search_and_send,
+                args=(f"{base_name}{suffix}.csv", parallel_execution, timestamp_with_time, pipeline),
+                inputs=[data_file(f"{suffix}.csv")],
+                outputs=[data_file(f"{suffix}.xlsx")],
+                uses_browser=True,
+                retries=0,
+            )
+        pipeline.add(
+            f"{side} GUO input",
+            generate_data_for_guo,
+            args=(f"{base_name}.xlsx",),
+            inputs=[data_file(".xlsx")],
+            outputs=[data_file("_guo.csv")],
+        )
+        pipeline.add(
+            f"{side} ISH input",
+            create_ish_input_and_send,
+            args=(f"{base_name}.xlsx", timestamp_with_time),
+            inputs=[data_file(".xlsx")],
+            outputs=[data_file("_ish.csv")],
+        )
+    return pipeline
 
 
 def save_screenshot(driver, file_name):
@@ -1969,124 +1581,6 @@ def save_screenshot(driver, file_name):
     logger.debug(f"Screenshot saved to {file_name}.png")
 
 
-def create_company_dictionary(file_path, is_licensee=True):
-    """
-    Create a dictionary from an Excel file with company names as keys and corresponding entry values as dictionary values.
-
-    Args:
-        file_path (str): The path to the Excel file.
-
-    Returns:
-        dict: A dictionary where company names are keys and the values are lists of corresponding entry values.
-    """
-
-    # If path is not exists raise an exception
-    if not os.path.exists(file_path):
-        raise Exception(f"File does not exist at {file_path}")
-
-    # Read the Excel file
-    df = pd.read_excel(file_path)
-    if is_licensee:
-        company_name_columns = [
-            col for col in df.columns if col.startswith("Licensee") and col.endswith("cleaned") and "CIK" not in col
-        ]
-    else:
-        company_name_columns = [
-            col for col in df.columns if col.startswith("Licensor") and col.endswith("cleaned") and "CIK" not in col
-        ]
-
-    # Create an empty dictionary
-    company_dict = {}
-
-    # Iterate over the rows of the DataFrame
-    for index, row in df.iterrows():
-        entry_id = row["Entry"]
-
-        # Iterate over the licensee columns
-        for column in company_name_columns:
-            company_name = unidecode.unidecode(str(row[column]))
-            # Remove leading/trailing whitespace and convert to uppercase
-            company_name = company_name.strip().upper()
-            # remove \n from company name
-            company_name = company_name.replace("\n", "")
-            if company_name != "NAN" or company_name != "":
-                if company_name in company_dict:
-                    # Append the entry ID to the existing list of values for the company
-                    company_dict[company_name].append(entry_id)
-                else:
-                    # Create a new entry in the dictionary with the company name as the key
-                    company_dict[company_name] = [entry_id]
-    return company_dict
-
-
-def extract_company_data_from_raw_excel(excel_file, output_csv_file, is_licensee):
-    """
-    Extracts company data from raw excel file and saves it to a csv file.
-    :param excel_file (str): File path of the excel file to extract data from.
-    :param output_csv_file (str): File path of the csv file to save the extracted data to.
-    :param is_licensee (bool): If True, extract licensee data. Otherwise, extract licensor data.
-    """
-    # in case there are multiple Licensee information in the given excel file
-    # combine them into one column
-    # search in columns for names which starts with Licensee and ends with cleaned
-    # if there are multiple columns, combine them into one column
-
-    df = pd.read_excel(excel_file, engine="openpyxl")
-    # create resulting df with one column
-    df_result = pd.DataFrame(columns=["Company name"])
-    # searching
-    licensee_columns = [
-        col for col in df.columns if col.startswith("Licensee") and col.endswith("cleaned") and "CIK" not in col
-    ]
-    licensor_columns = [
-        col for col in df.columns if col.startswith("Licensor") and col.endswith("cleaned") and "CIK" not in col
-    ]
-    series = []
-
-    if is_licensee:
-        # combine all col values into df_result in one column called Company name
-        for col in licensee_columns:
-            series += df[col].tolist()
-    else:
-        for col in licensor_columns:
-            series += df[col].tolist()
-
-    df_result["Company name"] = pd.Series(series)
-
-    df_result = df_result.dropna()
-    df_result = df_result.drop_duplicates()
-
-    # remove string quotes from any column
-    df_result = df_result.apply(lambda x: x.str.strip())
-
-    # apply unidecode to remove special characters to the language
-    df_result = df_result["Company name"].apply(unidecode.unidecode)
-    df_result = df_result.str.upper()
-    # remove \n from company name
-    df_result = df_result.str.replace("\n", "")
-    # remove Unkown company names
-    df_result = df_result[~df_result.str.contains("Unknown", flags=re.IGNORECASE, regex=True)]
-    # remove Inventor company names
-    df_result = df_result[~df_result.str.contains("Inventor", flags=re.IGNORECASE, regex=True)]
-    # remove https company names
-    df_result = df_result[~df_result.str.contains("https", flags=re.IGNORECASE, regex=True)]
-    # -----------> NO NEED TO ADD ID COLUMN HOWEVER IF REQUIRED IN FUTURE FOLLOWING PART CAN BE ENABLED <----------------
-    # sort alphabetically based on company name
-    # df_result = df_result.sort_values()
-    # convert to dataframe
-    df_result = pd.DataFrame(df_result)
-    # add ID column
-    # df_result["ID"] = df_result.index + 1
-    # make the ID column the first column
-    # df_result = df_result[["ID", "Company name"]]
-    # save to csv
-    # add new column to the dataframe from the dictionary received from create_company_dictionary function
-    company_dict = create_company_dictionary(excel_file, is_licensee)
-    df_result["Own ID"] = df_result["Company name"].map(company_dict)
-
-    df_result.to_csv(output_csv_file, sep=";", index=False)
-
-
 def get_data_dir_from_config():
     """
     Get the data directory from the config file.
@@ -2094,12 +1588,7 @@ def get_data_dir_from_config():
     :return:
     str: The data directory path.
     """
-    with open(environ.get("CONFIG_PATH"), "r", encoding="UTF-8") as config_file:
-        try:
-            config = yaml.safe_load(config_file)
-        except yaml.YAMLError as exc:
-            raise exc
-        return config
+    return read_config(environ.get("CONFIG_PATH"))
 
 
 if __name__ == "__main__":
@@ -2116,171 +1605,25 @@ if __name__ == "__main__":
 
     timestamp = datetime.now().strftime("%d_%m_%Y")
     timestamp_with_time = datetime.now().strftime("%d_%m_%Y_%H_%M_%S")
-    # Step 1
-    # --> crawl_data.py should generate data in data/data.csv
-
-    # crawl_data: prepare_data
-    # generates csv file for licensee
-    files_to_apply_batch_search = [
-        f"orbis_data_licensee_{timestamp}.csv",
-        f"orbis_data_licensor_{timestamp}.csv",
-    ]
-
-    generate_input_file_for_guo = [
-        f"orbis_data_licensee_{timestamp}.xlsx",
-        f"orbis_data_licensor_{timestamp}.xlsx",
-    ]
-
-    generate_input_file_for_ish = [
-        f"orbis_data_licensee_{timestamp}.xlsx",
-        f"orbis_data_licensor_{timestamp}.xlsx",
-    ]
-    orbis_data_licensee_file_name = f"orbis_data_licensee_{timestamp}.csv"
-
-    # check if file exists
-    if os.path.exists(path.join(environ.get("DATA_DIR"), orbis_data_licensee_file_name)):
-        print(f"Licensee file exists: {orbis_data_licensee_file_name}. Skipping to re-create it.")
-    else:
-        if environ.get("LOCAL_DEV") != "True" and environ.get("CHECK_ON_SEC") != "false":
-            pass
-
-            ## ---> ****ATTENTION****: THIS PART IS DEACTIVATED AFTER SEEING THAT MERGED DATA
-            ## ---> FROM SEC.GOV ADDS NOISE TO THE DATA WHICH ONLY CONTAINS COMPANY NAME
-
-            # create_input_file_for_orbis_batch_search(
-            #     path.join(environ.get("DATA_DIR"), environ.get("DATA_SOURCE")),
-            #     path.join(environ.get("DATA_DIR"), orbis_data_licensee_file_name),
-            #     is_licensee=True,
-            # )
-
-        else:
-            extract_company_data_from_raw_excel(
-                path.join(environ.get("DATA_DIR"), environ.get("DATA_SOURCE")),
-                path.join(environ.get("DATA_DIR"), orbis_data_licensee_file_name),
-                is_licensee=True,
-            )
-
-    orbis_data_licensor_file_name = f"orbis_data_licensor_{timestamp}.csv"
-
-    if os.path.exists(path.join(environ.get("DATA_DIR"), orbis_data_licensor_file_name)):
-        print(f"Licensor file exists: {orbis_data_licensor_file_name}. Skipping to re-create it.")
-    else:
-        # generates csv file for licensor
-        if environ.get("LOCAL_DEV") != "True" and environ.get("CHECK_ON_SEC") != "false":
-            pass
-            ## ---> ****ATTENTION****: THIS PART IS DEACTIVATED AFTER SEEING THAT MERGED DATA
-            ## ---> FROM SEC.GOV ADDS NOISE TO THE DATA WHICH ONLY CONTAINS COMPANY NAME
-
-            # create_input_file_for_orbis_batch_search(
-            #     path.join(environ.get("DATA_DIR"), environ.get("DATA_SOURCE")),
-            #     path.join(environ.get("DATA_DIR"), orbis_data_licensor_file_name),
-            #     is_licensee=False,
-            # )
-        else:
-            extract_company_data_from_raw_excel(
-                path.join(environ.get("DATA_DIR"), environ.get("DATA_SOURCE")),
-                path.join(environ.get("DATA_DIR"), orbis_data_licensor_file_name),
-                is_licensee=False,
-            )
-
-    for i in files_to_apply_batch_search:
-        send_file_to_slack(
-            path.join(environ.get("DATA_DIR"), i),
-            environ.get("SLACK_CHANNEL"),
-            f"[{timestamp_with_time}] File {i} created for batch search",
-        )
-
-    time.sleep(4)  # wait for 4 seconds for data to be saved in data folder
-
-    # # Step 2
-    # # --> data/data.csv needs to be uploaded to Orbis to start batch search
-    # run_batch_search(config_path, f"orbis_d.csv") # Todo: this csv file
-    # needs to come from crawl_data.py
+    parallel_execution = str(is_parallel_execution_active).lower() == "true"
 
-    if is_parallel_execution_active.lower() == "true":
-        run_in_parallel_generic(function=run_batch_search, args=files_to_apply_batch_search)
-    else:
-        # run_batch_search(config_path, f"orbis_data_{timestamp}.csv") # Todo: this csv file needs to come from crawl_data.py
-        # # # # --> after batch search is completed, data downloaded from Orbis
-
-        for file_to_search in files_to_apply_batch_search:
-            print(f"Now searching for file {file_to_search}")
-            run_batch_search(file_to_search)
-            time.sleep(5)
-            print(f"Search is done for file {file_to_search}")
-            send_file_to_slack(
-                path.join(environ.get("DATA_DIR"), f"{path.basename(file_to_search).split('.')[0]}.xlsx"),
-                environ.get("SLACK_CHANNEL"),
-                f"[{timestamp_with_time}] File {path.basename(file_to_search).split('.')[0]}.xlsx downloaded from Orbis after batch search",
-            )
-
-    # # # # Step 3
-    # # # # --> generate_data_for_guo to generate data by considering GUO of companies
-    input_files_with_company_raw_info = [
-        f"orbis_data_licensee_{timestamp}.xlsx",
-        f"orbis_data_licensor_{timestamp}.xlsx",
-    ]
-
-    for i in input_files_with_company_raw_info:
-        send_file_to_slack(
-            path.join(environ.get("DATA_DIR"), i),
-            environ.get("SLACK_CHANNEL"),
-            f"[{timestamp_with_time}] File {i} downloaded from Orbis after batch search",
-        )
-
-    run_in_parallel_generic(
-        function=generate_data_for_guo,
-        args=input_files_with_company_raw_info,
-    )
-
-    input_files_with_guo_info = [f"orbis_data_licensee_{timestamp}_guo.csv", f"orbis_data_licensor_{timestamp}_guo.csv"]
-
-    if is_parallel_execution_active.lower() == "true":
-        run_in_parallel_generic(function=run_batch_search, args=input_files_with_guo_info)
-    else:
-        for guo_input_file in input_files_with_guo_info:
-            print(f"Running for the file with guo info: {guo_input_file}")
-            run_batch_search(guo_input_file)
-            time.sleep(4)
-            print(f"Search is done for guo file {guo_input_file}")
-            send_file_to_slack(
-                path.join(environ.get("DATA_DIR"), f"{path.basename(guo_input_file).split('.')[0]}.xlsx"),
-                environ.get("SLACK_CHANNEL"),
-                f"[{timestamp_with_time}] File {path.basename(guo_input_file).split('.')[0]}.xslx created for GUO batch search",
-            )
-
-    # for i in input_files_with_guo_info:
-    #     send_file_to_slack(path.join(environ.get("DATA_DIR"),i), environ.get("SLACK_CHANNEL"),  f"File {i} created for GUO batch search")
-    # # # Step 3
-    # # # --> generate_data_for_guo to generate data by considering GUO of companies
-
-    # # # Step 3
-    # # # --> generate_data_for_guo to generate data by considering GUO of companies
-
-    input_files_with_ish_info = [f"orbis_data_licensee_{timestamp}_ish.csv", f"orbis_data_licensor_{timestamp}_ish.csv"]
+    # browsers are launched and logged in once, then reused by all batch searches of the pipeline
+    SESSION_POOL = BrowserSessionPool(start_orbis_session, size=get_seats() if parallel_execution else 1)
 
-    time.sleep(2)  # wait for 2 seconds for data to be saved in data folder
-
-    for i in input_files_with_company_raw_info:
-        generate_data_for_ish(i)
-
-    for i in input_files_with_ish_info:
-        send_file_to_slack(
-            path.join(environ.get("DATA_DIR"), i),
-            environ.get("SLACK_CHANNEL"),
-            f"[{timestamp_with_time}] File {i} created for ISH batch search",
+    # input files of the batch searches, batch searches, GUO and ISH input files of the searched companies
+    # each step starts as soon as the files it needs exist, see create_pipeline
+    pipeline = create_pipeline(timestamp, timestamp_with_time, parallel_execution)
+    if pipeline.number_of_seats > SESSION_POOL.size:
+        raise ValueError(
+            f"Pipeline has {pipeline.number_of_seats} browser seats but the session pool only {SESSION_POOL.size}"
         )
-
-    if is_parallel_execution_active.lower() == "true":
-        run_in_parallel_generic(function=run_batch_search, args=input_files_with_ish_info)
-    else:
-        for ish_input_file in input_files_with_ish_info:
-            print(f"Running for the file with ish info: {ish_input_file}")
-            run_batch_search(ish_input_file)
-            time.sleep(4)
-            print(f"Search is done for ish file {ish_input_file}")
-            send_file_to_slack(
-                path.join(environ.get("DATA_DIR"), f"{path.basename(ish_input_file).split('.')[0]}.xlsx"),
+    try:
+        if not pipeline.run():
+            send_message_to_slack(
+                f"[{timestamp_with_time}] Orbis pipeline finished with failed steps: "
+                f"{[name for name, report in pipeline.report().items() if report['status'] != 'done']}",
                 environ.get("SLACK_CHANNEL"),
-                f"[{timestamp_with_time}] File {path.basename(ish_input_file).split('.')[0]}.xlsx is downloaded from batch search",
             )
+    finally:
+        # log out and quit the browsers of the batch searches
+        SESSION_POOL.close()
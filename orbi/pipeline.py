@@ -0,0 +1,225 @@
+# author: mrtrkmn@github
+# description: Dependency graph scheduler of the orbi pipeline, a task starts as soon as the files it reads exist
+
+import concurrent.futures
+import logging
+import threading
+import time
+from os import path
+
+logger = logging.getLogger()
+
+# attempts of a task after its first failure
+DEFAULT_RETRIES = 2
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Task:
+    """
+    A step of the pipeline which reads input files and writes output files, e.g. the batch search of
+    orbis_data_licensee_<date>.csv which writes orbis_data_licensee_<date>.xlsx.
+
+    :param name: unique name of the task, used in the logs
+    :param function: function running the task
+    :param args: arguments of the function
+    :param inputs: paths of the files the task reads
+    :param outputs: paths of the files the task writes
+    :param uses_browser: the task needs a browser seat, see Pipeline
+    :param retries: attempts after the first failure
+    """
+
+    def __init__(self, name, function, args=(), inputs=(), outputs=(), uses_browser=False, retries=DEFAULT_RETRIES):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.uses_browser = uses_browser
+        self.retries = retries
+        self.status = PENDING
+        self.attempts = 0
+        self.elapsed = 0.0
+        self.error = None
+
+
+class Pipeline:
+    """
+    Runs tasks in the order of the files they exchange instead of a fixed order of phases.
+
+    A task depends on the tasks writing its inputs and starts as soon as they are done, e.g. the GUO input of the
+    licensee companies is generated while the licensor companies are still searched. Inputs which are not written
+    by any task must exist when the pipeline runs.
+
+    - a failed task is retried on its own, up to its number of retries
+    - a task whose inputs do not exist when it starts fails without retry (e.g. no company to search was found)
+    - tasks depending on a failed task are skipped, other tasks go on
+    - a task using a browser holds one of the browser_seats while it runs, other tasks are not limited. A running
+      task can take more free seats without waiting (e.g. for the shards of a batch search), see take_free_seats
+
+    :param browser_seats: number of browsers which can be used at the same time, e.g. the size of the session pool
+    """
+
+    def __init__(self, browser_seats=1):
+        self.tasks = {}
+        self.number_of_seats = browser_seats
+        self.browser_seats = threading.BoundedSemaphore(browser_seats)
+
+    def add(self, name, function, args=(), inputs=(), outputs=(), uses_browser=False, retries=DEFAULT_RETRIES):
+        """
+        Add a task, see Task for the parameters
+        :return: the task
+        """
+        if name in self.tasks:
+            raise ValueError(f"Task {name} is already in the pipeline")
+        for output in outputs:
+            producer = self.get_producer(output)
+            if producer is not None:
+                raise ValueError(f"{output} is written by both {producer.name} and {name}")
+        task = Task(name, function, args, inputs, outputs, uses_browser, retries)
+        self.tasks[name] = task
+        return task
+
+    def get_producer(self, file_path):
+        for task in self.tasks.values():
+            if file_path in task.outputs:
+                return task
+        return None
+
+    def get_dependencies(self, task):
+        """
+        Return the tasks writing the inputs of a task
+        """
+        producers = [self.get_producer(file_path) for file_path in task.inputs]
+        return [producer for producer in producers if producer is not None]
+
+    def check_dependencies(self):
+        """
+        Raise ValueError when the tasks depend on each other in a cycle
+        """
+        visited, visiting = set(), set()
+
+        def visit(task):
+            if task.name in visiting:
+                raise ValueError(f"Tasks depend on each other in a cycle through {task.name}")
+            if task.name not in visited:
+                visiting.add(task.name)
+                for dependency in self.get_dependencies(task):
+                    visit(dependency)
+                visiting.remove(task.name)
+                visited.add(task.name)
+
+        for task in self.tasks.values():
+            visit(task)
+
+    def run_task(self, task):
+        """
+        Run a task until it succeeds or its retries are used up, the last exception is raised
+        """
+        missing = [file_path for file_path in task.inputs if not path.exists(file_path)]
+        if missing:
+            raise FileNotFoundError(f"Inputs of {task.name} do not exist: {missing}")
+        start = time.monotonic()
+        try:
+            while True:
+                task.attempts += 1
+                try:
+                    if task.uses_browser:
+                        with self.browser_seats:
+                            return task.function(*task.args)
+                    return task.function(*task.args)
+                except (Exception, SystemExit) as e:
+                    # batch search exits when the browser gets stuck
+                    logger.debug(f"Task {task.name} failed on attempt {task.attempts}: {e!r}")
+                    print(f"Task {task.name} failed on attempt {task.attempts}: {e!r}")
+                    if task.attempts > task.retries:
+                        raise Exception(f"Task {task.name} failed after {task.attempts} attempts: {e!r}") from e
+        finally:
+            task.elapsed = time.monotonic() - start
+
+    def take_free_seats(self, number):
+        """
+        Take up to number browser seats which are free, without waiting for the others, in addition to the seat of
+        a running task. A task never waits for seats while it holds one, so the tasks can not block each other.
+        :param number: number of seats wanted
+        :return: number of seats taken, to be given back with release_seats
+        """
+        taken = 0
+        while taken < number and self.browser_seats.acquire(blocking=False):
+            taken += 1
+        return taken
+
+    def release_seats(self, number):
+        for _ in range(number):
+            self.browser_seats.release()
+
+    def get_ready_tasks(self):
+        """
+        Return the pending tasks whose dependencies are done, skip the ones whose dependencies did not succeed
+        """
+        skipped = True
+        while skipped:
+            # a skipped task makes the tasks depending on it skipped as well
+            ready, skipped = [], False
+            for task in self.tasks.values():
+                if task.status != PENDING:
+                    continue
+                dependencies = self.get_dependencies(task)
+                if any(dependency.status in (FAILED, SKIPPED) for dependency in dependencies):
+                    task.status = SKIPPED
+                    skipped = True
+                    logger.debug(f"Task {task.name} is skipped, one of its dependencies did not succeed")
+                elif all(dependency.status == DONE for dependency in dependencies):
+                    ready.append(task)
+        return ready
+
+    def run(self):
+        """
+        Run all tasks, each one as soon as its dependencies are done
+        :return: True when all tasks succeeded
+        """
+        self.check_dependencies()
+        running = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(self.tasks))) as executor:
+            while True:
+                for task in self.get_ready_tasks():
+                    task.status = RUNNING
+                    logger.debug(f"Task {task.name} is started")
+                    running[executor.submit(self.run_task, task)] = task
+                if not running:
+                    break
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        future.result()
+                        task.status = DONE
+                    except Exception as e:
+                        task.status = FAILED
+                        task.error = e
+                        logger.debug(f"Task {task.name} failed: {e}")
+                        print(f"Task {task.name} failed: {e}")
+        self.log_report()
+        return all(task.status == DONE for task in self.tasks.values())
+
+    def report(self):
+        """
+        Return the status of each task: {name: {"status": ..., "attempts": n, "elapsed": seconds}}
+        """
+        return {
+            task.name: {"status": task.status, "attempts": task.attempts, "elapsed": task.elapsed}
+            for task in self.tasks.values()
+        }
+
+    def log_report(self):
+        """
+        Log and print the status of each task, see report()
+        """
+        for name, task_report in self.report().items():
+            line = f"Task {name}: {task_report['status']} ({task_report['attempts']} attempts, {task_report['elapsed']:.1f}s)"
+            logger.debug(line)
+            print(line)
@@ -0,0 +1,397 @@
+# author: mrtrkmn@github
+# description: Persistent on-disk cache for JSON responses of data.sec.gov API (companyfacts and submissions)
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from email.utils import formatdate
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.abspath("data"), "sec_cache")
+DEFAULT_MAX_AGE_IN_HOURS = 12
+DEFAULT_MAX_SIZE_IN_MB = 2048
+# temp files older than this were left by interrupted writers, see SECResponseCache.sweep
+STALE_TMP_AGE_IN_SECONDS = 60 * 60
+
+
+class CacheEntryError(Exception):
+    """
+    A cached response can not be read or parsed, the entry is removed and the response has to be downloaded again
+    """
+
+
+class SECResponseCache:
+    """
+    Content addressed cache for data.sec.gov responses.
+
+    Every response body is stored once, gzip compressed, under the SHA-256 of its content (objects/).
+    For every CIK and endpoint, a small metadata file (meta/) points to the stored body together with
+    the validators (ETag, Last-Modified) returned by SEC.gov.
+
+    - Entries younger than `max_age_in_hours` are served from disk without any request.
+    - Older entries are revalidated with a conditional request (If-None-Match / If-Modified-Since),
+      a 304 response is served from disk.
+    - A body which is not referenced by any entry anymore (e.g. the response of the url changed) is removed.
+    - When the stored bodies exceed `max_size_in_mb`, unreferenced bodies and stale temp files are swept, then least
+      recently used entries are evicted.
+
+    :param cache_dir: directory where the cache is stored
+    :param max_age_in_hours: age until an entry is served without revalidation
+    :param max_size_in_mb: maximum size of the stored (compressed) bodies
+    """
+
+    def __init__(
+        self,
+        cache_dir=DEFAULT_CACHE_DIR,
+        max_age_in_hours=DEFAULT_MAX_AGE_IN_HOURS,
+        max_size_in_mb=DEFAULT_MAX_SIZE_IN_MB,
+    ):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.meta_dir = os.path.join(cache_dir, "meta")
+        self.max_age = float(max_age_in_hours) * 60 * 60
+        self.max_size = int(float(max_size_in_mb) * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.total_size = None
+        # {digest: number of entries pointing to the body}, read from meta/ on first use
+        self.references = None
+
+    def key_for(self, url):
+        """
+        Return the cache key of an url, e.g. companyfacts-CIK0000320193
+        :param url: https://data.sec.gov/api/xbrl/companyfacts/CIK##########.json or
+                    https://data.sec.gov/submissions/CIK##########.json
+        """
+        endpoint, file_name = url.rstrip("/").split("/")[-2:]
+        return f"{endpoint}-{file_name.split('.json')[0]}"
+
+    def meta_path(self, url):
+        return os.path.join(self.meta_dir, f"{self.key_for(url)}.json")
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.json.gz")
+
+    def lookup(self, url):
+        """
+        Return the metadata of the cached response for given url, None if it is not cached
+        :param url: requested url
+        """
+        try:
+            with open(self.meta_path(url), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self.object_path(entry["digest"])):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        """
+        Check whether the cached entry can be served without revalidation
+        :param entry: metadata returned by lookup
+        """
+        return entry is not None and time.time() - entry["validated_at"] < self.max_age
+
+    def conditional_headers(self, entry):
+        """
+        Return the headers of a conditional request for a cached entry
+        :param entry: metadata returned by lookup
+        """
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        else:
+            headers["If-Modified-Since"] = formatdate(entry["validated_at"], usegmt=True)
+        return headers
+
+    def load(self, entry):
+        """
+        Return the decoded JSON body of a cached entry
+        :param entry: metadata returned by lookup
+        :raises CacheEntryError: when the body can not be read or decoded
+        """
+        return self.read(entry, lambda f: json.loads(f.read()))
+
+    def read(self, entry, parse):
+        """
+        Return parse(f), f being a binary file object streaming the decompressed body of a cached entry.
+        An entry whose body can not be read or parsed (e.g. a truncated object) is removed from the cache.
+
+        :param entry: metadata returned by lookup
+        :param parse: function parsing the body, e.g. CompanyFactsFilter().parse_file
+        :raises CacheEntryError: when the body can not be read or parsed
+        """
+        try:
+            with self.open_body(entry) as f:
+                return parse(f)
+        except Exception as e:
+            # gzip, zlib and JSON parsers raise different exceptions, all of them mean the entry is unusable
+            self.invalidate(entry)
+            raise CacheEntryError(f"Cached response of {entry['url']} can not be read: {e!r}") from e
+
+    def invalidate(self, entry):
+        """
+        Remove a cached entry and its body, e.g. when the body is corrupt
+        Other entries pointing to the same body are cache misses afterwards, see lookup.
+
+        :param entry: metadata returned by lookup
+        """
+        with self.lock:
+            try:
+                os.remove(self.meta_path(entry["url"]))
+            except OSError:
+                pass
+            else:
+                if self.references is not None:
+                    self.references[entry["digest"]] -= 1
+                    if self.references[entry["digest"]] <= 0:
+                        del self.references[entry["digest"]]
+            self.remove_object(entry["digest"])
+
+    def revalidated(self, url, entry):
+        """
+        Mark a cached entry as valid again (after 304 Not Modified response) and return its body
+        :param url: requested url
+        :param entry: metadata returned by lookup
+        """
+        self.touch(url, entry)
+        return self.load(entry)
+
+    def touch(self, url, entry):
+        """
+        Mark a cached entry as valid again without reading its body
+        :param url: requested url
+        :param entry: metadata returned by lookup
+        """
+        entry["validated_at"] = time.time()
+        self.write_meta(url, entry)
+
+    def open_body(self, entry):
+        """
+        Return a binary file object streaming the decompressed body of a cached entry
+        :param entry: metadata returned by lookup
+        """
+        return gzip.open(self.object_path(entry["digest"]), "rb")
+
+    def store(self, url, body, etag=None, last_modified=None):
+        """
+        Store the raw body of a 200 response with its validators
+        :param url: requested url
+        :param body: raw response body (bytes)
+        :param etag: value of ETag response header
+        :param last_modified: value of Last-Modified response header
+        """
+        writer = self.open_writer(url, etag, last_modified)
+        writer.write(body)
+        writer.commit()
+
+    def open_writer(self, url, etag=None, last_modified=None):
+        """
+        Return a CachedResponseWriter to store the body of a 200 response chunk by chunk
+        :param url: requested url
+        :param etag: value of ETag response header
+        :param last_modified: value of Last-Modified response header
+        """
+        return CachedResponseWriter(self, url, etag, last_modified)
+
+    def add_object(self, url, tmp_path, digest, etag, last_modified):
+        """
+        Move a compressed body written to tmp_path into the object store and point the entry of url to it
+        """
+        object_path = self.object_path(digest)
+        with self.lock:
+            references = self.get_references()
+            previous = self.read_meta(self.meta_path(url))
+            if os.path.exists(object_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(tmp_path, object_path)
+                if self.total_size is not None:
+                    self.total_size += os.path.getsize(object_path)
+            self.write_meta(
+                url,
+                {
+                    "url": url,
+                    "digest": digest,
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "validated_at": time.time(),
+                },
+            )
+            references[digest] += 1
+            if previous is not None:
+                self.release_object(previous["digest"])
+            if self.get_total_size() > self.max_size:
+                self.evict()
+
+    def read_meta(self, meta_path):
+        """
+        Return the entry stored in a metadata file, None if it does not exist or can not be read
+        """
+        try:
+            with open(meta_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def read_entries(self):
+        """
+        Return the (metadata file name, entry) of all cached entries
+        """
+        if not os.path.isdir(self.meta_dir):
+            return []
+        entries = []
+        for file_name in os.listdir(self.meta_dir):
+            if not file_name.endswith(".json"):
+                continue
+            entry = self.read_meta(os.path.join(self.meta_dir, file_name))
+            if entry is not None:
+                entries.append((file_name, entry))
+        return entries
+
+    def get_references(self):
+        """
+        Return the number of entries pointing to each stored body, {digest: count}
+        """
+        if self.references is None:
+            self.references = Counter(entry["digest"] for _, entry in self.read_entries())
+        return self.references
+
+    def release_object(self, digest):
+        """
+        Drop one reference to a stored body, the body is removed when no entry points to it anymore
+        :param digest: SHA-256 of the body
+        """
+        references = self.get_references()
+        references[digest] -= 1
+        if references[digest] <= 0:
+            del references[digest]
+            self.remove_object(digest)
+
+    def remove_object(self, digest):
+        self.remove_file(self.object_path(digest))
+
+    def remove_file(self, file_path):
+        """
+        Remove a file of the object store and keep the total size up to date
+        """
+        try:
+            size = os.path.getsize(file_path)
+            os.remove(file_path)
+        except OSError:
+            return
+        if self.total_size is not None:
+            self.total_size -= size
+
+    def write_meta(self, url, entry):
+        os.makedirs(self.meta_dir, exist_ok=True)
+        meta_path = self.meta_path(url)
+        tmp_path = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, meta_path)
+
+    def get_total_size(self):
+        """
+        Return the size of all stored bodies in bytes
+        """
+        if self.total_size is None:
+            self.total_size = 0
+            for root, _, files in os.walk(self.objects_dir):
+                self.total_size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return self.total_size
+
+    def sweep(self):
+        """
+        Remove the bodies which are not referenced by any entry and the temp files left by interrupted writers
+        (older than STALE_TMP_AGE_IN_SECONDS, younger ones may still be written)
+        """
+        references = self.get_references()
+        stale_before = time.time() - STALE_TMP_AGE_IN_SECONDS
+        for root, _, files in os.walk(self.objects_dir):
+            for file_name in files:
+                file_path = os.path.join(root, file_name)
+                if file_name.endswith(".tmp"):
+                    if self.is_older(file_path, stale_before):
+                        self.remove_file(file_path)
+                elif file_name[: -len(".json.gz")] not in references:
+                    self.remove_file(file_path)
+        if os.path.isdir(self.meta_dir):
+            for file_name in os.listdir(self.meta_dir):
+                file_path = os.path.join(self.meta_dir, file_name)
+                if file_name.endswith(".tmp") and self.is_older(file_path, stale_before):
+                    os.remove(file_path)
+
+    def is_older(self, file_path, timestamp):
+        try:
+            return os.path.getmtime(file_path) < timestamp
+        except OSError:
+            return False
+
+    def evict(self):
+        """
+        Sweep unreferenced bodies and stale temp files, then remove least recently validated entries until the
+        stored bodies fit into max_size. Bodies which are still referenced by another entry are kept.
+        """
+        entries = self.read_entries()
+        self.references = Counter(entry["digest"] for _, entry in entries)
+        self.sweep()
+
+        entries.sort(key=lambda item: item[1]["validated_at"])
+        for file_name, entry in entries:
+            if self.get_total_size() <= self.max_size:
+                break
+            os.remove(os.path.join(self.meta_dir, file_name))
+            self.release_object(entry["digest"])
+        print(f"SEC cache evicted to {self.get_total_size() / (1024 * 1024):.1f} MB")
+
+
+class CachedResponseWriter:
+    """
+    Writes a response body to the cache while it is being downloaded.
+    The body is compressed and hashed incrementally, so it never has to be held in memory at once.
+
+    :param cache: SECResponseCache instance
+    :param url: requested url
+    :param etag: value of ETag response header
+    :param last_modified: value of Last-Modified response header
+    """
+
+    def __init__(self, cache, url, etag=None, last_modified=None):
+        self.cache = cache
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.sha256 = hashlib.sha256()
+        os.makedirs(cache.objects_dir, exist_ok=True)
+        # one file per writer, workers downloading the same url at once must not write into the same file
+        self.tmp_path = os.path.join(cache.objects_dir, f"{cache.key_for(url)}.{uuid.uuid4().hex}.tmp")
+        self.file = gzip.open(self.tmp_path, "wb", compresslevel=6)
+
+    def write(self, chunk):
+        self.sha256.update(chunk)
+        self.file.write(chunk)
+
+    def commit(self):
+        """
+        Finish writing and add the body to the cache
+        """
+        self.file.close()
+        self.cache.add_object(self.url, self.tmp_path, self.sha256.hexdigest(), self.etag, self.last_modified)
+
+    def abort(self):
+        """
+        Discard the partially written body, e.g. when the download fails
+        """
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
@@ -0,0 +1,144 @@
+# author: mrtrkmn@github
+# description: Pool of logged in browser sessions, reused by the batch searches of a run instead of logging in each time
+
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger()
+
+
+class BrowserSessionPool:
+    """
+    Pool of at most `size` browser sessions which are launched and logged in once, then handed out to batch searches.
+
+    Sessions are launched on demand: the first searches launch a session each, later searches wait for an idle one.
+    Before a session is handed out it is health checked:
+
+    - a session whose browser does not respond anymore is quit and replaced by a new session
+    - a session which is logged out (e.g. expired) logs in again, other sessions are used as they are
+
+    A session needs following methods: is_browser_alive(), ensure_logged_in(), quit_browser() and __exit__ (logout
+    and quit), e.g. an Orbis instance returned by Orbis().__enter__().
+
+    :param create_session: function returning a new logged in session
+    :param size: maximum number of sessions
+    """
+
+    def __init__(self, create_session, size=1):
+        self.create_session = create_session
+        self.size = size
+        # most recently released session first, it is the least likely to be expired
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.sessions = []
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def launch(self):
+        """
+        Launch a new session, the caller reserved its place in self.sessions.
+        The place is freed again when the session can not be launched.
+        """
+        logger.debug("Launching a new browser session")
+        try:
+            return self.create_session()
+        except (Exception, SystemExit):
+            # login exits when Orbis shows an error message
+            with self.lock:
+                self.sessions.remove(None)
+            raise
+
+    def acquire(self):
+        """
+        Return an idle session, launch a new one if the pool is not full, otherwise wait for a session to be released
+        """
+        with self.lock:
+            if self.closed:
+                raise Exception("Browser session pool is closed")
+            launch = self.idle.empty() and len(self.sessions) < self.size
+            if launch:
+                # reserve the place of the new session
+                self.sessions.append(None)
+        if launch:
+            session = self.launch()
+            with self.lock:
+                self.sessions[self.sessions.index(None)] = session
+            return session
+        return self.check(self.idle.get())
+
+    def check(self, session):
+        """
+        Health check of an idle session before it is handed out
+        :param session: idle session
+        :return: the session, or the session replacing it
+        """
+        try:
+            if not session.is_browser_alive():
+                logger.debug("Browser session does not respond, replacing it")
+                return self.replace(session)
+            session.ensure_logged_in()
+            return session
+        except (Exception, SystemExit) as e:
+            # login exits when Orbis shows an error message
+            logger.debug(f"Browser session can not log in, replacing it: {e!r}")
+            return self.replace(session)
+
+    def replace(self, session):
+        """
+        Quit a broken session and launch a new one in its place, the place is freed if the launch fails
+        :param session: broken session
+        :return: the new session
+        """
+        try:
+            session.quit_browser()
+        except Exception as e:
+            logger.debug(f"Exception on quitting browser session: {e}")
+        with self.lock:
+            self.sessions[self.sessions.index(session)] = None
+        new_session = self.launch()
+        with self.lock:
+            self.sessions[self.sessions.index(None)] = new_session
+        return new_session
+
+    def release(self, session):
+        """
+        Give a session back to the pool
+        :param session: session returned by acquire
+        """
+        self.idle.put(session)
+
+    @contextmanager
+    def session(self):
+        """
+        Context manager handing out a session, the session is given back to the pool when the block exits
+        (also on exceptions, it is health checked before it is used again)
+        """
+        session = self.acquire()
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def close(self):
+        """
+        Log out and quit all sessions
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            sessions = [session for session in self.sessions if session is not None]
+        for session in sessions:
+            try:
+                session.__exit__(None, None, None)
+            except (Exception, SystemExit) as e:
+                # logout exits when the logout button is not found
+                logger.debug(f"Exception on closing browser session: {e}")
+                session.quit_browser()
@@ -0,0 +1,134 @@
+# author: mrtrkmn@github
+# description: Split batch search input files into shards searched in parallel, merge the downloaded shard results
+
+import logging
+import math
+import os
+from os import path
+
+import pandas as pd
+
+from export import write_xlsx
+
+logger = logging.getLogger()
+
+# maximum number of simultaneous users of the Orbis license
+DEFAULT_SEATS = 5
+# smaller inputs are not worth the login and the column setup of another browser
+MIN_ROWS_PER_SHARD = 100
+RESULTS_SHEET = "Results"
+# Own ID mapping exported by the batch search, see Orbis.export_mapped_data_with_own_id and merge.py
+OWN_ID_EXPORT_PREFIX = "Export_"
+OWN_ID_KEY = "Own ID"
+
+
+def get_seats():
+    """
+    Number of browser sessions which can search at once, ORBIS_SEATS or DEFAULT_SEATS
+    """
+    return int(os.environ.get("ORBIS_SEATS") or DEFAULT_SEATS)
+
+
+def get_shard_file_name(input_file, shard_number):
+    base_name, extension = path.splitext(input_file)
+    return f"{base_name}_shard{shard_number}{extension}"
+
+
+def get_output_file_name(input_file, prefix=""):
+    """
+    Path of the xlsx file downloaded for a batch search input file, named after it like in Orbis.batch_search
+    :param input_file: path to the input CSV file
+    :param prefix: prefix of the file name, e.g. OWN_ID_EXPORT_PREFIX
+    """
+    return path.join(path.dirname(input_file), f"{prefix}{path.basename(input_file).split('.')[0]}.xlsx")
+
+
+def plan_shards(input_file, number_of_shards, min_rows_per_shard=MIN_ROWS_PER_SHARD):
+    """
+    Split a batch search input file (";" delimited CSV) into consecutive shards of about the same size.
+
+    The number of shards is at most number_of_shards and at most one shard per min_rows_per_shard rows. When a single
+    shard is planned the input file is searched as it is and no file is written. Otherwise the shards are written
+    next to the input file: <input>_shard<n>.csv, with the header of the input file. A shard file which already has
+    the same rows is not written again, so that its results stay valid, see is_shard_searched.
+
+    :param input_file: path to the input CSV file, e.g. data/orbis_data_licensee_<date>.csv
+    :param number_of_shards: maximum number of shards, e.g. get_seats()
+    :param min_rows_per_shard: minimum number of rows of a shard
+    :return: paths of the files to search, [input_file] when it is not split
+    """
+    df = pd.read_csv(input_file, sep=";", dtype=str, keep_default_na=False)
+    number_of_shards = max(1, min(number_of_shards, len(df) // max(1, min_rows_per_shard)))
+    if number_of_shards == 1:
+        return [input_file]
+
+    shard_size = math.ceil(len(df) / number_of_shards)
+    shard_files = []
+    for shard_number, start in enumerate(range(0, len(df), shard_size)):
+        shard_file = get_shard_file_name(input_file, shard_number)
+        write_shard(shard_file, df.iloc[start : start + shard_size].to_csv(sep=";", index=False))
+        shard_files.append(shard_file)
+    logger.debug(f"{input_file} ({len(df)} rows) is split into {len(shard_files)} shards of {shard_size} rows")
+    return shard_files
+
+
+def write_shard(shard_file, content):
+    """
+    Write the content of a shard file, unless the file already has this content
+    :param shard_file: path of the shard file
+    :param content: CSV content of the shard
+    """
+    if path.exists(shard_file):
+        with open(shard_file, "r", newline="") as f:
+            if f.read() == content:
+                return
+    with open(shard_file, "w", newline="") as f:
+        f.write(content)
+
+
+def is_shard_searched(shard_file):
+    """
+    Check whether the results of a shard were downloaded after the shard file was written, e.g. by a previous
+    attempt of the batch search of its input file
+    :param shard_file: path of the shard file, see plan_shards
+    """
+    shard_output_file = get_output_file_name(shard_file)
+    return path.exists(shard_output_file) and path.getmtime(shard_output_file) >= path.getmtime(shard_file)
+
+
+def merge_shard_results(input_file, shard_files):
+    """
+    Merge the xlsx files downloaded for the shards of an input file into the files an unsplit search downloads.
+
+    - <input>.xlsx: "Results" of all shards in shard order, rows are numbered again. Rows are not deduplicated across
+      shards: the rows of each shard belong to its own input rows, which are mapped back with the Own ID export.
+    - Export_<input>.xlsx: Own ID mappings of all shards, one row per Own ID (input row). Only written when every
+      shard has one.
+
+    :param input_file: path to the input CSV file which was split
+    :param shard_files: paths of the shards, see plan_shards
+    :return: path of the merged results file
+    """
+    results = []
+    for shard_file in shard_files:
+        shard_output_file = get_output_file_name(shard_file)
+        if not path.exists(shard_output_file):
+            raise FileNotFoundError(f"Results of shard {shard_file} do not exist at {shard_output_file}")
+        # first column is the row number of Orbis
+        results.append(pd.read_excel(shard_output_file, sheet_name=RESULTS_SHEET, index_col=0, engine="openpyxl"))
+    df_results = pd.concat(results)
+    df_results.index = pd.RangeIndex(1, len(df_results) + 1, name=df_results.index.name)
+    output_file = get_output_file_name(input_file)
+    write_xlsx(output_file, {RESULTS_SHEET: df_results}, index=True)
+    logger.debug(f"Results of {len(shard_files)} shards are merged into {output_file} ({len(df_results)} rows)")
+
+    own_id_files = [get_output_file_name(shard_file, OWN_ID_EXPORT_PREFIX) for shard_file in shard_files]
+    if all(path.exists(own_id_file) for own_id_file in own_id_files):
+        sheet_name = pd.ExcelFile(own_id_files[0], engine="openpyxl").sheet_names[0]
+        df_own_ids = pd.concat([pd.read_excel(own_id_file, engine="openpyxl") for own_id_file in own_id_files])
+        if OWN_ID_KEY in df_own_ids.columns:
+            df_own_ids = df_own_ids.drop_duplicates(subset=OWN_ID_KEY)
+        write_xlsx(get_output_file_name(input_file, OWN_ID_EXPORT_PREFIX), {sheet_name: df_own_ids})
+    else:
+        logger.debug(f"Own ID mapping is missing for some shards of {input_file}, Export file is not merged")
+    return output_file
@@ -0,0 +1,187 @@
+# author: mrtrkmn@github
+# description: Rate limiting helpers used while requesting data from SEC.gov API endpoints
+
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# SEC.gov fair access policy: https://www.sec.gov/os/accessing-edgar-data
+SEC_MAX_REQUESTS_PER_SECOND = 10
+# responses which are retried, any other status (e.g. 404) is final
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_MAX_RETRIES = 5
+# upper bound of a delay requested with Retry-After, a larger value is most likely a misconfigured server
+MAX_RETRY_AFTER = 600
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket which limits the number of requests sent per second.
+
+    Every request consumes one token, tokens are refilled continuously with the given rate.
+    With the default capacity of one token, requests are paced evenly (1 / rate seconds apart),
+    so that no one second window contains more than `rate` requests.
+
+    :param rate: number of tokens refilled per second
+    :param capacity: maximum number of tokens which can be stored (burst size)
+    """
+
+    def __init__(self, rate=SEC_MAX_REQUESTS_PER_SECOND, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        """
+        Adds the tokens generated since the last refill, bounded by the capacity of the bucket
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """
+        Waits until a token is available and consumes it.
+        Callers are served in the order they are waiting on the lock.
+        """
+        async with self.lock:
+            self.refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= 1
+
+
+def parse_retry_after(value):
+    """
+    Return the number of seconds given in a Retry-After header, None if it is missing or invalid
+    :param value: header value, either delay in seconds ("120") or an HTTP date ("Wed, 21 Oct 2015 07:28:00 GMT")
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def get_retry_delay(attempt, retry_after=None, base_delay=1.0, max_delay=60.0, max_retry_after=MAX_RETRY_AFTER):
+    """
+    Return the number of seconds to wait before the next attempt of a failed request
+
+    Exponential backoff with full jitter: a random delay between 0 and base_delay * 2 ** attempt (capped at
+    max_delay), so that workers throttled at the same time do not retry at the same time.
+    A delay requested by the server with Retry-After is respected even when it is longer than max_delay,
+    it is only bounded by max_retry_after.
+
+    :param attempt: number of the failed attempt, starting from 0
+    :param retry_after: value of Retry-After response header
+    :param base_delay: delay of the first retry in seconds
+    :param max_delay: maximum delay of the backoff in seconds
+    :param max_retry_after: maximum delay requested with Retry-After in seconds
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+    requested_delay = parse_retry_after(retry_after)
+    if requested_delay is not None:
+        delay = max(delay, min(requested_delay, max_retry_after))
+    return delay
+
+
+class AIMDRateController:
+    """
+    Adjusts the rate of a TokenBucket with additive increase / multiplicative decrease (AIMD).
+
+    Each successful request increases the rate by `increase` requests per second up to `max_rate`,
+    each throttled request (429, 5xx) multiplies the rate by `decrease` down to `min_rate`.
+    Requests in flight are usually throttled together, so the rate is decreased at most once per `cooldown` seconds.
+
+    :param bucket: TokenBucket whose rate is adjusted
+    :param max_rate: maximum rate, e.g. the limit of the server
+    :param min_rate: minimum rate
+    :param increase: requests per second added after each successful request
+    :param decrease: factor applied to the rate after a throttled request
+    :param cooldown: minimum number of seconds between two decreases
+    """
+
+    def __init__(
+        self, bucket, max_rate=SEC_MAX_REQUESTS_PER_SECOND, min_rate=1, increase=0.1, decrease=0.5, cooldown=1
+    ):
+        self.bucket = bucket
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.decreased_at = None
+
+    def on_success(self):
+        self.bucket.rate = min(self.max_rate, self.bucket.rate + self.increase)
+
+    def on_throttled(self):
+        now = time.monotonic()
+        if self.decreased_at is not None and now - self.decreased_at < self.cooldown:
+            return
+        self.decreased_at = now
+        self.bucket.rate = max(self.min_rate, self.bucket.rate * self.decrease)
+        print(f"Throttled by server, request rate is lowered to {self.bucket.rate:.2f} requests per second")
+
+
+class CircuitBreaker:
+    """
+    Pauses all requests to a host after too many consecutive failures.
+
+    After `failure_threshold` consecutive failed requests (throttled, server errors, connection errors)
+    the breaker opens: `wait` blocks every caller for `reset_timeout` seconds. Requests are then let through again,
+    the first success closes the breaker, another failure opens it again for the next `reset_timeout` seconds.
+    The server can also open the breaker on its own with Retry-After, see `pause`.
+
+    :param failure_threshold: number of consecutive failures which opens the breaker
+    :param reset_timeout: seconds the breaker stays open
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_until = 0.0
+
+    def is_open(self):
+        return time.monotonic() < self.opened_until
+
+    def record_success(self):
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold and not self.is_open():
+            self.opened_until = time.monotonic() + self.reset_timeout
+            print(f"{self.failures} consecutive failed requests, pausing requests for {self.reset_timeout} seconds")
+
+    def pause(self, seconds):
+        """
+        Open the breaker for at least given number of seconds, e.g. the delay requested with Retry-After,
+        so that other requests to the host wait as well instead of being throttled one by one
+        :param seconds: number of seconds the breaker stays open
+        """
+        opened_until = time.monotonic() + seconds
+        if opened_until > self.opened_until:
+            self.opened_until = opened_until
+            print(f"Server requested to retry later, pausing requests for {seconds:.1f} seconds")
+
+    async def wait(self):
+        """
+        Waits until the breaker is closed (or half open)
+        """
+        while self.is_open():
+            await asyncio.sleep(self.opened_until - time.monotonic())
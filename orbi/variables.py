@@ -114,6 +114,45 @@ CONTINUE_LATER_BUTTON = '//*[@id="Cancel"]'
 SEARCHING_POP_UP = "/html/body/section[2]/div[3]/div/form/div[1]/div[2]"
 WARNING_MESSAGE_HEADER = "/html/body/section[2]/div[3]/div/form/div[1]/div[1]"
 
+# columns added to the search results before export, in this order (see Orbis.apply_column_layout)
+# search: text typed into the search field of the add/remove columns page
+# xpath: column clicked in the search results
+# popup: buttons clicked after the column when they show up (e.g. save button of the popup of the column)
+# label: name of the column in the selections panel, search text by default
+COLUMN_LAYOUT = [
+    {"search": "City", "xpath": CITY_COLUMN, "popup": [POPUP_SAVE_BUTTON]},
+    {"search": "Country", "xpath": COUNTRY_COLUMN},
+    # required for the M&A activities note
+    {"search": "Delisting Note", "xpath": DELISTING_NOTE},
+    {"search": "Other Company ID", "xpath": CIK_NUMBER_VIEW, "popup": [POPUP_SAVE_BUTTON]},
+    {"search": "US SIC, secondary code(s)", "xpath": US_SIC_SECONDARY_CODES, "popup": [OP_REVENUE_OK_BUTTON]},
+    {"search": "Description History", "xpath": DESCRIPTION_HISTORY},
+    {"search": "History", "xpath": HISTORY},
+    {"search": "BVD ID number", "xpath": BVD_ID_NUMBER_ADD},
+    {"search": "Orbis ID number", "xpath": ORBIS_ID_NUMBER_ADD},
+    {"search": "GUO - Name", "xpath": GUO_NAME_INFO},
+    {"search": "ISH - Name", "xpath": ISH_NAME},
+]
+
+# financial items added to the search results after COLUMN_LAYOUT, the keys are the financial columns of the
+# exported data (see offline.FINANCIAL_COLUMNS), values are the xpaths of the items
+FINANCIAL_VARIABLES = {
+    "Operating revenue (Turnover)": OP_REVENUE_SETTINGS,
+    "Sales": SALES_SETTINGS,
+    "Gross profit": GROSS_PROFIT,
+    # "Operating P/L [=EBIT]": OPERATING_PL_SETTINS,
+    "P/L before tax": PL_BEFORE_TAX_SETTINGS,
+    "P/L for period [=Net income]": PL_FOR_PERIOD_SETTINGS,
+    "Cash flow": CASH_FLOW_SETTINGS,
+    "Total assets": TOTAL_ASSETS_SETTINGS,
+    "Number of employees": NUMBER_OF_EMPLOYEES_SETTINGS,
+}
+# non financial items added after FINANCIAL_VARIABLES
+NON_FINANCIAL_VARIABLES = {
+    "Trade description (English)": TRADE_DESC,
+    "BvD sectors": BVD_SECTORS,
+}
+
 NOT_MATCHED_COMPANIES_FILE_NAME = "not_matched_companies.txt"
 
 SEC_DATA_HEADERS = [
@@ -0,0 +1,328 @@
+# author: mrtrkmn@github
+# description: Explicit waits of the Orbis selenium flow (element state, DOM mutations, attribute changes, network idle)
+
+import logging
+import os
+import time
+
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+logger = logging.getLogger()
+
+# maximum seconds waited by each step of the batch search, "default" is used for steps which are not listed
+DEFAULT_STEP_TIMEOUTS = {
+    "default": 60,
+    "login": 60,
+    "page_load": 60,
+    "clickable": 10 * 60,
+    "upload": 2 * 60,
+    "apply": 2 * 60,
+    "search_progress": 20,
+    "processing_overlay": 10 * 60,
+    "columns": 30,
+    "pages": 60,
+    "export": 2 * 60,
+    "download": 30 * 60,
+    "download_file": 30,
+}
+# seconds waited for Orbis to generate the export, overrides "download" of DEFAULT_STEP_TIMEOUTS, 0 waits without limit
+DOWNLOAD_TIMEOUT_ENV = "ORBIS_DOWNLOAD_TIMEOUT"
+POLL_FREQUENCY = 0.25
+# seconds without DOM mutations / new network requests after which the page is considered settled
+QUIET_PERIOD = 0.5
+
+# installs a MutationObserver once per document, returns milliseconds since the last DOM mutation
+DOM_MUTATION_SCRIPT = """
+if (!window.__orbiMutations) {
+    window.__orbiMutations = {last: Date.now()};
+    new MutationObserver(function () { window.__orbiMutations.last = Date.now(); }).observe(
+        document, {childList: true, subtree: true, attributes: true, characterData: true}
+    );
+}
+return Date.now() - window.__orbiMutations.last;
+"""
+
+# state of network activity of the page: pending jQuery requests and number of resources loaded so far.
+# Resources are counted by a PerformanceObserver, the resource timing buffer is emptied at each call: the buffer
+# holds only 250 entries by default and the count of a full buffer does not change anymore.
+NETWORK_STATE_SCRIPT = """
+if (!window.__orbiResources) {
+    window.__orbiResources = {count: 0};
+    new PerformanceObserver(function (list) { window.__orbiResources.count += list.getEntries().length; }).observe(
+        {type: "resource", buffered: true}
+    );
+}
+performance.clearResourceTimings();
+return [document.readyState, (window.jQuery && window.jQuery.active) || 0, window.__orbiResources.count];
+"""
+
+
+def get_attribute(driver, xpath, attribute):
+    return driver.find_element(By.XPATH, xpath).get_attribute(attribute)
+
+
+class document_is_ready:
+    """
+    Condition: document.readyState is "complete"
+    """
+
+    def __call__(self, driver):
+        return driver.execute_script("return document.readyState") == "complete"
+
+
+class dom_is_quiet:
+    """
+    Condition: no DOM mutation happened during the last quiet_period seconds
+    :param quiet_period: seconds without mutation
+    """
+
+    def __init__(self, quiet_period=QUIET_PERIOD):
+        self.quiet_period = quiet_period
+
+    def __call__(self, driver):
+        return driver.execute_script(DOM_MUTATION_SCRIPT) >= self.quiet_period * 1000
+
+
+class network_is_idle:
+    """
+    Condition: the document is loaded, no jQuery request is pending and no new resource (XHR, script, image, ...)
+    was loaded during the last quiet_period seconds
+    :param quiet_period: seconds without network activity
+    """
+
+    def __init__(self, quiet_period=QUIET_PERIOD):
+        self.quiet_period = quiet_period
+        self.state = None
+        self.since = None
+
+    def __call__(self, driver):
+        state = driver.execute_script(NETWORK_STATE_SCRIPT)
+        if state[0] != "complete" or state[1] > 0:
+            self.state = None
+            return False
+        if state != self.state:
+            self.state = state
+            self.since = time.monotonic()
+            return False
+        return time.monotonic() - self.since >= self.quiet_period
+
+
+class attribute_changed:
+    """
+    Condition: an attribute of an element is different than a previous value,
+    e.g. data-parameters of the batch search widget when the next company is searched
+    :param xpath: xpath of the element
+    :param attribute: name of the attribute
+    :param previous: previous value of the attribute
+    """
+
+    def __init__(self, xpath, attribute, previous):
+        self.xpath = xpath
+        self.attribute = attribute
+        self.previous = previous
+
+    def __call__(self, driver):
+        value = get_attribute(driver, self.xpath, self.attribute)
+        return value if value != self.previous else False
+
+
+class attribute_is:
+    """
+    Condition: an attribute of an element has the given value, e.g. value of the page number input
+    :param xpath: xpath of the element
+    :param attribute: name of the attribute
+    :param value: expected value
+    """
+
+    def __init__(self, xpath, attribute, value):
+        self.xpath = xpath
+        self.attribute = attribute
+        self.value = value
+
+    def __call__(self, driver):
+        return get_attribute(driver, self.xpath, self.attribute) == self.value
+
+
+class css_property_is:
+    """
+    Condition: a css property of an element has the given value, e.g. max-width of the main content is "none"
+    once the processing overlay is gone
+    :param xpath: xpath of the element
+    :param name: name of the css property
+    :param value: expected value
+    """
+
+    def __init__(self, xpath, name, value):
+        self.xpath = xpath
+        self.name = name
+        self.value = value
+
+    def __call__(self, driver):
+        return driver.find_element(By.XPATH, self.xpath).value_of_css_property(self.name) == self.value
+
+
+class file_exists:
+    """
+    Condition: a file exists and is not a partial chrome download (.crdownload)
+    :param file_path: path of the file
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def __call__(self, driver):
+        return os.path.exists(self.file_path) and not os.path.exists(f"{self.file_path}.crdownload")
+
+
+def get_env_timeouts():
+    """
+    Step timeouts set in the environment: {"download": ORBIS_DOWNLOAD_TIMEOUT} when it is set
+    """
+    if not os.environ.get(DOWNLOAD_TIMEOUT_ENV):
+        return {}
+    download_timeout = float(os.environ.get(DOWNLOAD_TIMEOUT_ENV))
+    # WebDriverWait never expires with an infinite timeout
+    return {"download": download_timeout if download_timeout > 0 else float("inf")}
+
+
+class PageWaiter:
+    """
+    Waits for explicit conditions instead of sleeping for a fixed time.
+
+    Every wait belongs to a step of the batch search (e.g. "upload", "columns", "download") which has its own
+    timeout, see DEFAULT_STEP_TIMEOUTS. The time actually waited is recorded per step, report() summarizes it.
+
+    :param driver: selenium webdriver
+    :param timeouts: timeouts overriding DEFAULT_STEP_TIMEOUTS and ORBIS_DOWNLOAD_TIMEOUT, e.g. {"download": 3600}
+    :param poll_frequency: seconds between two checks of a condition
+    """
+
+    def __init__(self, driver, timeouts=None, poll_frequency=POLL_FREQUENCY):
+        self.driver = driver
+        self.timeouts = {**DEFAULT_STEP_TIMEOUTS, **get_env_timeouts(), **(timeouts or {})}
+        self.poll_frequency = poll_frequency
+        self.timings = []
+
+    def reset(self):
+        """
+        Forget the recorded waits, e.g. when the driver is reused for another batch search
+        """
+        self.timings = []
+
+    def get_timeout(self, step):
+        return self.timeouts.get(step, self.timeouts["default"])
+
+    def until(self, step, condition, description="", timeout=None, required=True):
+        """
+        Wait until a condition returns a truthy value
+        :param step: name of the step, used for its timeout and in the report
+        :param condition: callable taking the driver, e.g. EC.element_to_be_clickable(...)
+        :param description: what is waited for, used in the logs
+        :param timeout: seconds, the timeout of the step by default
+        :param required: raise TimeoutException on timeout, otherwise return None
+        :return: the value returned by the condition
+        """
+        timeout = self.get_timeout(step) if timeout is None else timeout
+        wait = WebDriverWait(
+            self.driver,
+            timeout,
+            poll_frequency=self.poll_frequency,
+            ignored_exceptions=(NoSuchElementException, StaleElementReferenceException),
+        )
+        start = time.monotonic()
+        try:
+            value = wait.until(condition)
+        except TimeoutException:
+            elapsed = time.monotonic() - start
+            self.timings.append((step, description, elapsed, False))
+            if required:
+                logger.debug(f"{step}: timed out after {elapsed:.1f}s waiting for {description}")
+                raise
+            # the flow goes on, the next step fails if the condition really mattered
+            logger.warning(f"{step}: timed out after {elapsed:.1f}s waiting for {description}, continuing")
+            return None
+        elapsed = time.monotonic() - start
+        self.timings.append((step, description, elapsed, True))
+        logger.debug(f"{step}: waited {elapsed:.1f}s for {description}")
+        return value
+
+    def clickable(self, step, xpath, **kwargs):
+        return self.until(step, EC.element_to_be_clickable((By.XPATH, xpath)), f"{xpath} to be clickable", **kwargs)
+
+    def present(self, step, xpath, **kwargs):
+        return self.until(step, EC.presence_of_element_located((By.XPATH, xpath)), f"{xpath} to exist", **kwargs)
+
+    def visible(self, step, xpath, **kwargs):
+        return self.until(step, EC.visibility_of_element_located((By.XPATH, xpath)), f"{xpath} to be visible", **kwargs)
+
+    def invisible(self, step, xpath, **kwargs):
+        return self.until(
+            step, EC.invisibility_of_element_located((By.XPATH, xpath)), f"{xpath} to disappear", **kwargs
+        )
+
+    def page_loaded(self, step="page_load", **kwargs):
+        return self.until(step, document_is_ready(), "document to be loaded", **kwargs)
+
+    def navigation(self, step, element, **kwargs):
+        """
+        Wait until the page of an element is left (the element is detached) and the new page is loaded
+        :param step: name of the step
+        :param element: element of the page which is left, e.g. the clicked link
+        """
+        self.until(step, EC.staleness_of(element), "current page to be left", **kwargs)
+        return self.page_loaded(step, **kwargs)
+
+    def dom_quiet(self, step, quiet_period=QUIET_PERIOD, **kwargs):
+        return self.until(step, dom_is_quiet(quiet_period), f"no DOM mutation for {quiet_period}s", **kwargs)
+
+    def network_idle(self, step, quiet_period=QUIET_PERIOD, **kwargs):
+        return self.until(step, network_is_idle(quiet_period), f"no network activity for {quiet_period}s", **kwargs)
+
+    def attribute_change(self, step, xpath, attribute, previous, **kwargs):
+        return self.until(
+            step, attribute_changed(xpath, attribute, previous), f"{attribute} of {xpath} to change", **kwargs
+        )
+
+    def attribute_value(self, step, xpath, attribute, value, **kwargs):
+        return self.until(
+            step, attribute_is(xpath, attribute, value), f"{attribute} of {xpath} to be {value}", **kwargs
+        )
+
+    def css_property(self, step, xpath, name, value, **kwargs):
+        return self.until(step, css_property_is(xpath, name, value), f"{name} of {xpath} to be {value}", **kwargs)
+
+    def file(self, step, file_path, **kwargs):
+        return self.until(step, file_exists(file_path), f"{file_path} to be saved", **kwargs)
+
+    def report(self):
+        """
+        Return the time waited per step: {step: {"waits": n, "timeouts": n, "total": seconds, "max": seconds}}
+        Steps are in the order they were first waited for.
+        """
+        summary = {}
+        for step, _, elapsed, ok in self.timings:
+            step_summary = summary.setdefault(step, {"waits": 0, "timeouts": 0, "total": 0.0, "max": 0.0})
+            step_summary["waits"] += 1
+            step_summary["timeouts"] += 0 if ok else 1
+            step_summary["total"] += elapsed
+            step_summary["max"] = max(step_summary["max"], elapsed)
+        return summary
+
+    def log_report(self, process_name=""):
+        """
+        Log the time waited per step, see report()
+        :param process_name: name of the process, prefix of the lines
+        """
+        for step, step_summary in self.report().items():
+            line = (
+                f"{process_name} waited {step_summary['total']:.1f}s in step {step} "
+                f"({step_summary['waits']} waits, {step_summary['timeouts']} timeouts, max {step_summary['max']:.1f}s)"
+            )
+            logger.info(line)
@@ -0,0 +1,150 @@
+# author: mrtrkmn@github
+# description: Read Excel workbooks through a columnar (Parquet) cache, a workbook is parsed by openpyxl only once
+
+import glob
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.abspath("data"), "workbook_cache")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class WorkbookCache:
+    """
+    Cache of sheets read from Excel workbooks.
+
+    A sheet is read with openpyxl the first time it is requested and stored as a Parquet file named after the
+    SHA-256 of the workbook content and the read options (sheet name, dtype). Later reads of the same sheet are
+    served from the Parquet file, edited workbooks get a new hash and are read again.
+
+    To avoid hashing a workbook on every read, its hash is remembered together with its size and mtime (hashes.json),
+    a workbook is hashed again only when one of them changes. When the hash of a workbook changes, the entries of
+    its previous content are removed, unless another workbook still has the same content.
+
+    Frames which can not be stored in Parquet without changing them (e.g. a column with both numbers and
+    strings, non string column names) are stored as pickle instead.
+
+    :param cache_dir: directory where the cache is stored
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hashes_path = os.path.join(cache_dir, "hashes.json")
+        self.lock = threading.Lock()
+        self.hashes = None
+
+    def load_hashes(self):
+        if self.hashes is None:
+            try:
+                with open(self.hashes_path, "r") as f:
+                    self.hashes = json.load(f)
+            except (OSError, ValueError):
+                self.hashes = {}
+        return self.hashes
+
+    def get_file_hash(self, file_path):
+        """
+        Return the SHA-256 of the content of a file, computed again only when its size or mtime changed
+        :param file_path: path to the file
+        """
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+        with self.lock:
+            known = self.load_hashes().get(file_path)
+        if known is not None and known["signature"] == signature:
+            return known["sha256"]
+
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with self.lock:
+            previous = self.load_hashes().get(file_path)
+            self.hashes[file_path] = {"signature": signature, "sha256": digest}
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.hashes_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.hashes, f, indent=4)
+            os.replace(tmp_path, self.hashes_path)
+            if previous is not None and previous["sha256"] != digest:
+                self.remove_entries(previous["sha256"])
+        return digest
+
+    def remove_entries(self, digest):
+        """
+        Remove the entries (all sheets and read options) of a workbook content which no workbook has anymore
+        :param digest: SHA-256 of the previous content of a workbook
+        """
+        if any(known["sha256"] == digest for known in self.hashes.values()):
+            return
+        for entry_path in glob.glob(os.path.join(self.cache_dir, f"{digest}-*")):
+            if entry_path.endswith((".parquet", ".pkl")):
+                try:
+                    os.remove(entry_path)
+                except FileNotFoundError:
+                    pass
+
+    def entry_path(self, file_path, sheet_name, dtype):
+        """
+        Return the path of the cache entry of a sheet without extension
+        :param file_path: path to the workbook
+        :param sheet_name: sheet name or position
+        :param dtype: dtype passed to pandas.read_excel
+        """
+        options = hashlib.sha256(repr((sheet_name, dtype)).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{self.get_file_hash(file_path)}-{options}")
+
+    def read_excel(self, file_path, sheet_name=0, dtype=None):
+        """
+        Return the dataframe of a sheet, same as pandas.read_excel(file_path, sheet_name=sheet_name, dtype=dtype)
+        :param file_path: path to the workbook
+        :param sheet_name: sheet name or position, first sheet by default
+        :param dtype: dtype passed to pandas.read_excel, e.g. str
+        """
+        entry_path = self.entry_path(file_path, sheet_name, dtype)
+        if os.path.exists(f"{entry_path}.parquet"):
+            return pd.read_parquet(f"{entry_path}.parquet")
+        if os.path.exists(f"{entry_path}.pkl"):
+            return pd.read_pickle(f"{entry_path}.pkl")
+
+        df = pd.read_excel(file_path, sheet_name=sheet_name, dtype=dtype, engine="openpyxl")
+        self.store(entry_path, df)
+        return df
+
+    def store(self, entry_path, df):
+        """
+        Store a dataframe as Parquet, or as pickle when it does not survive the Parquet round trip unchanged
+        :param entry_path: path returned by entry_path
+        :param df: dataframe read from the workbook
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        try:
+            df.to_parquet(tmp_path)
+            pd.testing.assert_frame_equal(df, pd.read_parquet(tmp_path))
+            os.replace(tmp_path, f"{entry_path}.parquet")
+            return
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, f"{entry_path}.pkl")
+
+
+WORKBOOK_CACHE = WorkbookCache()
+
+
+def read_excel(file_path, sheet_name=0, dtype=None):
+    """
+    Read a sheet of an Excel workbook through the shared workbook cache (data/workbook_cache)
+    :param file_path: path to the workbook
+    :param sheet_name: sheet name or position, first sheet by default
+    :param dtype: dtype passed to pandas.read_excel, e.g. str
+    """
+    return WORKBOOK_CACHE.read_excel(file_path, sheet_name=sheet_name, dtype=dtype)
@@ -0,0 +1,9 @@
+# author: mrtrkmn@github
+# description: Test setup, modules of orbi/ and utils/ import each other by name, so both folders are added to sys.path
+
+import os
+import sys
+
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(root_path, "orbi"))
+sys.path.append(os.path.join(root_path, "utils"))
@@ -0,0 +1,124 @@
+# author: mrtrkmn@github
+# description: Tests of the crawl checkpoint file: resume of an interrupted crawl and rotation of a previous file
+
+import csv
+import io
+import os
+
+import crawl
+from checkpoint import CrawlCheckpoint
+from crawl import Crawler
+
+PARSED_DATA = {
+    "0000320193": {
+        "companyName": "Example Corp",
+        "12": {
+            "Assets": {
+                "value": 338516000000,
+                "filedDate": "2019-10-31",
+                "endDate": "2019-09-28",
+                "unit": "USD",
+                "form": "10-K",
+            },
+            "diffInDays": 109,
+            "agreementDate": "2020-01-15 00:00:00",
+            "endDate": "2019-09-28",
+        },
+    }
+}
+
+
+def test_resume_loads_processed_entries(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    with CrawlCheckpoint(path) as checkpoint:
+        checkpoint.add("12", "0000320193", "Example Corp", parsed_data=PARSED_DATA)
+        checkpoint.add(13, "0000789019", "Other Corp", not_found={"status": 404})
+
+    with CrawlCheckpoint(path, resume=True) as checkpoint:
+        assert len(checkpoint) == 2
+        assert ("12", "0000320193") in checkpoint
+        assert ("13", "0000789019") in checkpoint
+        assert ("14", "0000320193") not in checkpoint
+        assert checkpoint.records[("12", "0000320193")]["parsed_data"] == PARSED_DATA
+        assert checkpoint.rotated_path is None
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    with CrawlCheckpoint(path) as checkpoint:
+        checkpoint.add("12", "0000320193", "Example Corp")
+    # the crawl was killed while a line was written
+    with open(path, "a") as f:
+        f.write('{"entry": "13", "cik": "00007')
+
+    with CrawlCheckpoint(path, resume=True) as checkpoint:
+        assert len(checkpoint) == 1
+        checkpoint.add("14", "0000789019", "Other Corp")
+
+    with CrawlCheckpoint(path, resume=True) as checkpoint:
+        assert len(checkpoint) == 2
+        assert ("14", "0000789019") in checkpoint
+
+
+def test_start_without_resume_keeps_previous_file(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    with CrawlCheckpoint(path) as checkpoint:
+        checkpoint.add("12", "0000320193", "Example Corp")
+
+    with CrawlCheckpoint(path) as checkpoint:
+        assert len(checkpoint) == 0
+        first_rotated_path = checkpoint.rotated_path
+        checkpoint.add("13", "0000789019", "Other Corp")
+    # same modification time, the second rotated file gets a number
+    os.utime(path, (os.path.getmtime(first_rotated_path), os.path.getmtime(first_rotated_path)))
+    with CrawlCheckpoint(path) as checkpoint:
+        second_rotated_path = checkpoint.rotated_path
+
+    assert first_rotated_path.startswith(str(tmp_path / "checkpoint_"))
+    assert second_rotated_path == f"{os.path.splitext(first_rotated_path)[0]}_1.jsonl"
+    with CrawlCheckpoint(first_rotated_path, resume=True) as checkpoint:
+        assert ("12", "0000320193") in checkpoint
+    with CrawlCheckpoint(second_rotated_path, resume=True) as checkpoint:
+        assert ("13", "0000789019") in checkpoint
+    assert os.path.getsize(path) == 0
+
+
+def test_empty_file_is_not_rotated(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    CrawlCheckpoint(path).close()
+
+    with CrawlCheckpoint(path) as checkpoint:
+        assert checkpoint.rotated_path is None
+    assert os.listdir(tmp_path) == ["checkpoint.jsonl"]
+
+
+def test_crawl_is_resumed_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawl, "NOT_FOUND_COMPANIES", {})
+    monkeypatch.setattr(crawl, "MISSING_KPI_VARS", {})
+    crawler = Crawler()
+    path = str(tmp_path / "checkpoint.jsonl")
+
+    with CrawlCheckpoint(path) as checkpoint:
+        crawl.MISSING_KPI_VARS["Example Corp"] = {"cik": "0000320193", "kpi_vars": ["Revenues"]}
+        crawler.add_to_checkpoint(checkpoint, ("12", "0000320193", "Example Corp", None), ("result",), PARSED_DATA)
+        crawl.NOT_FOUND_COMPANIES["Missing Corp"] = {"status": 404}
+        crawler.add_to_checkpoint(checkpoint, ("13", "0000000001", "Missing Corp", None), None, {})
+        # throttled, requested again when the crawl is resumed
+        crawl.NOT_FOUND_COMPANIES["Throttled Corp"] = {"status": 429}
+        crawler.add_to_checkpoint(checkpoint, ("14", "0000000002", "Throttled Corp", None), None, {})
+
+    monkeypatch.setattr(crawl, "NOT_FOUND_COMPANIES", {})
+    monkeypatch.setattr(crawl, "MISSING_KPI_VARS", {})
+    output = io.StringIO()
+    with CrawlCheckpoint(path, resume=True) as checkpoint:
+        crawler.restore_from_checkpoint(checkpoint, csv.writer(output, delimiter=";", lineterminator="\n"))
+        assert ("12", "0000320193") in checkpoint
+        assert ("13", "0000000001") in checkpoint
+        assert ("14", "0000000002") not in checkpoint
+
+    rows = list(csv.reader(io.StringIO(output.getvalue()), delimiter=";"))
+    assert rows == [
+        crawler.create_csv_row("0000320193", "Example Corp", "12", PARSED_DATA["0000320193"]["12"]),
+    ]
+    assert crawl.NOT_FOUND_COMPANIES == {"Missing Corp": {"status": 404}}
+    assert crawl.MISSING_KPI_VARS == {"Example Corp": {"cik": "0000320193", "kpi_vars": ["Revenues"]}}
@@ -0,0 +1,211 @@
+# author: mrtrkmn@github
+# description: Tests of the streaming companyfacts filter, the closest 10-K facts selected from the filtered document
+# must be the same as the ones the baseline crawler selected from the whole document
+
+import json
+
+import ijson
+import pytest
+from companyfacts_parser import CompanyFactsFilter
+from crawl import Crawler
+
+DOCUMENT = {
+    "cik": 320193,
+    "entityName": "Example Corp",
+    "facts": {
+        "dei": {
+            "EntityNumberOfEmployees": {
+                "label": "Entity Number of Employees",
+                "units": {
+                    "pure": [
+                        {"end": "2019-09-28", "val": 137000, "filed": "2019-10-31", "form": "10-K"},
+                        {"end": "2020-09-26", "val": 147000, "filed": "2020-10-30", "form": "10-K"},
+                    ]
+                },
+            }
+        },
+        "us-gaap": {
+            "OperatingIncomeLoss": {
+                "label": "Operating Income (Loss)",
+                "units": {
+                    "USD": [
+                        {"end": "2020-03-28", "val": 12853000000, "filed": "2020-05-01", "form": "10-Q"},
+                        {"end": "2019-09-28", "val": 63930000000, "filed": "2019-10-31", "form": "10-K"},
+                        {"end": "2020-09-26", "val": 66288000000, "filed": "2020-10-30", "form": "10-K"},
+                    ]
+                },
+            },
+            "NetIncomeLoss": {
+                "label": "Net Income (Loss)",
+                "units": {
+                    # same end date twice, the later fact wins
+                    "USD": [
+                        {"end": "2019-09-28", "val": 55256000000, "filed": "2019-10-31", "form": "10-K"},
+                        {"end": "2019-09-28", "val": 55256000001, "filed": "2020-10-30", "form": "10-K"},
+                        {"end": "2020-09-26", "val": 57411000000, "filed": "2020-10-30", "form": "10-K"},
+                    ],
+                    # only the first unit is used
+                    "EUR": [{"end": "2020-06-30", "val": 1, "filed": "2020-07-30", "form": "10-K"}],
+                },
+            },
+            "Revenues": {
+                "label": "Revenues",
+                "units": {
+                    # an invalid end date skips the unit, even on a fact which is not a 10-K
+                    "USD": [
+                        {"end": "2020-9-26x", "val": 1, "filed": "2020-10-30", "form": "8-K"},
+                        {"end": "2020-09-26", "val": 274515000000, "filed": "2020-10-30", "form": "10-K"},
+                    ]
+                },
+            },
+            "Assets": {
+                "label": "Assets",
+                "units": {
+                    "USD": [
+                        {"end": "2018-09-29", "val": 365725000000, "filed": "2018-11-05", "form": "10-K"},
+                        {"end": "2019-09-28", "val": 338516000000, "filed": "2019-10-31", "form": "10-K"},
+                        {"end": "2020-06-27", "val": 317344000000, "filed": "2020-07-31", "form": "10-Q"},
+                    ]
+                },
+            },
+            "AccountsPayableCurrent": {
+                "label": "Accounts Payable, Current",
+                "units": {"USD": [{"end": "2020-09-26", "val": 42296000000, "filed": "2020-10-30", "form": "10-K"}]},
+            },
+        },
+    },
+}
+AGREEMENT_DATES = {"1": "2020-01-15", "2": "2020-09-01"}
+
+# output of the baseline crawler (parse_export_data_to_csv) for DOCUMENT and AGREEMENT_DATES
+BASELINE_PARSED_DATA = {
+    "0000320193": {
+        "companyName": "Example Corp",
+        "1": {
+            "EntityNumberOfEmployees": {
+                "value": 137000,
+                "filedDate": "2019-10-31",
+                "endDate": "2019-09-28",
+                "unit": "pure",
+                "form": "10-K",
+            },
+            "diffInDays": 109,
+            "agreementDate": "2020-01-15 00:00:00",
+            "endDate": "2019-09-28",
+            "OperatingIncomeLoss": {
+                "value": 63930000000,
+                "filedDate": "2019-10-31",
+                "endDate": "2019-09-28",
+                "unit": "USD",
+                "form": "10-K",
+            },
+            "NetIncomeLoss": {
+                "value": 55256000001,
+                "filedDate": "2020-10-30",
+                "endDate": "2019-09-28",
+                "unit": "USD",
+                "form": "10-K",
+            },
+            "Assets": {
+                "value": 338516000000,
+                "filedDate": "2019-10-31",
+                "endDate": "2019-09-28",
+                "unit": "USD",
+                "form": "10-K",
+            },
+        },
+        "2": {
+            "EntityNumberOfEmployees": {
+                "value": 147000,
+                "filedDate": "2020-10-30",
+                "endDate": "2020-09-26",
+                "unit": "pure",
+                "form": "10-K",
+            },
+            "diffInDays": 25,
+            "agreementDate": "2020-09-01 00:00:00",
+            "endDate": "2020-09-26",
+            "OperatingIncomeLoss": {
+                "value": 66288000000,
+                "filedDate": "2020-10-30",
+                "endDate": "2020-09-26",
+                "unit": "USD",
+                "form": "10-K",
+            },
+            "NetIncomeLoss": {
+                "value": 57411000000,
+                "filedDate": "2020-10-30",
+                "endDate": "2020-09-26",
+                "unit": "USD",
+                "form": "10-K",
+            },
+        },
+    }
+}
+
+
+def create_json_data(crawler, document):
+    """
+    Results of the crawl of DOCUMENT for the entries of AGREEMENT_DATES, see Crawler.collect_company_result
+    """
+    concept_index = crawler.index_company_facts(document)
+    company_data = {"entityName": document["entityName"]}
+    for entry_id, agreement_date in AGREEMENT_DATES.items():
+        company_data[entry_id] = {"agreementDate": agreement_date}
+        for kpi_var in crawler.kpi_variables:
+            if kpi_var in concept_index:
+                company_data[entry_id][kpi_var] = concept_index[kpi_var]
+    return {"0000320193": company_data}
+
+
+def filter_document(document, chunk_size=None):
+    company_facts_filter = Crawler().create_company_facts_filter()
+    body = json.dumps(document).encode()
+    chunk_size = chunk_size or len(body)
+    for position in range(0, len(body), chunk_size):
+        company_facts_filter.feed(body[position : position + chunk_size])
+    return company_facts_filter.close()
+
+
+def test_filter_keeps_kpi_variables_and_10k_facts():
+    document = filter_document(DOCUMENT)
+
+    assert document["cik"] == 320193
+    assert document["entityName"] == "Example Corp"
+    assert "AccountsPayableCurrent" not in document["facts"]["us-gaap"]
+    assert [fact["form"] for fact in document["facts"]["us-gaap"]["Assets"]["units"]["USD"]] == ["10-K", "10-K"]
+    assert [fact["form"] for fact in document["facts"]["us-gaap"]["Revenues"]["units"]["USD"]] == ["8-K", "10-K"]
+    assert list(document["facts"]["us-gaap"]["NetIncomeLoss"]["units"]) == ["USD", "EUR"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_filter_does_not_depend_on_chunk_size(chunk_size):
+    assert filter_document(DOCUMENT, chunk_size) == filter_document(DOCUMENT)
+
+
+def test_selected_facts_are_the_same_as_baseline():
+    crawler = Crawler()
+
+    assert (
+        crawler.select_closest_10k_facts(create_json_data(crawler, filter_document(DOCUMENT))) == BASELINE_PARSED_DATA
+    )
+    assert crawler.select_closest_10k_facts(create_json_data(crawler, DOCUMENT)) == BASELINE_PARSED_DATA
+
+
+def test_numbers_keep_their_type():
+    fact = {"end": "2020-09-26", "filed": "2020-10-30", "form": "10-K"}
+    document = {
+        "entityName": "Example Corp",
+        "facts": {"us-gaap": {"Assets": {"units": {"USD": [{**fact, "val": 2**70}, {**fact, "val": 1.5}]}}}},
+    }
+
+    values = [fact["val"] for fact in filter_document(document)["facts"]["us-gaap"]["Assets"]["units"]["USD"]]
+    assert values == [2**70, 1.5]
+    assert [type(value) for value in values] == [int, float]
+
+
+def test_invalid_document_raises_json_error():
+    company_facts_filter = CompanyFactsFilter(concepts=["Assets"])
+    with pytest.raises(ijson.JSONError):
+        company_facts_filter.feed(b'{"cik": 320193, "facts": {"us-gaap": {"Assets": {"units": [}')
+        company_facts_filter.close()
@@ -0,0 +1,152 @@
+# author: mrtrkmn@github
+# description: Tests of the pipeline scheduler: order of the tasks, retries, skipped tasks and browser seat accounting
+
+import concurrent.futures
+import threading
+import time
+
+import pytest
+from pipeline import DONE, FAILED, SKIPPED, Pipeline
+
+
+class SeatCounter:
+    """
+    Records the highest number of browsers used at the same time
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def use(self, seconds=0.05):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(seconds)
+        with self.lock:
+            self.active -= 1
+
+
+def write_file(file_path, content=""):
+    with open(file_path, "w") as f:
+        f.write(content)
+
+
+def test_tasks_run_in_the_order_of_their_files(tmp_path):
+    pipeline = Pipeline()
+    order = []
+    csv_file, xlsx_file, guo_file = (str(tmp_path / name) for name in ["data.csv", "data.xlsx", "data_guo.csv"])
+
+    def step(name, output):
+        order.append(name)
+        write_file(output)
+
+    # added in reverse order, the files decide the order
+    pipeline.add("guo input", step, args=("guo input", guo_file), inputs=[xlsx_file], outputs=[guo_file])
+    pipeline.add("search", step, args=("search", xlsx_file), inputs=[csv_file], outputs=[xlsx_file])
+    pipeline.add("input", step, args=("input", csv_file), outputs=[csv_file])
+
+    assert pipeline.run()
+    assert order == ["input", "search", "guo input"]
+
+
+def test_failed_task_is_retried_and_its_dependents_are_skipped(tmp_path):
+    pipeline = Pipeline()
+    attempts = []
+    input_file, output_file = str(tmp_path / "data.csv"), str(tmp_path / "data.xlsx")
+
+    def failing():
+        attempts.append(time.monotonic())
+        raise RuntimeError("browser is stuck")
+
+    pipeline.add("input", failing, outputs=[input_file], retries=2)
+    pipeline.add("search", write_file, args=(output_file,), inputs=[input_file], outputs=[output_file])
+    pipeline.add("other", lambda: None)
+
+    assert not pipeline.run()
+    assert len(attempts) == 3
+    report = pipeline.report()
+    assert report["input"]["status"] == FAILED
+    assert report["input"]["attempts"] == 3
+    assert report["search"]["status"] == SKIPPED
+    assert report["other"]["status"] == DONE
+
+
+def test_missing_input_fails_without_retry(tmp_path):
+    pipeline = Pipeline()
+    pipeline.add("search", lambda: None, inputs=[str(tmp_path / "missing.csv")], retries=2)
+
+    assert not pipeline.run()
+    assert pipeline.report()["search"] == {"status": FAILED, "attempts": 0, "elapsed": pytest.approx(0, abs=1)}
+
+
+def test_invalid_pipelines_are_rejected(tmp_path):
+    first_file, second_file = str(tmp_path / "first"), str(tmp_path / "second")
+    pipeline = Pipeline()
+    pipeline.add("first", lambda: None, outputs=[first_file])
+    with pytest.raises(ValueError):
+        pipeline.add("first", lambda: None)
+    with pytest.raises(ValueError):
+        pipeline.add("other", lambda: None, outputs=[first_file])
+
+    pipeline = Pipeline()
+    pipeline.add("first", lambda: None, inputs=[second_file], outputs=[first_file])
+    pipeline.add("second", lambda: None, inputs=[first_file], outputs=[second_file])
+    with pytest.raises(ValueError):
+        pipeline.run()
+
+
+def test_browser_tasks_do_not_exceed_the_seats():
+    pipeline = Pipeline(browser_seats=2)
+    browsers = SeatCounter()
+    for number in range(5):
+        pipeline.add(f"search {number}", browsers.use, uses_browser=True)
+    pipeline.add("offline", time.sleep, args=(0.05,))
+
+    assert pipeline.run()
+    assert browsers.peak == 2
+
+
+def test_free_seats_are_taken_without_waiting():
+    pipeline = Pipeline(browser_seats=3)
+    # seat of a running task
+    pipeline.browser_seats.acquire()
+
+    assert pipeline.take_free_seats(5) == 2
+    assert pipeline.take_free_seats(1) == 0
+    pipeline.release_seats(2)
+    assert pipeline.take_free_seats(1) == 1
+    pipeline.release_seats(1)
+    pipeline.browser_seats.release()
+    with pytest.raises(ValueError):
+        # more seats than the pipeline has
+        pipeline.release_seats(1)
+
+
+def test_sharded_searches_share_the_seats():
+    """
+    Batch searches split into shards hold their task's seat and search the other shards with the free seats,
+    as run_sharded_batch_search in orbi.py does
+    """
+    pipeline = Pipeline(browser_seats=3)
+    browsers = SeatCounter()
+    workers = []
+
+    def sharded_search(number_of_shards):
+        extra_seats = pipeline.take_free_seats(number_of_shards - 1)
+        workers.append(1 + extra_seats)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1 + extra_seats) as executor:
+                list(executor.map(lambda _: browsers.use(), range(number_of_shards)))
+        finally:
+            pipeline.release_seats(extra_seats)
+
+    for number in range(3):
+        pipeline.add(f"search {number}", sharded_search, args=(4,), uses_browser=True)
+
+    assert pipeline.run()
+    assert browsers.peak <= pipeline.number_of_seats
+    assert all(1 <= number_of_workers <= pipeline.number_of_seats for number_of_workers in workers)
+    # all seats are given back
+    assert pipeline.take_free_seats(pipeline.number_of_seats) == pipeline.number_of_seats
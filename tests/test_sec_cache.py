@@ -0,0 +1,247 @@
+# author: mrtrkmn@github
+# description: Tests of the on-disk cache of SEC.gov responses: concurrent writers, revalidation and eviction
+
+import asyncio
+import gzip
+import json
+import os
+import time
+
+import pytest
+from crawl import Crawler
+from sec_cache import STALE_TMP_AGE_IN_SECONDS, CacheEntryError, SECResponseCache
+
+URL = "https://data.sec.gov/api/xbrl/companyfacts/CIK0000320193.json"
+OTHER_URL = "https://data.sec.gov/api/xbrl/companyfacts/CIK0000789019.json"
+DOCUMENT = {
+    "cik": 320193,
+    "entityName": "Example Corp",
+    "facts": {
+        "us-gaap": {
+            "Assets": {
+                "label": "Assets",
+                "units": {"USD": [{"end": "2020-09-26", "val": 323888000000, "filed": "2020-10-30", "form": "10-K"}]},
+            }
+        }
+    },
+}
+
+
+def body_of(document):
+    return json.dumps(document).encode()
+
+
+def random_body(size):
+    # random bytes do not compress, so the size of the stored object is known approximately
+    return json.dumps({"data": os.urandom(size).hex()}).encode()
+
+
+def stored_objects(cache):
+    return sorted(
+        file_name for _, _, files in os.walk(cache.objects_dir) for file_name in files if file_name.endswith(".json.gz")
+    )
+
+
+def temp_files(cache):
+    return [file_name for _, _, files in os.walk(cache.cache_dir) for file_name in files if file_name.endswith(".tmp")]
+
+
+def test_concurrent_writers_of_one_url(tmp_path):
+    cache = SECResponseCache(cache_dir=str(tmp_path))
+    first_body = body_of(DOCUMENT)
+    second_body = body_of({**DOCUMENT, "entityName": "Example Corp (new)"})
+
+    first = cache.open_writer(URL, etag='"1"')
+    second = cache.open_writer(URL, etag='"2"')
+    assert first.tmp_path != second.tmp_path
+    for position in range(0, max(len(first_body), len(second_body)), 16):
+        first.write(first_body[position : position + 16])
+        second.write(second_body[position : position + 16])
+    first.commit()
+    second.commit()
+
+    entry = cache.lookup(URL)
+    assert entry["etag"] == '"2"'
+    assert cache.load(entry)["entityName"] == "Example Corp (new)"
+    # the body of the first writer is not referenced anymore
+    assert stored_objects(cache) == [f"{entry['digest']}.json.gz"]
+    assert temp_files(cache) == []
+
+
+def test_aborted_writer_leaves_nothing(tmp_path):
+    cache = SECResponseCache(cache_dir=str(tmp_path))
+    writer = cache.open_writer(URL)
+    writer.write(b'{"cik": ')
+    writer.abort()
+
+    assert cache.lookup(URL) is None
+    assert temp_files(cache) == []
+
+
+def test_same_body_is_stored_once(tmp_path):
+    cache = SECResponseCache(cache_dir=str(tmp_path))
+    cache.store(URL, body_of(DOCUMENT))
+    cache.store(OTHER_URL, body_of(DOCUMENT))
+    assert len(stored_objects(cache)) == 1
+
+    # the body is kept while another entry points to it
+    cache.store(URL, body_of({**DOCUMENT, "cik": 1}))
+    assert len(stored_objects(cache)) == 2
+    assert cache.load(cache.lookup(OTHER_URL)) == DOCUMENT
+
+
+def test_revalidation(tmp_path):
+    cache = SECResponseCache(cache_dir=str(tmp_path), max_age_in_hours=1)
+    cache.store(URL, body_of(DOCUMENT), etag='"abc"', last_modified="Mon, 26 Oct 2020 10:00:00 GMT")
+    entry = cache.lookup(URL)
+    assert cache.is_fresh(entry)
+
+    entry["validated_at"] = time.time() - 2 * 60 * 60
+    cache.write_meta(URL, entry)
+    entry = cache.lookup(URL)
+    assert not cache.is_fresh(entry)
+    assert cache.conditional_headers(entry) == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Mon, 26 Oct 2020 10:00:00 GMT",
+    }
+
+    # 304 Not Modified
+    assert cache.revalidated(URL, entry) == DOCUMENT
+    assert cache.is_fresh(cache.lookup(URL))
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = SECResponseCache(cache_dir=str(tmp_path))
+    cache.store(URL, body_of(DOCUMENT))
+    entry = cache.lookup(URL)
+    with open(cache.object_path(entry["digest"]), "wb") as f:
+        f.write(gzip.compress(b'{"cik": 320193, "facts": {')[:-8])
+
+    with pytest.raises(CacheEntryError):
+        cache.load(entry)
+    assert cache.lookup(URL) is None
+    assert stored_objects(cache) == []
+
+
+def test_eviction_of_least_recently_validated_entries(tmp_path):
+    cache = SECResponseCache(cache_dir=str(tmp_path))
+    urls = [f"https://data.sec.gov/api/xbrl/companyfacts/CIK000000000{number}.json" for number in range(3)]
+    for number, url in enumerate(urls):
+        cache.store(url, random_body(64 * 1024))
+        entry = cache.lookup(url)
+        entry["validated_at"] = 1000.0 + number
+        cache.write_meta(url, entry)
+    # the oldest entry is used again, the second one is the least recently validated afterwards
+    cache.touch(urls[0], cache.lookup(urls[0]))
+
+    cache.max_size = cache.get_total_size() - 1
+    cache.evict()
+
+    assert cache.lookup(urls[1]) is None
+    assert cache.lookup(urls[0]) is not None
+    assert cache.lookup(urls[2]) is not None
+    assert len(stored_objects(cache)) == 2
+    assert cache.get_total_size() <= cache.max_size
+
+
+def test_eviction_sweeps_unreferenced_bodies_and_stale_temp_files(tmp_path):
+    cache = SECResponseCache(cache_dir=str(tmp_path))
+    cache.store(URL, body_of(DOCUMENT))
+    referenced = stored_objects(cache)
+
+    orphan_path = cache.object_path("ab" * 32)
+    os.makedirs(os.path.dirname(orphan_path), exist_ok=True)
+    with open(orphan_path, "wb") as f:
+        f.write(gzip.compress(random_body(1024)))
+    stale_path = os.path.join(cache.objects_dir, "companyfacts-CIK0000000001.stale.tmp")
+    fresh_path = os.path.join(cache.objects_dir, "companyfacts-CIK0000000002.fresh.tmp")
+    for file_path in (stale_path, fresh_path):
+        with open(file_path, "wb") as f:
+            f.write(b"partial")
+    stale_time = time.time() - STALE_TMP_AGE_IN_SECONDS - 60
+    os.utime(stale_path, (stale_time, stale_time))
+
+    cache.evict()
+
+    assert stored_objects(cache) == referenced
+    assert not os.path.exists(stale_path)
+    # may still be written by a running download
+    assert os.path.exists(fresh_path)
+    assert cache.load(cache.lookup(URL)) == DOCUMENT
+
+
+class FakeContent:
+    def __init__(self, body):
+        self.body = body
+
+    async def iter_chunked(self, size):
+        for position in range(0, len(self.body), size):
+            # other coroutines run while the body is downloaded
+            await asyncio.sleep(0)
+            yield self.body[position : position + size]
+
+
+class FakeResponse:
+    def __init__(self, status, body=b"", headers=None):
+        self.status = status
+        self.reason = "OK" if status == 200 else "Not Modified"
+        self.headers = headers or {}
+        self.content = FakeContent(body)
+
+
+def create_crawler(tmp_path, responses):
+    """
+    Crawler whose requests are answered with the given responses, the sent headers are recorded in requests
+    """
+    crawler = Crawler()
+    crawler.cache = SECResponseCache(cache_dir=str(tmp_path), max_age_in_hours=1)
+    crawler.requests = []
+
+    async def request_with_retry(url, on_response, headers=None, description=None):
+        crawler.requests.append(headers or {})
+        await asyncio.sleep(0.01)
+        return await on_response(responses.pop(0))
+
+    crawler.request_with_retry = request_with_retry
+    return crawler
+
+
+def test_concurrent_requests_of_one_url_are_coalesced(tmp_path):
+    crawler = create_crawler(tmp_path, [FakeResponse(200, body_of(DOCUMENT), {"ETag": '"abc"'})])
+
+    async def fetch_all():
+        return await asyncio.gather(*[crawler.get_company_raw_data("Example Corp", "0000320193") for _ in range(4)])
+
+    results = asyncio.run(fetch_all())
+
+    assert len(crawler.requests) == 1
+    assert all(result == results[0] for result in results)
+    assert results[0]["facts"]["us-gaap"]["Assets"]["units"]["USD"][0]["val"] == 323888000000
+
+
+def test_stale_entry_is_revalidated_by_the_crawler(tmp_path):
+    crawler = create_crawler(tmp_path, [FakeResponse(304)])
+    crawler.cache.store(URL, body_of(DOCUMENT), etag='"abc"')
+    entry = crawler.cache.lookup(URL)
+    entry["validated_at"] = time.time() - 2 * 60 * 60
+    crawler.cache.write_meta(URL, entry)
+
+    result = asyncio.run(crawler.get_company_raw_data("Example Corp", "0000320193"))
+
+    assert len(crawler.requests) == 1
+    assert crawler.requests[0]["If-None-Match"] == '"abc"'
+    assert result["entityName"] == "Example Corp"
+    assert crawler.cache.is_fresh(crawler.cache.lookup(URL))
+
+
+def test_corrupt_entry_is_downloaded_again_by_the_crawler(tmp_path):
+    crawler = create_crawler(tmp_path, [FakeResponse(200, body_of(DOCUMENT))])
+    crawler.cache.store(URL, body_of(DOCUMENT))
+    with open(crawler.cache.object_path(crawler.cache.lookup(URL)["digest"]), "wb") as f:
+        f.write(b"not gzip")
+
+    result = asyncio.run(crawler.get_company_raw_data("Example Corp", "0000320193"))
+
+    assert len(crawler.requests) == 1
+    assert result["entityName"] == "Example Corp"
+    assert crawler.cache.load(crawler.cache.lookup(URL)) == DOCUMENT
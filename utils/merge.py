@@ -13,7 +13,16 @@ root_path = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(root_path)
 sys.path.append("orbi")
 
+from export import export_sheets, get_export_formats
+from name_matching import CompanyNameMatcher
+from names import (
+    COMPANY_NAME_CANONICALIZER,
+    ORBIS_COMPANY_NAME_CANONICALIZER,
+    SEC_COMPANY_NAME_CANONICALIZER,
+    map_values_to_entries,
+)
 from variables import SEC_DATA_HEADERS
+from workbook import read_excel
 
 
 def create_bvd_own_id_mapping(orbis_id_export_file):
@@ -28,10 +37,8 @@ def create_bvd_own_id_mapping(orbis_id_export_file):
     df_id_export = pd.read_excel(orbis_id_export_file)
     df_id_export = df_id_export[["Matched BvD ID", "Own ID"]]
 
-    # map Matched BvD ID to Own ID
-    mapping = {}
-    for index, row in df_id_export.iterrows():
-        mapping[row["Matched BvD ID"]] = row["Own ID"]
+    # map Matched BvD ID to Own ID, the last row of a BvD ID wins
+    mapping = dict(zip(df_id_export["Matched BvD ID"].tolist(), df_id_export["Own ID"].tolist()))
 
     return mapping
 
@@ -42,7 +49,7 @@ def parse_data_based_on_licensee_aggrement_data(excel_path_file):
     :param excel_path_file: path to excel file
     :return: dict with key as agreement date and value as list of licensee
     """
-    df = pd.read_excel(excel_path_file)
+    df = read_excel(excel_path_file)
     licensee_columns = [
         col for col in df.columns if col.startswith("Licensee") and col.endswith("cleaned") and "CIK" not in col
     ]
@@ -83,13 +90,35 @@ def calculate_match_percentage(string1, string2):
     return fuzz.ratio(string1, string2) / 100.0
 
 
+def match_company_names(names, candidate_names, top_k=3, threshold=0.8, max_candidates=100):
+    """
+    Finds the most similar candidate names of each name, e.g. SEC companyName for Orbis company names
+    Only candidates sharing character q-grams (and of compatible length) are compared, not all pairs of names.
+    Names are canonicalized (transliterated, uppercased, stripped) before they are compared.
+
+    :param names: names to match, e.g. Orbis "Company name Latin alphabet" column
+    :param candidate_names: names to search in, e.g. SEC "companyName" column
+    :param top_k: maximum number of matches per name
+    :param threshold: minimum match percentage (between 0 and 1, see calculate_match_percentage)
+    :param max_candidates: maximum number of candidates compared per name, None compares all candidates sharing
+        q-grams with the name (see CompanyNameMatcher)
+    :return: DataFrame with columns name, match, score, rank
+    """
+    matcher = CompanyNameMatcher(
+        pd.Series(candidate_names).dropna().unique(),
+        canonicalize=COMPANY_NAME_CANONICALIZER.canonicalize,
+        max_candidates=max_candidates,
+    )
+    return matcher.match_all(pd.Series(names).dropna(), top_k=top_k, threshold=threshold)
+
+
 def get_ids_of_companies(path_to_file):
     """
     Creates a dictionary with key as company name and value as list of ids
     :param path_to_file: path to excel file
     """
 
-    df = pd.read_excel(path_to_file)
+    df = read_excel(path_to_file)
     # id column name is Entry
     # create a dict with list of ids of a company
     company_name_ids = {}
@@ -127,31 +156,28 @@ def merge_dataframes_on(df, df_to_merge, on_column, how="left"):
     return df
 
 
-def add_df_as_another_sheet(df, file_name, sheet_name):
+def write_to_excel(sheets, file_name, export_formats=()):
     """
-    Adds a dataframe as another sheet to an excel file
-    :param df: dataframe
+    Writes dataframes to the sheets of an excel file in a single pass, optionally to CSV/Parquet as well
+    :param sheets: {sheet name: dataframe}, e.g. {"ORBIS-SEC-MERGED": merged_df, "SEC-API-DATA": sec_data}
     :param file_name: excel file name
-    :param sheet_name: sheet name
+    :param export_formats: additional formats, any of "csv", "parquet"
     """
-    with pd.ExcelWriter(file_name, mode="a") as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False)
+    return export_sheets(file_name, sheets, index=False, formats=export_formats)
 
 
-def write_to_excel(df, file_name, sheet_name="ORBIS-SEC-MERGED"):
-    """
-    Writes a dataframe to an excel file
-    :param df: dataframe
-    :param file_name: excel file name
+def aggregate_orbis_sec_data(orbis_data_file_path, sec_data_file_path, export_formats=(), max_name_candidates=100):
     """
-    df.to_excel(file_name, index=False, sheet_name=sheet_name)
+    Aggregates orbis and sec data
 
+    The merged output file has the sheets ORBIS-SEC-MERGED (orbis data merged with sec data on Entry), SEC-API-DATA
+    (sec data) and ORBIS-SEC-NAME-MATCHES: for each orbis company name the up to 3 most similar sec company names
+    with a match percentage of at least 80% (columns name, match, score, rank), see match_company_names.
 
-def aggregate_orbis_sec_data(orbis_data_file_path, sec_data_file_path):
-    """
-    Aggregates orbis and sec data
     :param orbis_data_file_path: path to orbis data file
     :param sec_data_file_path: path to sec data file
+    :param export_formats: additional formats of the merged output, any of "csv", "parquet"
+    :param max_name_candidates: maximum number of sec company names compared per orbis company name, None for all
     """
     orbis_data_file_path = os.path.abspath(orbis_data_file_path)
 
@@ -169,14 +195,15 @@ def aggregate_orbis_sec_data(orbis_data_file_path, sec_data_file_path):
     # in case one column has multiple values, remove the values after the dot
     columns_to_delete = orbis_data.filter(regex="\.\d+$").columns
     orbis_data = orbis_data.drop(columns=columns_to_delete)
-    orbis_data["Company name Latin alphabet"] = orbis_data["Company name Latin alphabet"].str.upper()
+    orbis_data["Company name Latin alphabet"] = ORBIS_COMPANY_NAME_CANONICALIZER.canonicalize_series(
+        orbis_data["Company name Latin alphabet"]
+    )
     orbis_data.dropna(subset=["Company name Latin alphabet"], inplace=True)
-    # add Own ID column to first column
-    orbis_data.insert(0, "Own ID", "")
-
-    # fill Own ID column with mapping
-    for index, row in orbis_data.iterrows():
-        orbis_data.at[index, "Own ID"] = bvd_own_id_mapping[row["BvD ID number"]]
+    # add Own ID column to first column, filled with mapping
+    unknown_bvd_ids = orbis_data.loc[~orbis_data["BvD ID number"].isin(bvd_own_id_mapping), "BvD ID number"]
+    if not unknown_bvd_ids.empty:
+        raise KeyError(f"BvD ID numbers not found in {orbis_id_bvd_mapping_file_name}: {unknown_bvd_ids.tolist()}")
+    orbis_data.insert(0, "Own ID", orbis_data["BvD ID number"].map(bvd_own_id_mapping))
 
     # orbis_data = pd.DataFrame(orbis_data)
 
@@ -184,18 +211,16 @@ def aggregate_orbis_sec_data(orbis_data_file_path, sec_data_file_path):
     # replace the coulmn name
     # orbis_data.rename(columns={"Unnamed: 0": "Own ID"}, inplace=True)
     # export the orbis data to excel fil
-    orbis_data.to_excel("orbis_data.xlsx", index=False)
+    write_to_excel({"Sheet1": orbis_data}, "orbis_data.xlsx")
 
     sec_data = pd.read_csv(sec_output_file, delimiter=";", usecols=SEC_DATA_HEADERS)
     # change column name to match with orbis data
     sec_data.rename(columns={"companyName": "Company name Latin alphabet"}, inplace=True)
     sec_data.rename(columns={"entry": "Entry"}, inplace=True)
-    # make all company names uppercase
-    sec_data["Company name Latin alphabet"] = sec_data["Company name Latin alphabet"].str.upper()
-    # remove /DE from company name
-    sec_data["Company name Latin alphabet"] = sec_data["Company name Latin alphabet"].str.replace("/DE", "")
-    # remove /NEW/ from company name
-    sec_data["Company name Latin alphabet"] = sec_data["Company name Latin alphabet"].str.replace("/NEW/", "")
+    # make all company names uppercase, remove /DE and /NEW/ from company names
+    sec_data["Company name Latin alphabet"] = SEC_COMPANY_NAME_CANONICALIZER.canonicalize_series(
+        sec_data["Company name Latin alphabet"]
+    )
 
     merged_df = duplicate_values_companies(orbis_data)
     # Save the updated DataFrame to the Excel file
@@ -203,9 +228,17 @@ def aggregate_orbis_sec_data(orbis_data_file_path, sec_data_file_path):
     # convert column Own ID to int64
     sec_data["Entry"] = sec_data["Entry"].astype(str)
     merged_df = merge_dataframes_on(merged_df, sec_data, "Entry")
-    write_to_excel(merged_df, merged_output_file)
-
-    add_df_as_another_sheet(sec_data, merged_output_file, "SEC-API-DATA")
+    # SEC company names closest to each Orbis company name, to review companies whose names differ in both sources
+    name_matches = match_company_names(
+        orbis_data["Company name Latin alphabet"],
+        sec_data["Company name Latin alphabet"],
+        max_candidates=max_name_candidates,
+    )
+    write_to_excel(
+        {"ORBIS-SEC-MERGED": merged_df, "SEC-API-DATA": sec_data, "ORBIS-SEC-NAME-MATCHES": name_matches},
+        merged_output_file,
+        export_formats,
+    )
 
 
 def create_company_dictionary(file_path, is_licensee=True):
@@ -224,7 +257,7 @@ def create_company_dictionary(file_path, is_licensee=True):
         raise Exception(f"File does not exist at {file_path}")
 
     # Read the Excel file
-    df = pd.read_excel(file_path)
+    df = read_excel(file_path)
     if is_licensee:
         company_name_columns = [
             col for col in df.columns if col.startswith("Licensee") and col.endswith("cleaned") and "CIK" not in col
@@ -233,28 +266,10 @@ def create_company_dictionary(file_path, is_licensee=True):
         company_name_columns = [
             col for col in df.columns if col.startswith("Licensor") and col.endswith("cleaned") and "CIK" not in col
         ]
-    # Create an empty dictionary
-    company_dict = {}
-
-    # Iterate over each row in the DataFrame
-    for index, row in df.iterrows():
-        entry = row["Entry"]
-
-        # Iterate over each company name column
-        for column in company_name_columns:
-            if not pd.isnull(row[column]):
-                company_name = row[column].strip().upper()  # Remove any leading/trailing whitespace
-
-                # Check if the company name is not empty
-                if company_name:
-                    # Check if the company name already exists in the dictionary
-                    if company_name in company_dict:
-                        # Append the entry value to the existing list of values for the company
-                        company_dict[company_name].append(entry)
-                    else:
-                        # Create a new entry in the dictionary with the company name as the key
-                        company_dict[company_name] = [entry]
-
+    # {company name: [entry, ...]}, empty names are skipped
+    company_dict = map_values_to_entries(
+        df, company_name_columns, normalize=COMPANY_NAME_CANONICALIZER.canonicalize, drop_empty=True
+    )
     return company_dict
 
 
@@ -263,25 +278,12 @@ def duplicate_values_companies(df):
     Duplicate rows in an Excel file based on the values in the 'Entry' column.
     :param df: merged dataframe
     """
-    # Create an empty list to store the duplicated rows
-    duplicated_rows = []
-    # df = pd.read_csv(merged_file, sep=";")
-    columnns = ["Entry"] + list(df.columns)
-    # Iterate over each row in the DataFrame
-    for _, row in df.iterrows():
-        entries = str(row["Own ID"]).split(", ")  # Split the entries by comma and space
-        for entry in entries:
-            # Create a new row with the duplicated entry and company name
-            duplicated_row = row.copy()
-            # drop entry value delete [ ] characters
-            duplicated_row["Entry"] = entry.replace("[", "").replace("]", "")
-            duplicated_rows.append(duplicated_row)
-
-        # Remove the processed entry from the Entry column
-        row["Entry"] = ""
-
-    # Create a new DataFrame from the duplicated rows
-    duplicated_df = pd.DataFrame(duplicated_rows, columns=columnns)
+    # Own ID is e.g. "[12, 57]", split the entries by comma and space and delete [ ] characters
+    entries = df["Own ID"].map(str).str.split(", ")
+    duplicated_df = df.assign(Entry=entries).explode("Entry")
+    duplicated_df["Entry"] = duplicated_df["Entry"].str.replace("[", "", regex=False).str.replace("]", "", regex=False)
+    # one row per entry, Entry as first column
+    duplicated_df = duplicated_df[["Entry"] + [column for column in df.columns if column != "Entry"]]
     duplicated_df["Entry"] = duplicated_df["Entry"].astype(str)
     return duplicated_df
 
@@ -295,6 +297,18 @@ if __name__ == "__main__":
     parser.add_argument("--sec_output_file", type=str, help="Path to sec output file")
     parser.add_argument("--merged_output_file", type=str, help="Path to output file")
     parser.add_argument("--searched_raw_input_file", type=str, help="Path to searched raw excel input file")
+    parser.add_argument(
+        "--export_formats",
+        type=str,
+        default="",
+        help="Comma separated formats written next to the merged output file in addition to xlsx, e.g. csv,parquet",
+    )
+    parser.add_argument(
+        "--max_name_candidates",
+        type=int,
+        default=100,
+        help="Maximum number of SEC company names compared per Orbis company name in ORBIS-SEC-NAME-MATCHES, 0 for all",
+    )
     args = parser.parse_args()
     if len(sys.argv) == 1:
         parser.print_help(sys.stderr)
@@ -305,5 +319,10 @@ if __name__ == "__main__":
     merged_output_file = args.merged_output_file
     searched_raw_input_file = args.searched_raw_input_file
 
-    aggregate_orbis_sec_data(orbis_output_file, sec_output_file)
+    aggregate_orbis_sec_data(
+        orbis_output_file,
+        sec_output_file,
+        get_export_formats(args.export_formats),
+        args.max_name_candidates or None,
+    )
     print(f"Successfully merged data to {merged_output_file}")
@@ -0,0 +1,139 @@
+# author: mrtrkmn@github
+# desc: Fuzzy matching of company names (e.g. Orbis <-> SEC) without comparing all pairs of names
+
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+
+class CompanyNameMatcher:
+    """
+    Index of company names to find the most similar names of a query name.
+
+    Names are indexed by their character q-grams (inverted index: q-gram -> names containing it). For a query,
+    only names sharing q-grams with it are candidates:
+
+    - names whose length rules out reaching the threshold are skipped, the score (fuzz.ratio) of two names
+      can not be higher than 2 * min(length) / (sum of lengths)
+    - q-grams found in more than `max_posting_size` names (e.g. " IN", "INC") are not used to find candidates,
+      unless the query has no other q-gram
+    - at most `max_candidates` names sharing the most q-grams with the query are scored; when none of them reaches
+      the threshold although more names share q-grams with the query, all indexed names are scored instead, so the
+      cap does not hide the best match of a query
+
+    The candidates of a query are scored in one call (rapidfuzz cdist with fuzz.ratio). Scores are rounded to whole
+    percents like fuzzywuzzy's fuzz.ratio, so they are the same as calculate_match_percentage in merge.py.
+
+    :param names: names to search in, e.g. SEC companyName column
+    :param canonicalize: optional function applied to indexed and query names before matching
+    :param q: length of q-grams
+    :param max_candidates: maximum number of candidates scored per query, None scores all candidates
+    :param max_posting_size: q-grams found in more names than this are skipped, default is 5% of names (at least 50)
+    """
+
+    def __init__(self, names, canonicalize=None, q=3, max_candidates=100, max_posting_size=None):
+        self.canonicalize = canonicalize
+        self.q = q
+        self.max_candidates = max_candidates
+        self.names = list(names)
+        self.keys = np.array([self.prepare(name) for name in self.names], dtype=object)
+        self.lengths = [len(key) for key in self.keys]
+        self.index = defaultdict(list)
+        for position, key in enumerate(self.keys):
+            for gram in set(self.qgrams(key)):
+                self.index[gram].append(position)
+        if max_posting_size is None:
+            max_posting_size = max(50, len(self.names) // 20)
+        self.max_posting_size = max_posting_size
+
+    def prepare(self, name):
+        name = str(name)
+        if self.canonicalize is not None:
+            name = self.canonicalize(name)
+        return name
+
+    def qgrams(self, key):
+        # names are padded, so that short names and the first/last characters produce q-grams as well
+        padded = f"{' ' * (self.q - 1)}{key}{' ' * (self.q - 1)}"
+        return [padded[i : i + self.q] for i in range(len(padded) - self.q + 1)]
+
+    def candidates(self, key, threshold=0.0):
+        """
+        Return the positions of indexed names which may be similar to a (prepared) query name, names sharing the most
+        q-grams with the query first
+        :param key: query name returned by prepare
+        :param threshold: minimum score between 0 and 1, used to skip names with incompatible lengths
+        """
+        grams = set(self.qgrams(key))
+        postings = [self.index[gram] for gram in grams if gram in self.index]
+        selective = [posting for posting in postings if len(posting) <= self.max_posting_size]
+        shared = Counter()
+        for posting in selective or postings:
+            shared.update(posting)
+
+        # score <= 2 * min(len_a, len_b) / (len_a + len_b), small margin for the rounding of fuzz.ratio
+        bound = max(0.0, threshold - 0.005)
+        length = len(key)
+        min_length = length * bound / (2 - bound)
+        max_length = length * (2 - bound) / bound if bound > 0 else float("inf")
+        return [
+            position
+            for position, _ in sorted(shared.items(), key=lambda item: (-item[1], item[0]))
+            if min_length <= self.lengths[position] <= max_length
+        ]
+
+    def score(self, key, positions, threshold):
+        """
+        Return the (position, score) pairs of indexed names scoring at least the threshold with a query name
+        :param key: query name returned by prepare
+        :param positions: positions of the indexed names to score
+        :param threshold: minimum score between 0 and 1
+        """
+        positions = np.array(positions, dtype=np.int64)
+        if not len(positions):
+            return []
+        scores = process.cdist([key], self.keys[positions], scorer=fuzz.ratio, dtype=np.float64)[0]
+        scores = np.round(scores) / 100.0
+        return [(position, score) for position, score in zip(positions.tolist(), scores.tolist()) if score >= threshold]
+
+    def match(self, name, top_k=3, threshold=0.8):
+        """
+        Return the top-k most similar indexed names of a name with a score above the threshold
+        :param name: query name, e.g. Orbis "Company name Latin alphabet"
+        :param top_k: maximum number of matches
+        :param threshold: minimum score between 0 and 1
+        :return: list of (indexed name, score, position of indexed name) tuples, best match first
+        """
+        key = self.prepare(name)
+        # fuzz.ratio of fuzzywuzzy scores empty names 0
+        if not key:
+            return []
+        positions = self.candidates(key, threshold)
+        if self.max_candidates is None or len(positions) <= self.max_candidates:
+            matched = self.score(key, positions, threshold)
+        else:
+            # the best match may share fewer q-grams than the capped candidates, full scan if they are all too far
+            matched = self.score(key, positions[: self.max_candidates], threshold) or self.score(
+                key, range(len(self.keys)), threshold
+            )
+        matched.sort(key=lambda item: (-item[1], item[0]))
+        return [(self.names[position], score, position) for position, score in matched[:top_k]]
+
+    def match_all(self, names, top_k=3, threshold=0.8):
+        """
+        Match many names, every distinct query name is matched once
+        :param names: query names
+        :param top_k: maximum number of matches per name
+        :param threshold: minimum score between 0 and 1
+        :return: DataFrame with columns name, match, score, rank (1 is the best match); names without match are left out
+        """
+        rows = []
+        matches = {}
+        for name in names:
+            if name not in matches:
+                matches[name] = self.match(name, top_k=top_k, threshold=threshold)
+            for rank, (matched_name, score, _) in enumerate(matches[name], start=1):
+                rows.append((name, matched_name, score, rank))
+        return pd.DataFrame(rows, columns=["name", "match", "score", "rank"])